@@ -2,4 +2,4 @@ __version__ = "0.0.4"
 
 from .acq import Acquisition  # noqa: F401
 from .final_analysis import FinalAnalysis  # noqa: F401
-from .manager import ExpManager  # noqa: F401
+from .manager import Cohort, ExpManager  # noqa: F401
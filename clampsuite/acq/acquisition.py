@@ -3,6 +3,7 @@ import copy
 import clampsuite
 
 from ..functions.filtering_functions import Filters, Windows
+from ..functions.load_functions import read_lazy_arrays
 
 
 class Acquisition:
@@ -16,6 +17,10 @@ class Acquisition:
 
     _class_type = {}
 
+    # Analysis stages in the order they are computed and the attributes each
+    # stage depends on. Subclasses that analyze in stages override this.
+    stage_graph = ()
+
     def __init_subclass__(cls, analysis, **kwargs):
         super().__init_subclass__(**kwargs)
         cls._class_type[analysis] = cls
@@ -30,6 +35,24 @@ class Acquisition:
         setattr(obj, "accepted", True)
         return obj
 
+    def __getattr__(self, name):
+        # Only called when normal attribute lookup fails. Arrays that were
+        # loaded lazily are read from disk the first time they are accessed.
+        lazy_arrays = self.__dict__.get("_lazy_arrays")
+        if lazy_arrays is not None and name in lazy_arrays:
+            for key, value in read_lazy_arrays(lazy_arrays, name).items():
+                del lazy_arrays[key]
+                setattr(self, key, value)
+            return self.__dict__[name]
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
+
+    def __getnewargs__(self):
+        # Pickle (and therefore multiprocessing) needs the analysis type to
+        # recreate the correct subclass in __new__.
+        return (self.analysis,)
+
     def __copy__(self):
         return self
 
@@ -50,15 +73,114 @@ class Acquisition:
         new_acq.__dict__.update(copy.deepcopy(self.__dict__))
         return new_acq
 
+    def load_lazy_arrays(self):
+        """Reads any arrays that have not been accessed yet so that the
+        acquisition no longer depends on the file it was loaded from.
+        """
+        for name in list(self.__dict__.get("_lazy_arrays", {})):
+            getattr(self, name)
+        self.__dict__.pop("_lazy_arrays", None)
+
+    def cache_stage(self, stage: str, key, value):
+        """Stores the output of an analysis stage along with the key (the
+        settings and input) that produced it. Nothing is stored if the key
+        is None.
+        """
+        if key is not None:
+            self.__dict__.setdefault("_stage_cache", {})[stage] = (key, value)
+
+    def cached_stage(self, stage: str, key, pop: bool = False):
+        """Returns the stored output of an analysis stage if it was produced
+        with the same key, otherwise None.
+        """
+        cache = self.__dict__.get("_stage_cache", {})
+        entry = cache.get(stage)
+        if key is None or entry is None or entry[0] != key:
+            return None
+        if pop:
+            del cache[stage]
+        return entry[1]
+
+    def clear_stage_cache(self, *stages: str):
+        """Drops the stored output and fingerprint of the given stages or of
+        every stage if no stages are given.
+        """
+        if not stages:
+            self.__dict__.pop("_stage_cache", None)
+            self.__dict__.pop("_stage_fingerprints", None)
+        else:
+            cache = self.__dict__.get("_stage_cache", {})
+            fingerprints = self.__dict__.get("_stage_fingerprints", {})
+            for stage in stages:
+                cache.pop(stage, None)
+                fingerprints.pop(stage, None)
+
+    def input_fingerprint(self) -> tuple:
+        """Fingerprint of the data the first stage is computed from."""
+        return ()
+
+    def stage_fingerprints(self) -> dict:
+        """Returns the fingerprint of every stage in stage_graph for the
+        current settings. The fingerprint of a stage contains the fingerprint
+        of the stage before it so changing the input of any stage changes
+        the fingerprint of every stage after it.
+        """
+        fingerprints = {}
+        fingerprint = self.input_fingerprint()
+        for stage, attributes in self.stage_graph:
+            values = tuple(getattr(self, name) for name in attributes)
+            fingerprint = (fingerprint, stage, values)
+            fingerprints[stage] = fingerprint
+        return fingerprints
+
+    def stage_fingerprint(self, stage: str):
+        """Returns the fingerprint of a stage based on the recorded
+        fingerprint of the stage before it, which is the fingerprint of the
+        output the stage would be computed from. Returns None if the stage
+        before it has not been recorded.
+        """
+        names = [name for name, _ in self.stage_graph]
+        index = names.index(stage)
+        if index == 0:
+            previous = self.input_fingerprint()
+        else:
+            previous = self.recorded_stage(names[index - 1])
+            if previous is None:
+                return None
+        values = tuple(getattr(self, name) for name in self.stage_graph[index][1])
+        return (previous, stage, values)
+
+    def recorded_stage(self, stage: str):
+        """Returns the fingerprint the current output of a stage was computed
+        with or None if the stage has not been computed.
+        """
+        return self.__dict__.get("_stage_fingerprints", {}).get(stage)
+
+    def stage_changed(self, stage: str, fingerprint) -> bool:
+        """Returns True if the stage has to be computed again to match the
+        fingerprint.
+        """
+        return fingerprint is None or self.recorded_stage(stage) != fingerprint
+
+    def record_stage(self, stage: str, fingerprint):
+        """Records the fingerprint the current output of a stage was computed
+        with. Stored stage outputs that do not match the recorded
+        fingerprints are dropped.
+        """
+        recorded = self.__dict__.setdefault("_stage_fingerprints", {})
+        recorded[stage] = fingerprint
+        cache = self.__dict__.get("_stage_cache", {})
+        for name in list(cache):
+            if name in recorded and cache[name][0] != recorded[name]:
+                del cache[name]
+
     def load_data(self, data: dict):
         for key, item in data.items():
             setattr(self, key, item)
         # self.s_r_c = int(self.sample_rate / 1000)
         if "saved_events_dict" in data:
             self.create_postsynaptic_events()
-            self.event_arrays = [
-                i.event_array - i.event_start_y for i in self.postsynaptic_events
-            ]
+            self.event_arrays = self.get_event_arrays()
 
     def set_epoch(self, epoch):
         self.epoch = epoch
@@ -4,6 +4,7 @@ import bottleneck as bn
 import numpy as np
 from scipy import signal, stats
 
+from ..functions.batch_functions import find_peaks_rows, window_rows
 from . import filter_acq
 
 
@@ -34,10 +35,50 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
         self.get_ramp_rheo()
         self.find_spike_width()
         self.find_AHP_peak()
+        self.find_all_spike_features()
         self.spike_adaptation()
         self.calculate_sfa_local_var()
         self.calculate_sfa_divisor()
 
+    def derivatives(self, array: Union[np.ndarray, None] = None) -> dict:
+        """Returns the first, second and third derivative of the array. The
+        derivatives of self.array are computed once and stored until the
+        array changes so the spike parameters are all found from the same
+        buffers.
+        """
+        if array is not None and array is not self.array:
+            dv = np.gradient(array)
+            ddv = np.gradient(dv)
+            return {"dv": dv, "ddv": ddv, "dddv": np.gradient(ddv)}
+        key = self.input_fingerprint()
+        derivatives = self.cached_stage("derivatives", key)
+        if derivatives is None:
+            dv = np.gradient(self.array)
+            ddv = np.gradient(dv)
+            derivatives = {"dv": dv, "ddv": ddv, "dddv": np.gradient(ddv)}
+            self.cache_stage("derivatives", key, derivatives)
+        return derivatives
+
+    def dv_peaks(self, derivatives: dict) -> np.ndarray:
+        if "dv_peaks" not in derivatives:
+            derivatives["dv_peaks"], _ = signal.find_peaks(derivatives["dv"], height=6)
+        return derivatives["dv_peaks"]
+
+    def sample_interval(self, index: Union[int, np.ndarray]):
+        """The value of np.gradient(self.plot_acq_x()) at index without
+        creating the full arrays.
+        """
+        index = np.asarray(index)
+        last = self.array.size - 1
+        low = np.clip(index - 1, 0, last)
+        high = np.clip(index + 1, 0, last)
+        edge = (index == 0) | (index == last)
+        return np.where(
+            edge,
+            (high / self.s_r_c - low / self.s_r_c) / 1.0,
+            (high / self.s_r_c - low / self.s_r_c) / 2.0,
+        )
+
     def get_delta_v(self):
         """This function finds the delta-v for a pulse. It simply takes the mean
         value from the pulse start to end for pulses without spikes. For
@@ -98,12 +139,12 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
             self.peak_volt = self.array[self.peaks[0]]
 
             # Differentiate the array to find the peak dv/dt.
-            dv = np.gradient(self.array)
-            dt = np.gradient(self.plot_acq_x())
-            peak_dv, _ = signal.find_peaks(dv, height=6)
+            derivatives = self.derivatives()
+            dv = derivatives["dv"]
+            peak_dv = self.dv_peaks(derivatives)
 
             # Pull out the index of the first peak and find the peak velocity.
-            self.ap_v = (dv / dt)[peak_dv[0]]
+            self.ap_v = dv[peak_dv[0]] / self.sample_interval(peak_dv[0])
 
             # Calculate this early so that it does not need to be calculated
             # a second time.
@@ -141,12 +182,24 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
                 )[-1][0]
                 self.spike_threshold = self.array[self.rheo_x]
 
+    def zscored_dddv(self, derivatives: dict) -> np.ndarray:
+        if "dddv_zscored" not in derivatives:
+            dddv = derivatives["dddv"]
+            derivatives["dddv_zscored"] = (dddv - np.mean(dddv)) / np.std(dddv)
+        return derivatives["dddv_zscored"]
+
+    def curvature_peaks(self, derivatives: dict, array: np.ndarray) -> np.ndarray:
+        if "curvature_peaks" not in derivatives:
+            derivatives["curvature_peaks"], _ = signal.find_peaks(
+                -1 * (derivatives["dv"] / array), prominence=0.5
+            )
+        return derivatives["curvature_peaks"]
+
     def find_spk_thresh(self, array: np.ndarray) -> "tuple[int, int]":
-        dv = np.gradient(array)
-        ddv = np.gradient(dv)
+        derivatives = self.derivatives(array)
+        dv = derivatives["dv"]
         if self.threshold_method == "third_derivative":
-            dddv = np.gradient(ddv)
-            dddv_zscored = (dddv - np.mean(dddv)) / np.std(dddv)
+            dddv_zscored = self.zscored_dddv(derivatives)
             peaks, _ = signal.find_peaks(
                 dddv_zscored[self._pulse_start + int(1 * self.s_r_c) : self.peaks[0]],
                 height=1,
@@ -157,10 +210,12 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
             #     )
             peaks = peaks - 1 + self._pulse_start + int(1 * self.s_r_c)
         elif self.threshold_method == "max_curvature":
-            peaks, _ = signal.find_peaks(-1 * (dv / array), prominence=0.5)
-            peaks = peaks - 2
+            peaks = self.curvature_peaks(derivatives, array) - 2
         elif self.threshold_method == "legacy":
-            peak_dv, _ = signal.find_peaks(dv, height=6)
+            if array is self.array:
+                peak_dv = self.dv_peaks(derivatives)
+            else:
+                peak_dv, _ = signal.find_peaks(dv, height=6)
             try:
                 peaks = (
                     np.argwhere(np.gradient(dv[self._pulse_start : peak_dv[0]]) < (0.3))
@@ -195,7 +250,6 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
                 # spike threshold. This is used because of how scipy.find_peaks
                 # works and was a robust way to find the first
                 # action_potential.
-                self.array.copy()
                 mask = np.array(self.array > self.spike_threshold)
 
                 # First using a mask to find the indices of each action
@@ -228,7 +282,6 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
                 # is the spike threshold wherever the value drops below the
                 # spike threshold. This is used because of how scipy.find_peaks
                 # works and was a robust way to find the first action_potential.
-                self.array.copy()
 
                 # First using a mask to find the indices of each action
                 # potential. The index pulls out the action potential fairly
@@ -259,11 +312,9 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
                 end = self._pulse_end
             else:
                 end = self._pulse_end
-            masked_array = self.array.copy()
-            mask = np.array(self.array > self.spike_threshold)
-            masked_array[~mask] = self.spike_threshold
+            masked_array = np.fmax(self.array[:end], self.spike_threshold)
             self.width_comp = signal.peak_widths(
-                masked_array[:end], self.peaks, rel_height=0.5
+                masked_array, self.peaks, rel_height=0.5
             )
         else:
             self.width_comp = None
@@ -380,18 +431,174 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
         be less arbitrary. The AHP
         """
         if not np.isnan(self.peaks[0]):
-            peak = np.argmax(self.first_ap)
-            dvv = np.gradient(np.gradient(self.first_ap[: int(peak + 5 * self.s_r_c)]))
-            corr_factor = len(self.first_ap) - len(
-                self.first_ap[: int(peak + 5 * self.s_r_c)]
-            )
-            base = (np.argmin(dvv[::-1] < 0.15) * -1) - corr_factor
-            self.ahp_y = self.first_ap[base]
-            self.ahp_x = self.spike_x_array()[base]
+            base = self.ahp_positions(
+                [self.ap_index[0]], [self.ap_index[1]], self.derivatives()
+            )[0]
+            self.ahp_y = self.array[base]
+            self.ahp_x = base / self.s_r_c
         else:
             self.ahp_x = np.nan
             self.ahp_y = np.nan
 
+    def ahp_positions(self, starts, stops, derivatives: dict) -> np.ndarray:
+        """Finds the AHP of the spike in each array[start:stop] window. The
+        AHP is the point after the last value of the second derivative that
+        is at least 0.15 within 5 ms of the spike peak. The second derivative
+        of each window is taken from the stored derivatives with only the two
+        values at each end recomputed the way np.gradient does for a slice.
+        """
+        array = self.array
+        dv = derivatives["dv"]
+        starts = np.asarray(starts, dtype=np.intp)
+        stops = np.asarray(stops, dtype=np.intp)
+        lengths = stops - starts
+        rows, _ = window_rows(array, starts, stops, fill=-np.inf)
+        peaks = np.argmax(rows, axis=1)
+        ends = np.minimum((peaks + 5 * self.s_r_c).astype(int), lengths)
+        dvv, valid = window_rows(derivatives["ddv"], starts, starts + ends, fill=0.0)
+
+        # Values at the ends of each window.
+        index = np.flatnonzero(ends >= 4)
+        start, end = starts[index], starts[index] + ends[index]
+        first = array[start + 1] - array[start]
+        last = array[end - 1] - array[end - 2]
+        dvv[index, 0] = dv[start + 1] - first
+        dvv[index, 1] = (dv[start + 2] - first) / 2.0
+        dvv[index, ends[index] - 2] = (last - dv[end - 3]) / 2.0
+        dvv[index, ends[index] - 1] = last - dv[end - 2]
+        for i in np.flatnonzero(ends < 4):
+            dvv[i, : ends[i]] = np.gradient(
+                np.gradient(array[starts[i] : starts[i] + ends[i]])
+            )
+
+        above = valid & ~(dvv < 0.15)
+        base = np.where(
+            above.any(axis=1), dvv.shape[1] - np.argmax(above[:, ::-1], axis=1), ends
+        )
+        base[(base == ends) & (ends == lengths)] = 0
+        return starts + base
+
+    def find_all_spike_features(self):
+        """Finds the spike threshold, max dV/dt, half-width and AHP of every
+        spike in the pulse. The values of the first spike are the first spike
+        parameters. The threshold and max dV/dt of later spikes are searched
+        for between the trough before the spike and the spike using the same
+        threshold method and the AHP is searched for up to the next spike.
+        """
+        if np.isnan(self.peaks[0]):
+            for name in [
+                "spikes_threshold_x",
+                "spikes_threshold_y",
+                "spikes_ap_v",
+                "spikes_width",
+                "spikes_ahp_x",
+                "spikes_ahp_y",
+            ]:
+                setattr(self, name, np.array([]))
+            return
+        peaks = np.asarray(self.peaks)
+        threshold_x = np.full(peaks.size, np.nan)
+        ap_v = np.full(peaks.size, np.nan)
+        ahp = np.zeros(peaks.size, dtype=np.intp)
+        threshold_x[0] = self.rheo_x
+        ap_v[0] = self.ap_v
+        if peaks.size > 1:
+            derivatives = self.derivatives()
+            dv = derivatives["dv"]
+            later = peaks[1:]
+            rows, _ = window_rows(self.array, peaks[:-1], later, fill=np.inf)
+            troughs = peaks[:-1] + np.argmin(rows, axis=1)
+
+            # The max dV/dt is the first dv peak after the trough.
+            dv_peaks = self.dv_peaks(derivatives)
+            index = np.minimum(np.searchsorted(dv_peaks, troughs), dv_peaks.size - 1)
+            dv_x = dv_peaks[index]
+            found = (dv_x >= troughs) & (dv_x < later)
+            dv_x = np.where(found, dv_x, later)
+            ap_v[1:] = np.where(found, dv[dv_x] / self.sample_interval(dv_x), np.nan)
+            threshold_x[1:] = self.later_spike_thresholds(
+                troughs, later, dv_x, derivatives
+            )
+
+            # The AHP window starts 5 ms before the spike crosses the first
+            # spike threshold and ends when the next spike crosses it.
+            rows, valid = window_rows(self.array, troughs, later)
+            below = valid & (rows <= self.spike_threshold)
+            crossing = np.where(
+                below.any(axis=1),
+                troughs + rows.shape[1] - 1 - np.argmax(below[:, ::-1], axis=1),
+                troughs,
+            )
+            starts = np.maximum(crossing - int(5 * self.s_r_c), 0)
+            stops = np.append(crossing[1:], max(self._pulse_end, crossing[-1] + 1))
+            ahp[1:] = self.ahp_positions(starts, stops, derivatives)
+
+        self.spikes_threshold_x = threshold_x / self.s_r_c
+        self.spikes_threshold_y = np.full(peaks.size, np.nan)
+        found = ~np.isnan(threshold_x)
+        self.spikes_threshold_y[found] = self.array[threshold_x[found].astype(int)]
+        self.spikes_ap_v = ap_v
+        self.spikes_width = np.asarray(self.width_comp[0]) / self.s_r_c
+        self.spikes_ahp_x = ahp / self.s_r_c
+        self.spikes_ahp_y = self.array[ahp]
+        self.spikes_ahp_x[0] = self.ahp_x
+        self.spikes_ahp_y[0] = self.ahp_y
+
+    def later_spike_thresholds(
+        self,
+        starts: np.ndarray,
+        peaks: np.ndarray,
+        dv_peaks: np.ndarray,
+        derivatives: dict,
+    ) -> np.ndarray:
+        """Finds the threshold of each spike after the first one. starts is
+        the trough before each spike and dv_peaks is the max dV/dt of each
+        spike.
+        """
+        dv = derivatives["dv"]
+        thresholds = np.full(starts.size, np.nan)
+        if self.ramp == "1":
+            baseline_std = np.std(dv[self.baseline_start : self.baseline_end])
+            rows, valid = window_rows(dv, starts, dv_peaks)
+            below = valid & (rows < (8 * baseline_std))
+            found = below.any(axis=1)
+            thresholds[found] = (
+                starts + rows.shape[1] - 1 - np.argmax(below[:, ::-1], axis=1)
+            )[found]
+        elif self.threshold_method == "third_derivative":
+            # The threshold is the last dddv peak before the max dV/dt.
+            # Searching forward from the trough picks up noise on slow
+            # spike trains.
+            rows, valid = window_rows(
+                self.zscored_dddv(derivatives), starts, dv_peaks, fill=np.inf
+            )
+            row, column = find_peaks_rows(rows, height=1)
+            keep = valid[row, column]
+            row, column = row[keep][::-1], column[keep][::-1]
+            row, last = np.unique(row, return_index=True)
+            thresholds[row] = starts[row] + column[last] - 1
+        elif self.threshold_method == "max_curvature":
+            curvature = self.curvature_peaks(derivatives, self.array)
+            index = np.searchsorted(curvature, starts)
+            found = index < curvature.size
+            index = np.minimum(index, curvature.size - 1)
+            found &= curvature[index] < peaks
+            thresholds[found] = curvature[index][found] - 2
+        elif self.threshold_method == "legacy":
+            rows, valid = window_rows(derivatives["ddv"], starts, dv_peaks)
+            below = valid & (rows < 0.3)
+            rows, _ = window_rows(dv, starts, dv_peaks, fill=np.inf)
+            thresholds[:] = np.where(
+                below.any(axis=1),
+                starts + rows.shape[1] - 1 - np.argmax(below[:, ::-1], axis=1),
+                starts + np.argmin(rows, axis=1),
+            )
+        else:
+            raise AttributeError(
+                "threshold_method must be third_derivative, max_curvature or legacy."
+            )
+        return thresholds
+
     # Helper functions that correct x-values for plotting
     def spike_width(self) -> Union[int, float]:
         if self.width_comp is not None:
@@ -535,3 +742,37 @@ class CurrentClampAcq(filter_acq.FilterAcq, analysis="current_clamp"):
             "Baseline_stability": self.baseline_stability,
         }
         return current_clamp_dict
+
+    def spike_data(self) -> dict:
+        """This creates a dictionary with the values of every spike in the
+        acquisition. Each value is an array with one entry per spike so the
+        spikes of multiple acquisitions can be concatenated together.
+
+        Returns:
+            dict: dictionary of spike values
+        """
+        if "spikes_width" not in self.__dict__:
+            self.find_all_spike_features()
+        if np.isnan(self.peaks[0]):
+            peaks = np.array([], dtype=int)
+        else:
+            peaks = np.asarray(self.peaks)
+        num_spikes = peaks.size
+        peak_volt = self.array[peaks]
+        spike_dict = {
+            "Acquisition": np.full(num_spikes, self.acq_number),
+            "Epoch": np.full(num_spikes, self.epoch),
+            "Pulse_amp (pA)": np.full(num_spikes, self.pulse_amp),
+            "Ramp": np.full(num_spikes, self.ramp),
+            "Spike": np.arange(1, num_spikes + 1),
+            "Spike_time (ms)": peaks / self.s_r_c,
+            "Spike_threshold (mV)": self.spikes_threshold_y,
+            "Spike_threshold_time (ms)": self.spikes_threshold_x,
+            "Spike_peak_volt": peak_volt,
+            "Spike_amplitude (mV)": peak_volt - self.spikes_threshold_y,
+            "Spike_width (ms)": self.spikes_width,
+            "Max_AP_vel": self.spikes_ap_v,
+            "Peak_AHP (mV)": self.spikes_ahp_y,
+            "Peak_AHP (ms)": self.spikes_ahp_x,
+        }
+        return spike_dict
@@ -1,3 +1,4 @@
+import zlib
 from typing import Literal, Union
 
 import numpy as np
@@ -18,6 +19,20 @@ from ..functions.filtering_functions import (
 )
 from . import acquisition
 
+# Attributes that determine the output of apply_filter other than the
+# baseline.
+FILTER_ATTRIBUTES = (
+    "sample_rate",
+    "filter_type",
+    "order",
+    "high_pass",
+    "high_width",
+    "low_pass",
+    "low_width",
+    "window",
+    "polyorder",
+)
+
 
 class FilterAcq(acquisition.Acquisition, analysis="filter"):
 
@@ -30,6 +45,12 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
     for offline analysis because the signal can baselined using the mean.
     """
 
+    stage_graph = (
+        ("raw", ()),
+        ("baselined", ("_baseline_start", "_baseline_end")),
+        ("filtered", FILTER_ATTRIBUTES),
+    )
+
     def set_filter(
         self,
         baseline_start: Union[int, float] = 0,
@@ -86,7 +107,68 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
     def analyze(self):
         self.filter_array(self.array)
 
+    def filter_settings(self) -> tuple:
+        """Returns the settings that determine the output of filter_array.
+        Acquisitions with the same settings and array length can be
+        filtered together as a 2-D array.
+        """
+        return (
+            self.sample_rate,
+            self._baseline_start,
+            self._baseline_end,
+            self.filter_type,
+            self.order,
+            self.high_pass,
+            self.high_width,
+            self.low_pass,
+            self.low_width,
+            self.window,
+            self.polyorder,
+        )
+
+    def filter_input(self, **analysis_args) -> np.ndarray:
+        """Returns the array that analyze passes to filter_array for the
+        given analysis arguments.
+        """
+        return self.array
+
+    @staticmethod
+    def array_fingerprint(array) -> tuple:
+        array = np.ascontiguousarray(array)
+        return (array.shape, array.dtype.str, zlib.crc32(array))
+
+    def input_fingerprint(self) -> tuple:
+        return self.array_fingerprint(self.array)
+
+    def filter_key(self, array) -> tuple:
+        return (self.filter_settings(),) + self.array_fingerprint(array)
+
+    def update_filtered_array(self, array) -> bool:
+        """
+        Filters the array unless the raw, baselined and filtered stages have
+        not changed since the array was last filtered. Returns True if the
+        array was filtered.
+        """
+        fingerprints = self.stage_fingerprints()
+        changed = self.stage_changed("filtered", fingerprints["filtered"])
+        if changed:
+            self.filter_array(array)
+        for stage in ("raw", "baselined", "filtered"):
+            self.record_stage(stage, fingerprints[stage])
+        return changed
+
     def filter_array(self, array) -> None:
+        """
+        Baselines and filters the array and stores the result in
+        filtered_array. If the array was already filtered with the same
+        settings by ExpManager.filter_exp the stored result is used.
+        """
+        filtered_array = self.cached_stage("filtered", self.filter_key(array), pop=True)
+        if filtered_array is None:
+            filtered_array = self.apply_filter(array)
+        self.filtered_array = filtered_array
+
+    def apply_filter(self, array, baseline=None) -> np.ndarray:
         """
         This funtion filters the array of data, with several different types
         of filters.
@@ -132,14 +214,23 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
         subtract that from the unfiltered array to create a filtered array
         based on subtraction. Pretty esoteric and is more for learning
         purposes.
+
+        array can be 2-D in which case each row is baselined and filtered
+        independently. If baseline is given it is subtracted instead of the
+        mean of the baseline region, which is used when a long array is
+        filtered in pieces.
         """
-        baselined_array = array - np.mean(
-            array[self._baseline_start : self._baseline_end]
-        )
+        if baseline is None:
+            baseline = np.mean(
+                array[..., self._baseline_start : self._baseline_end],
+                axis=-1,
+                keepdims=True,
+            )
+        baselined_array = array - baseline
         if self.filter_type == "median":
-            self.filtered_array = median_filter(array=baselined_array, order=self.order)
+            filtered_array = median_filter(array=baselined_array, order=self.order)
         elif self.filter_type == "bessel":
-            self.filtered_array = bessel(
+            filtered_array = bessel(
                 array=baselined_array,
                 order=self.order,
                 sample_rate=self.sample_rate,
@@ -147,7 +238,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_pass=self.low_pass,
             )
         elif self.filter_type == "bessel_zero":
-            self.filtered_array = bessel_zero(
+            filtered_array = bessel_zero(
                 array=baselined_array,
                 order=self.order,
                 sample_rate=self.sample_rate,
@@ -155,7 +246,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_pass=self.low_pass,
             )
         elif self.filter_type == "butterworth":
-            self.filtered_array = butterworth(
+            filtered_array = butterworth(
                 array=baselined_array,
                 order=self.order,
                 sample_rate=self.sample_rate,
@@ -163,7 +254,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_pass=self.low_pass,
             )
         elif self.filter_type == "butterworth_zero":
-            self.filtered_array = butterworth_zero(
+            filtered_array = butterworth_zero(
                 array=baselined_array,
                 order=self.order,
                 sample_rate=self.sample_rate,
@@ -171,7 +262,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_pass=self.low_pass,
             )
         elif self.filter_type == "fir_zero_1":
-            self.filtered_array = fir_zero_1(
+            filtered_array = fir_zero_1(
                 array=baselined_array,
                 sample_rate=self.sample_rate,
                 order=self.order,
@@ -182,7 +273,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 window=self.window,
             )
         elif self.filter_type == "fir_zero_2":
-            self.filtered_array = fir_zero_2(
+            filtered_array = fir_zero_2(
                 array=baselined_array,
                 sample_rate=self.sample_rate,
                 order=self.order,
@@ -193,7 +284,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 window=self.window,
             )
         elif self.filter_type == "remez_1":
-            self.filtered_array = remez_1(
+            filtered_array = remez_1(
                 array=baselined_array,
                 sample_rate=self.sample_rate,
                 order=self.order,
@@ -203,7 +294,7 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_width=self.low_width,
             )
         elif self.filter_type == "remez_2":
-            self.filtered_array = remez_2(
+            filtered_array = remez_2(
                 array=baselined_array,
                 sample_rate=self.sample_rate,
                 order=self.order,
@@ -213,12 +304,12 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_width=self.low_width,
             )
         elif self.filter_type == "savgol":
-            self.filtered_array = savgol_filt(
+            filtered_array = savgol_filt(
                 array=baselined_array, order=self.order, polyorder=self.polyorder
             )
 
         elif self.filter_type == "None":
-            self.filtered_array = baselined_array.copy()
+            filtered_array = baselined_array.copy()
 
         elif self.filter_type == "subtractive":
             array = fir_zero_2(
@@ -231,16 +322,19 @@ class FilterAcq(acquisition.Acquisition, analysis="filter"):
                 low_width=self.low_width,
                 window=self.window,
             )
-            self.filtered_array = baselined_array - array
+            filtered_array = baselined_array - array
 
         elif self.filter_type == "ewma":
-            self.filtered_array = ewma_filt(
+            filtered_array = ewma_filt(
                 array=baselined_array, window=self.order, sum_proportion=self.polyorder
             )
         elif self.filter_type == "ewma_a":
-            self.filtered_array = ewma_afilt(
+            filtered_array = ewma_afilt(
                 array=baselined_array, window=self.order, sum_proportion=self.polyorder
             )
+        else:
+            raise AttributeError(f"{self.filter_type} is not a supported filter_type")
+        return filtered_array
 
     def plot_acq_x(self) -> np.ndarray:
         return np.arange(len(self.filtered_array)) / self.s_r_c
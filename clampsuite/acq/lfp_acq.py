@@ -1,9 +1,15 @@
-from typing import Union
+from collections import defaultdict
+from typing import Callable, Union
 
 import numpy as np
 from scipy import signal
 from scipy.stats import linregress
 
+from ..functions.batch_functions import (
+    find_peaks_windows,
+    first_in_row,
+    window_rows,
+)
 from . import filter_acq
 
 
@@ -16,8 +22,11 @@ class LFPAcq(filter_acq.FilterAcq, analysis="lfp"):
         This function runs all the other functions in one place. This makes
         it easy to troubleshoot.
         """
-        # Set all the attributes for analysis.
+        self.reset_analysis(pulse_start)
+        self.run_analysis()
 
+    def reset_analysis(self, pulse_start: Union[int, float] = 1000) -> None:
+        # Set all the attributes for analysis.
         self._pulse_start = int(pulse_start * self.s_r_c)
         self._fp_x = np.nan
         self.fp_y = np.nan
@@ -31,11 +40,158 @@ class LFPAcq(filter_acq.FilterAcq, analysis="lfp"):
         self._slope = np.nan
         self.regression_line = np.nan
 
-        self.run_analysis()
+    @classmethod
+    def analyze_batch(
+        cls,
+        acqs: list,
+        pulse_start: Union[int, float] = 1000,
+        callback: Union[Callable, None] = None,
+    ) -> None:
+        """Analyzes acquisitions the same way as analyze. The filtered arrays
+        of acquisitions with the same length and timing are stacked into a
+        2-D array and each step is computed for every row at once. The
+        results are written back to each acquisition.
+
+        Args:
+            acqs (list): LFP acquisitions.
+            pulse_start (Union[int, float], optional): Time of the pulse in
+                ms. Defaults to 1000.
+            callback (Callable, optional): Called with each acquisition
+                after its group is measured. Defaults to None.
+        """
+        groups = defaultdict(list)
+        for acq in acqs:
+            acq.reset_analysis(pulse_start)
+            acq.update_filtered_array(acq.array)
+            groups[(len(acq.filtered_array), acq._pulse_start, acq.s_r_c)].append(acq)
+        for group in groups.values():
+            cls.measure_batch(group)
+            if callback is not None:
+                for acq in group:
+                    callback(acq)
+
+    @staticmethod
+    def measure_batch(acqs: list) -> None:
+        """Runs the steps of measure_lfp on acquisitions that have the same
+        array length, pulse start and sample rate. Acquisitions without a
+        fiber volley window are measured one at a time.
+        """
+        stacked = np.vstack([acq.filtered_array for acq in acqs])
+        flat = stacked.ravel()
+        num_rows, length = stacked.shape
+        offsets = np.arange(num_rows) * length
+        s_r_c = acqs[0].s_r_c
+        pulse_start = acqs[0]._pulse_start
+        width = int(0.5 * s_r_c)
+
+        # Field potential
+        window = stacked[
+            :, pulse_start + int(4.4 * s_r_c) : pulse_start + int(20 * s_r_c)
+        ]
+        fp_y = np.min(window, axis=1)
+        fp_x = np.argmin(window, axis=1) + pulse_start + int(4.4 * s_r_c)
+        has_fp = np.abs(np.max(window, axis=1)) < np.abs(fp_y)
+        rows = np.flatnonzero(has_fp)
+
+        # Fiber volley, the first negative peak after the pulse or the
+        # minimum before the field potential.
+        fv_x = np.zeros(num_rows, dtype=np.intp)
+        peak_rows, columns = find_peaks_windows(
+            flat,
+            offsets[rows] + pulse_start,
+            offsets[rows] + fp_x[rows],
+            invert=True,
+            width=width,
+        )
+        found, first = first_in_row(peak_rows, rows.size)
+        fv_x[rows[found]] = columns[first] + pulse_start
+        missing = rows[~found]
+        w_start = pulse_start + int(0.9 * s_r_c)
+        w_end = np.where(
+            fp_x[missing] < (pulse_start + 74),
+            fp_x[missing] - int(2 * s_r_c),
+            np.minimum(fp_x[missing] - int(4 * s_r_c), pulse_start + int(49 * s_r_c)),
+        )
+        single = missing[w_end <= w_start]
+        missing, w_end = missing[w_end > w_start], w_end[w_end > w_start]
+        values, _ = window_rows(
+            flat, offsets[missing] + w_start, offsets[missing] + w_end, fill=np.inf
+        )
+        fv_x[missing] = np.argmin(values, axis=1) + w_start
+        rows = np.setdiff1d(rows, single)
+        single_rows = set(single.tolist())
+
+        # Slope start, the largest peak between the fiber volley and the
+        # field potential.
+        max_x = fv_x + int(1 * s_r_c)
+        peak_rows, columns = find_peaks_windows(
+            flat, offsets[rows] + fv_x[rows], offsets[rows] + fp_x[rows], width=width
+        )
+        peak_x = fv_x[rows][peak_rows] + columns
+        order = np.lexsort((peak_x, -stacked[rows[peak_rows], peak_x], peak_rows))
+        found, first = first_in_row(peak_rows[order], rows.size)
+        max_x[rows[found]] = peak_x[order][first]
+
+        # 10-90% slope with a closed form least squares fit of each row.
+        size = fp_x + 1 - max_x
+        slope_start = (size * 0.1).astype(int)
+        slope_end = (size * 0.9).astype(int)
+        slope_size = np.where(size > 0, np.maximum(slope_end - slope_start, 0), 0)
+        fit = rows[slope_size[rows] >= 5]
+        x_start = max_x[fit] + slope_start[fit]
+        values, valid = window_rows(
+            flat,
+            offsets[fit] + x_start,
+            offsets[fit] + x_start + slope_size[fit],
+            fill=0.0,
+        )
+        n = slope_size[fit]
+        y_mean = np.sum(values, axis=1) / n
+        x_centered = np.where(
+            valid, np.arange(values.shape[1]) - (n[:, None] - 1) / 2, 0
+        )
+        slopes = np.full(num_rows, np.nan)
+        intercepts = np.full(num_rows, np.nan)
+        slopes[fit] = np.sum(x_centered * (values - y_mean[:, None]), axis=1) / (
+            n * (n**2 - 1) / 12
+        )
+        intercepts[fit] = y_mean - slopes[fit] * (x_start + (n - 1) / 2)
+
+        for index, acq in enumerate(acqs):
+            if index in single_rows:
+                acq.measure_lfp()
+            elif has_fp[index]:
+                acq.fp_y = fp_y[index]
+                acq._fp_x = fp_x[index]
+                acq._fv_x = fv_x[index]
+                acq.fv_y = acq.filtered_array[acq._fv_x]
+                acq.max_x = max_x[index]
+                acq.max_y = acq.filtered_array[acq.max_x]
+                acq._slope_x = np.arange(acq.max_x, acq._fp_x + 1)[
+                    slope_start[index] : slope_end[index]
+                ]
+                acq.slope_y = acq.filtered_array[acq.max_x : acq._fp_x + 1][
+                    slope_start[index] : slope_end[index]
+                ]
+                if np.isnan(slopes[index]):
+                    acq.b = np.nan
+                    acq._slope = np.nan
+                    acq.reg_line = np.nan
+                else:
+                    acq._slope = slopes[index]
+                    acq.reg_line = list(acq._slope * acq._slope_x + intercepts[index])
+                acq.plot_lfp = True
+            else:
+                acq.fp_y = np.nan
+                acq._fp_x = np.nan
+                acq.plot_lfp = False
 
     def run_analysis(self) -> None:
         # Run the analysis
-        self.filter_array(self.array)
+        self.update_filtered_array(self.array)
+        self.measure_lfp()
+
+    def measure_lfp(self) -> None:
         self.field_potential()
         if np.isnan(self._fp_x):
             self.plot_lfp = False
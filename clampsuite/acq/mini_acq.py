@@ -1,16 +1,83 @@
+from itertools import product
 from typing import Literal, Union
 
 import numpy as np
 from scipy import interpolate, signal
-from scipy.fft import fft, ifft
+from scipy.fft import irfft, rfft
 
+from ..functions.batch_functions import measure_mini_events
 from ..functions.filtering_functions import fir_zero_1
-from ..functions.template_psc import create_template
+from ..functions.stream_functions import chunk_bounds, find_peaks_chunks, padded_slice
+from ..functions.template_psc import (
+    create_template,
+    deconvolution_kernel,
+    template_spectrum,
+    wiener_spectrum,
+)
+from ..functions.utilities import trimmed_rms, trimmed_rms_chunks
 from . import filter_acq
-from .postsynaptic_event import MiniEvent
+from .postsynaptic_event import MiniEvent, MiniEventTable
+
+# Order of the low pass filter applied to fft and wiener deconvolutions.
+DECON_FILTER_ORDER = 351
+
+# Default RC check of analyze. filter_input uses the same defaults so the
+# arrays filtered by ExpManager.filter_exp match the ones analyze uses.
+RC_CHECK = True
+RC_CHECK_START = 10000
+RC_CHECK_END = 10300
+
+# Number of events that are measured at once.
+EVENT_BATCH_SIZE = 1024
+
+# Filters that only use nearby values so an array can be filtered in
+# pieces. These are the filters the streaming analysis supports.
+LOCAL_FILTERS = (
+    "median",
+    "fir_zero_1",
+    "fir_zero_2",
+    "remez_1",
+    "remez_2",
+    "savgol",
+    "None",
+    "subtractive",
+)
 
 
 class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
+    stage_graph = (
+        ("raw", ("rc_check", "_rc_check_start", "_rc_check_end")),
+        ("baselined", ("_baseline_start", "_baseline_end")),
+        ("filtered", filter_acq.FILTER_ATTRIBUTES + ("invert", "chunk_length")),
+        (
+            "deconvolved",
+            (
+                "tmp_amplitude",
+                "tmp_tau_1",
+                "tmp_tau_2",
+                "tmp_risepower",
+                "tmp_length",
+                "tmp_spacer",
+                "decon_type",
+            ),
+        ),
+        ("candidates", ("sensitivity", "mini_spacing")),
+        ("measured", ("event_length",)),
+        (
+            "screened",
+            (
+                "amp_threshold",
+                "min_rise_time",
+                "max_rise_time",
+                "min_decay_time",
+                "decay_rise",
+                "curve_fit_decay",
+                "curve_fit_type",
+                "curve_fit_method",
+            ),
+        ),
+    )
+
     def set_template(
         self,
         tmp_amplitude: Union[int, float] = -20,
@@ -41,10 +108,12 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         decon_type: Literal["fft", "wiener", "convolution"] = "wiener",
         curve_fit_decay: bool = False,
         curve_fit_type: Literal["s_exp", "db_exp"] = "s_exp",
+        curve_fit_method: Literal["batch", "curve_fit"] = "curve_fit",
         baseline_corr: bool = False,
-        rc_check: bool = True,
-        rc_check_start: Union[int, float] = 10000,
-        rc_check_end: Union[int, float] = 10300,
+        rc_check: bool = RC_CHECK,
+        rc_check_start: Union[int, float] = RC_CHECK_START,
+        rc_check_end: Union[int, float] = RC_CHECK_END,
+        chunk_length: Union[int, float, None] = None,
     ):
         # Set the attributes for the acquisition
         self.sensitivity = sensitivity
@@ -59,6 +128,7 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         self.curve_fit_decay = curve_fit_decay
         self.decon_type = decon_type
         self.curve_fit_type = curve_fit_type
+        self.curve_fit_method = curve_fit_method
         self.deleted_events = 0
         self.baseline_corr = baseline_corr
         self.rc_check = rc_check
@@ -66,33 +136,94 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         self.rc_check_end = rc_check_end
         self._rc_check_start = int(rc_check_start * self.s_r_c)
         self._rc_check_end = int(rc_check_end * self.s_r_c)
+        self.chunk_length = chunk_length
         self.run_analysis()
 
     def run_analysis(self):
-        # Runs the functions to analyze the acquisition
+        # Runs the functions to analyze the acquisition. Only the stages
+        # whose settings or input changed since the last analysis are run.
         # if self.baseline_corr:
         #     self.baseline_correction()
-        temp_array = self.create_mespc_array()
-        self.filter_array(temp_array)
-        self.set_array()
-        self.set_sign()
+        fingerprints = self.stage_fingerprints()
+        if self.stage_changed("filtered", fingerprints["filtered"]):
+            temp_array = self.create_mespc_array()
+            if self.chunk_length is not None:
+                self.stream_final_array(temp_array)
+            else:
+                self.filter_array(temp_array)
+                self.set_array()
+                self.set_sign()
+        for stage in ("raw", "baselined", "filtered"):
+            self.record_stage(stage, fingerprints[stage])
         self.create_events()
 
+    def stream_chunk_size(self) -> int:
+        # The chunks need to be long enough for the edge padding of the
+        # filters.
+        return max(
+            int(self.chunk_length * self.s_r_c),
+            8 * int(self.order or 0),
+            8 * DECON_FILTER_ORDER,
+        )
+
+    def stream_final_array(self, array: np.ndarray):
+        """Streaming version of filter_array, set_array and set_sign. The
+        array is filtered in chunks that overlap by twice the filter order so
+        the final array is the same as filtering the whole array at once.
+        Only the filters in LOCAL_FILTERS can be used.
+        """
+        if self.filter_type not in LOCAL_FILTERS:
+            raise AttributeError(
+                f"{self.filter_type} filter cannot be used with chunk_length"
+            )
+        self.clear_stage_cache("filtered")
+        size = len(array)
+        baseline = np.mean(
+            array[self._baseline_start : self._baseline_end], axis=-1, keepdims=True
+        )
+        context = 2 * int(self.order or 0)
+        sign = -1 if self.invert else 1
+        self.final_array = np.empty(size)
+        for start, stop in chunk_bounds(size, self.stream_chunk_size()):
+            low, high = max(start - context, 0), min(stop + context, size)
+            filtered_array = self.apply_filter(array[low:high], baseline=baseline)
+            self.final_array[start:stop] = (
+                filtered_array[start - low : stop - low] * sign
+            )
+
     def create_mespc_array(self):
         """The function creates the mEPSC array by removing the RC
         check if there is one. The functions runs before the array
         is filtered.
         """
-        if self.rc_check is False:
+        temp_array, self.rc_check_array = self._split_rc_check(
+            self.rc_check, self._rc_check_start, self._rc_check_end
+        )
+        return temp_array
+
+    def _split_rc_check(self, rc_check: bool, rc_check_start: int, rc_check_end: int):
+        if rc_check is False:
             temp_array = self.array
-            self.rc_check_array = np.array([])
-        elif self.rc_check is True:
-            if self._rc_check_end == len(self.array):
-                temp_array = np.copy(self.array[: self._rc_check_start])
-                self.rc_check_array = np.copy(self.array[self._rc_check_start :])
+            rc_check_array = np.array([])
+        elif rc_check is True:
+            if rc_check_end == len(self.array):
+                temp_array = np.copy(self.array[:rc_check_start])
+                rc_check_array = np.copy(self.array[rc_check_start:])
             else:
-                temp_array = np.copy(self.array[self._rc_check_end :])
-                self.rc_check_array = np.copy(self.array[self._rc_check_end :])
+                temp_array = np.copy(self.array[rc_check_end:])
+                rc_check_array = np.copy(self.array[rc_check_end:])
+        return temp_array, rc_check_array
+
+    def filter_input(
+        self,
+        rc_check: bool = RC_CHECK,
+        rc_check_start: Union[int, float] = RC_CHECK_START,
+        rc_check_end: Union[int, float] = RC_CHECK_END,
+        **analysis_args,
+    ) -> np.ndarray:
+        temp_array, _ = self._split_rc_check(
+            rc_check, int(rc_check_start * self.s_r_c), int(rc_check_end * self.s_r_c)
+        )
         return temp_array
 
     def set_array(self):
@@ -121,7 +252,28 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         baseline = spl(self.plot_acq_x())
         self.array = self.array - baseline
 
-    def deconvolve_array(self, lambd: Union[int, float] = 4) -> np.ndarray:
+    def template_args(self, **template) -> tuple:
+        """Returns the template settings and sample rate in the order the
+        template functions take them. Keyword arguments with the names used
+        by set_template replace the settings of the acquisition.
+        """
+        template = {
+            "tmp_amplitude": self.tmp_amplitude,
+            "tmp_tau_1": self.tmp_tau_1,
+            "tmp_tau_2": self.tmp_tau_2,
+            "tmp_risepower": self.tmp_risepower,
+            "tmp_length": self.tmp_length,
+            "tmp_spacer": self.tmp_spacer,
+            **template,
+        }
+        return tuple(template.values()) + (self.sample_rate,)
+
+    def deconvolve_array(
+        self,
+        lambd: Union[int, float] = 4,
+        template_args: Union[tuple, None] = None,
+        spectrum: Union[np.ndarray, None] = None,
+    ) -> np.ndarray:
         """The Wiener deconvolution equation can be found on GitHub from pbmanis
         and danstowell. The basic idea behind this function is deconvolution
         or divsion in the frequency domain. I have found that changing lambd
@@ -143,6 +295,10 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
             template.
         lambd : Signal to noise ratio. A SNR anywhere from 1 to 10 seems to work
             without determining the exact noise level.
+        template_args : Template settings from template_args. Defaults to the
+            template of the acquisition.
+        spectrum : The rfft of the final array. Passing it lets several
+            templates share one FFT of the data.
 
         Returns
         -------
@@ -150,66 +306,109 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
             Time domain deconvolved signal that is returned for filtering.
 
         """
-        # The kernel needs to be the same length as the array that is being
-        # deconvolved.
-        template = create_template(
-            amplitude=self.tmp_amplitude,
-            tau_1=self.tmp_tau_1,
-            tau_2=self.tmp_tau_2,
-            risepower=self.tmp_risepower,
-            length=self.tmp_length,
-            spacer=self.tmp_spacer,
-            sample_rate=self.sample_rate,
-        )
-
-        kernel = np.hstack((template, np.zeros(len(self.final_array) - len(template))))
-        H = fft(kernel)
+        # The deconvolution is circular at the length of the array. The kernel
+        # spectrum is cached between acquisitions of the same length.
+        size = len(self.final_array)
+        if template_args is None:
+            template_args = self.template_args()
+        if spectrum is None and self.decon_type != "convolution":
+            spectrum = rfft(self.final_array, n=size)
 
         # Choose the method for finding minis. FFT and Wiener are almost identical.
         # Convolution is similar to template fitting (correlation).
         if self.decon_type == "fft":
-            deconvolved_array = np.real(ifft(fft(self.final_array) / H))
+            H = template_spectrum(*template_args, size)
+            deconvolved_array = irfft(spectrum / H, n=size)
         elif self.decon_type == "wiener":
-            deconvolved_array = np.real(
-                ifft(fft(self.final_array) * np.conj(H) / (H * np.conj(H) + lambd**2))
-            )
+            G = wiener_spectrum(*template_args, size, lambd)
+            deconvolved_array = irfft(spectrum * G, n=size)
         elif self.decon_type == "convolution":
+            template = create_template(*template_args)
             deconvolved_array = signal.convolve(self.final_array, template, mode="same")
         return deconvolved_array
 
     def create_deconvolved_array(self) -> np.ndarray:
         deconvolved_array = self.deconvolve_array()
         if self.decon_type == "fft" or self.decon_type == "wiener":
-            filtered_decon_array = fir_zero_1(
-                array=deconvolved_array,
-                sample_rate=self.sample_rate,
-                order=351,
-                high_pass=None,
-                high_width=None,
-                low_pass=300,
-                low_width=100,
-                window="hann",
-            )
-            return filtered_decon_array
+            return self.filter_deconvolved_array(deconvolved_array)
         else:
             return deconvolved_array
 
-    def deconvolved_rms(self, deconvolved_array: np.ndarray) -> Union[float, float]:
-        # Get the top and bottom 2.5% cutoff.
-        bottom, top = np.percentile(deconvolved_array, [2.5, 97.5])
-
-        # Return the middle values.
-        middle = np.hstack(
-            deconvolved_array[
-                np.argwhere((deconvolved_array > bottom) & (deconvolved_array < top))
-            ]
+    def filter_deconvolved_array(self, deconvolved_array: np.ndarray) -> np.ndarray:
+        filtered_decon_array = fir_zero_1(
+            array=deconvolved_array,
+            sample_rate=self.sample_rate,
+            order=DECON_FILTER_ORDER,
+            high_pass=None,
+            high_width=None,
+            low_pass=300,
+            low_width=100,
+            window="hann",
         )
-        # Calculate the mean and rms.
-        mu = np.mean(middle)
-        rms = np.sqrt(np.mean(np.square(middle - mu)))
-
+        return filtered_decon_array
+
+    def deconvolved_chunk(self, start: int, stop: int) -> np.ndarray:
+        """Returns the values of create_deconvolved_array from start to stop
+        without deconvolving the whole final array. The fft and wiener
+        deconvolutions use the time domain kernel of the deconvolution on a
+        piece of the final array that wraps around the ends the same way as
+        the circular FFT of the whole array.
+        """
+        size = len(self.final_array)
+        template_args = self.template_args()
+        if self.decon_type == "convolution":
+            kernel = create_template(*template_args)
+            before = (kernel.size - 1) // 2
+            period = None
+            context = 0
+        else:
+            kernel, before = deconvolution_kernel(*template_args, self.decon_type)
+            period = size
+            context = 4 * DECON_FILTER_ORDER
+        low, high = max(start - context, 0), min(stop + context, size)
+        after = kernel.size - 1 - before
+        values = padded_slice(self.final_array, low - after, high + before, period)
+        deconvolved_array = signal.oaconvolve(values, kernel, mode="valid")
+        if self.decon_type != "convolution":
+            deconvolved_array = self.filter_deconvolved_array(deconvolved_array)
+        return deconvolved_array[start - low : stop - low]
+
+    def deconvolved_rms(
+        self, deconvolved_array: np.ndarray, decimate: int = 1
+    ) -> Union[float, float]:
+        # Get the mean and rms of the values between the bottom and top 2.5%
+        # cutoff. decimate > 1 estimates them from every nth value.
+        mu, rms = trimmed_rms(deconvolved_array, 2.5, 97.5, decimate)
         return mu, rms
 
+    def deconvolved_fingerprint(self) -> tuple:
+        """Returns the fingerprint of the deconvolved stage. If the final
+        array was not created by run_analysis (e.g. it was loaded from a
+        file) the filtered stage is fingerprinted by the final array itself.
+        """
+        if self.recorded_stage("filtered") is None:
+            self.record_stage(
+                "filtered", ("final_array",) + self.array_fingerprint(self.final_array)
+            )
+        return self.stage_fingerprint("deconvolved")
+
+    def deconvolved_stage(self) -> tuple[np.ndarray, float, float]:
+        """Returns the deconvolved array and its mean and rms. The result is
+        stored on the acquisition so plotting the deconvolved array after
+        analysis does not deconvolve it again. The stored result is dropped
+        once the final array or the template changes.
+        """
+        key = self.deconvolved_fingerprint()
+        stage = self.cached_stage("deconvolved", key)
+        if stage is None:
+            deconvolved_array = self.create_deconvolved_array()
+            deconvolved_array.flags.writeable = False
+            mu, rms = self.deconvolved_rms(deconvolved_array)
+            stage = (deconvolved_array, mu, rms)
+            self.cache_stage("deconvolved", key, stage)
+            self.record_stage("deconvolved", key)
+        return stage
+
     def find_events(self) -> list:
         # This is not the method from the original paper but it works a
         # lot better. The original paper used 4*std of the deconvolved array.
@@ -217,9 +416,10 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         # different sensitivity setting. I wanted to keep the settings as
         # consistent as possible between different cell types.
 
-        deconvolved_array = self.create_deconvolved_array()
+        if self.chunk_length is not None:
+            return self.stream_find_events()
 
-        mu, rms = self.deconvolved_rms(deconvolved_array)
+        deconvolved_array, mu, rms = self.deconvolved_stage()
 
         # Find the events.
         peaks, _ = signal.find_peaks(
@@ -234,9 +434,33 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         events = peaks.tolist()
         return events
 
+    def stream_find_events(self) -> list:
+        """Finds the same events as find_events while only deconvolving a
+        chunk of the final array at a time. The deconvolution is done once
+        for each of the two passes of the noise estimate and once to find
+        the peaks.
+        """
+        size = len(self.final_array)
+        chunk_size = self.stream_chunk_size()
+        bounds = chunk_bounds(size, chunk_size)
+        mu, rms = trimmed_rms_chunks(
+            lambda: (self.deconvolved_chunk(start, stop) for start, stop in bounds),
+            size,
+            2.5,
+            97.5,
+        )
+        peaks = find_peaks_chunks(
+            lambda start, stop: self.deconvolved_chunk(start, stop) - mu,
+            size,
+            chunk_size,
+            height=self.sensitivity * (rms),
+            distance=self.mini_spacing * self.s_r_c,
+            prominence=rms,
+        )
+        return peaks.tolist()
+
     def plot_deconvolved_acq(self):
-        deconvolved_array = self.create_deconvolved_array()
-        mu, rms = self.deconvolved_rms(deconvolved_array)
+        deconvolved_array, mu, rms = self.deconvolved_stage()
         baseline = np.full(deconvolved_array.size, self.sensitivity * rms)
         return (deconvolved_array - mu), baseline
 
@@ -245,44 +469,265 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         from the deconvolution. Events less than 20 ms before the end of
         the acquisitions are not counted. Events get screened out based on
         the experimenters settings.
+
+        The peaks and the measured candidate events are stored so that they
+        are only found and measured again when the final array or the
+        settings they depend on change.
+        """
+        self.record_stage("deconvolved", self.deconvolved_fingerprint())
+        key = self.stage_fingerprint("candidates")
+        events = self.cached_stage("candidates", key)
+        if events is None:
+            events = self.find_events()
+            self.cache_stage("candidates", key, events)
+        self.record_stage("candidates", key)
+
+        key = self.stage_fingerprint("measured")
+        stage = self.cached_stage("measured", key)
+        if stage is None:
+            stage = self.measure_events(events)
+            self.cache_stage("measured", key, stage)
+        self.record_stage("measured", key)
+
+        self.record_stage("screened", self.stage_fingerprint("screened"))
+        self.screen_events(*stage)
+
+    def measure_events(self, events: list) -> tuple[MiniEventTable, np.ndarray]:
+        """Measures the events found by find_events. Events less than 20 ms
+        before the end of the acquisition are not analyzed. The rest are
+        measured together and any event the batch measurement cannot handle
+        is analyzed by itself.
+
+        Returns:
+            tuple[MiniEventTable, np.ndarray]: The measured candidate events
+            and their positions in the deconvolved array.
+        """
+        events = [
+            peak for peak in events if len(self.final_array) - peak >= 20 * self.s_r_c
+        ]
+        candidates = MiniEventTable(
+            self.final_array, self.event_settings(), len(events)
+        )
+        candidates.set_windows(events)
+        measured = np.zeros(len(events), dtype=bool)
+        for start in range(0, len(events), EVENT_BATCH_SIZE):
+            stop = start + EVENT_BATCH_SIZE
+            columns, batch_measured = measure_mini_events(
+                self.final_array,
+                events[start:stop],
+                self.event_length,
+                self.sample_rate,
+            )
+            measured[start:stop] = batch_measured
+            for key, value in columns.items():
+                candidates.column(key)[start:stop][batch_measured] = value[
+                    batch_measured
+                ]
+        valid = np.ones(len(events), dtype=bool)
+        for index in np.flatnonzero(~measured):
+            event = MiniEvent()
+            event.analyze(
+                acq_number=self.acq_number,
+                event_pos=events[index],
+                y_array=self.final_array,
+                event_length=self.event_length,
+                sample_rate=self.sample_rate,
+            )
+            # Events without a peak are always screened out.
+            if np.isnan(event.event_peak_x()):
+                valid[index] = False
+            else:
+                candidates.set_row(index, event)
+
+        candidates = candidates.take(np.flatnonzero(valid))
+        events = np.asarray(events, dtype=np.int64)[valid]
+        return candidates, events
+
+    def screen_events(self, candidates: MiniEventTable, events: np.ndarray):
+        """Screens the measured candidate events and creates the final events.
+        The candidates are not changed so they can be screened again with
+        different settings.
+
+        Args:
+            candidates (MiniEventTable): Measured candidate events.
+            events (np.ndarray): Position of each candidate in the deconvolved
+                array.
         """
-        # Create the lists to store values need for analysis.
-        self.postsynaptic_events = []
-        self.final_events = []
-        event_number = 0
-        event_time = []
+        accepted = self.screen_candidates(candidates, self.mini_spacing)
+        self.postsynaptic_events = candidates.take(accepted)
+        self.postsynaptic_events.settings = self.event_settings()
+        self.final_events = events[accepted].tolist()
+        if self.curve_fit_decay and self.curve_fit_method == "batch":
+            self.postsynaptic_events.fit_decays(self.curve_fit_type)
+        elif self.curve_fit_decay:
+            for event in self.postsynaptic_events:
+                event.fit_decay(fit_type=self.curve_fit_type)
+
+    def screen_candidates(
+        self, candidates: MiniEventTable, mini_spacing: Union[int, float]
+    ) -> np.ndarray:
+        """Screens candidate events with the same rules as check_event.
 
-        events = self.find_events()
+        Args:
+            candidates (MiniEventTable): Measured candidate events.
+            mini_spacing (Union[int, float]): Minimum time between the peaks
+                of accepted events in ms.
 
-        # The for loop won't run if there are no events.
-        # So there is no need to catch instances when
-        # there are no events.
+        Returns:
+            np.ndarray: Rows of the accepted candidates.
+        """
+        s_r_c = candidates.settings["s_r_c"]
+        event_peak = candidates.column("_event_peak_x") / s_r_c
+        event_start = candidates.column("_event_start_x") / s_r_c
+        amplitude = candidates.column("amplitude")
+        rise_time = candidates.column("rise_time")
+        final_tau_x = candidates.column("final_tau_x")
+        rejected = (
+            np.isnan(event_peak)
+            | (amplitude <= self.amp_threshold)
+            | (rise_time <= self.min_rise_time)
+            | (rise_time >= self.max_rise_time)
+            | (final_tau_x <= self.min_decay_time)
+            | (event_start > event_peak)
+        )
+        if self.decay_rise:
+            rejected |= final_tau_x <= rise_time
+
+        # The spacing depends on the previously accepted event so it is the
+        # only check that is done one event at a time.
+        accepted = []
+        accepted_peaks = set()
+        prior_peak = 0
+        for index in np.flatnonzero(~rejected):
+            peak = event_peak[index]
+            if peak - prior_peak < mini_spacing or peak in accepted_peaks:
+                continue
+            accepted += [index]
+            accepted_peaks.add(peak)
+            prior_peak = peak
+        return np.array(accepted, dtype=np.int64)
+
+    def sweep(
+        self,
+        sensitivity: Union[list, None] = None,
+        mini_spacing: Union[list, None] = None,
+        templates: Union[dict, None] = None,
+    ) -> list:
+        """Finds, measures and screens the events for every combination of
+        the sensitivities, mini spacings and template settings. The filter,
+        deconvolution type and screening settings of the last analysis are
+        used and the events of the acquisition are not changed.
+
+        The FFT of the final array is shared by all the templates and each
+        template is deconvolved once for all the sensitivities and spacings.
+        The peaks above the lowest sensitivity are found once per spacing and
+        the peaks for higher sensitivities are the ones that are high
+        enough, which is the same as running find_peaks with the higher
+        height.
 
-        for peak in events:
-            if len(self.final_array) - peak < 20 * self.s_r_c:
-                pass
-            else:
-                # Create the mini class then analyze.
-                event = MiniEvent()
-                event.analyze(
-                    acq_number=self.acq_number,
-                    event_pos=peak,
-                    y_array=self.final_array,
-                    event_length=self.event_length,
-                    sample_rate=self.sample_rate,
-                    curve_fit_decay=self.curve_fit_decay,
-                    curve_fit_type=self.curve_fit_type,
-                )
+        Args:
+            sensitivity (list, optional): Sensitivities to test. Defaults to
+                the sensitivity of the acquisition.
+            mini_spacing (list, optional): Mini spacings to test in ms.
+                Defaults to the mini spacing of the acquisition.
+            templates (dict, optional): Maps set_template argument names to
+                the values to test. Every combination of the values is tested
+                and settings that are not given use the template of the
+                acquisition. Defaults to None.
 
-                # Screen out methods using the function.
-                # See the function below for further details.
-                if self.check_event(event, event_time):
-                    self.postsynaptic_events += [event]
-                    self.final_events += [peak]
-                    event_time += [event.event_peak_x()]
-                    event_number += 1
-                # else:
-                #     pass
+        Returns:
+            list: A dict for each combination of settings with the settings,
+            the number of events, the frequency and the mean or median of the
+            event measurements.
+        """
+        if sensitivity is None:
+            sensitivity = [self.sensitivity]
+        if mini_spacing is None:
+            mini_spacing = [self.mini_spacing]
+        if templates is None:
+            templates = {}
+        names = list(templates)
+        size = len(self.final_array)
+        duration = size / self.sample_rate
+        spectrum = None
+        if self.decon_type != "convolution":
+            spectrum = rfft(self.final_array, n=size)
+        records = []
+        for values in product(*templates.values()):
+            template_args = self.template_args(**dict(zip(names, values)))
+            deconvolved_array = self.deconvolve_array(
+                template_args=template_args, spectrum=spectrum
+            )
+            if self.decon_type != "convolution":
+                deconvolved_array = self.filter_deconvolved_array(deconvolved_array)
+            mu, rms = self.deconvolved_rms(deconvolved_array)
+            deconvolved_array -= mu
+            settings = dict(
+                zip(
+                    (
+                        "tmp_amplitude",
+                        "tmp_tau_1",
+                        "tmp_tau_2",
+                        "tmp_risepower",
+                        "tmp_length",
+                        "tmp_spacer",
+                    ),
+                    template_args,
+                )
+            )
+            for spacing in mini_spacing:
+                peaks, _ = signal.find_peaks(
+                    deconvolved_array,
+                    height=min(sensitivity) * (rms),
+                    distance=spacing * self.s_r_c,
+                    prominence=rms,
+                )
+                candidates, events = self.measure_events(peaks.tolist())
+                heights = deconvolved_array[events]
+                for value in sensitivity:
+                    rows = np.flatnonzero(heights >= value * (rms))
+                    accepted = rows[
+                        self.screen_candidates(candidates.take(rows), spacing)
+                    ]
+                    record = {"Acquisition": self.acq_number}
+                    record.update(settings)
+                    record["sensitivity"] = value
+                    record["mini_spacing"] = spacing
+                    record.update(self.sweep_summary(candidates, accepted, duration))
+                    records.append(record)
+        return records
+
+    @staticmethod
+    def sweep_summary(
+        candidates: MiniEventTable, accepted: np.ndarray, duration: float
+    ) -> dict:
+        summary = {"Events": accepted.size, "Frequency (Hz)": accepted.size / duration}
+        columns = (
+            ("Amplitude (pA)", "amplitude", np.mean),
+            ("Median amplitude (pA)", "amplitude", np.median),
+            ("Est tau (ms)", "final_tau_x", np.mean),
+            ("Rise time (ms)", "rise_time", np.mean),
+        )
+        for label, key, func in columns:
+            if accepted.size > 0:
+                summary[label] = float(func(candidates.column(key)[accepted]))
+            else:
+                summary[label] = np.nan
+        return summary
+
+    def event_settings(self) -> dict:
+        """Settings shared by all the events of the acquisition."""
+        s_r_c = self.sample_rate / 1000
+        return {
+            "mini_class": "Mini",
+            "acq_number": self.acq_number,
+            "sample_rate": self.sample_rate,
+            "s_r_c": s_r_c,
+            "curve_fit_decay": self.curve_fit_decay,
+            "curve_fit_type": self.curve_fit_type,
+            "event_length": self.event_length,
+            "_event_length": int(self.event_length * s_r_c),
+        }
 
     def check_event(self, event: MiniEvent, events: list) -> bool:
         """The function is used to screen out events based
@@ -356,58 +801,56 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         )
         if not np.isnan(event.event_peak_x()):
             self.final_events += [x]
-            self.postsynaptic_events += [event]
+            self.postsynaptic_events.append(event)
             return True
         else:
             return False
 
-    def acq_data(self) -> dict:
+    def sort_events(self):
         """
-        Creates the final data using list comprehension by looping over each
-        of the minis in contained in the postsynaptic event list.
+        Sorts the postsynaptic events by their peak and sets the frequency
+        of the events.
         """
-        final_dict = {}
-
         # Sort postsynaptic events before calculating the final results. This
         # is because of how the user interface works and facilates commandline
         # usage of the program. Essentially it is easier to just add new minis
         # to the end of the postsynaptic event list. This prevents a bunch of
         # issues since you cannot modify the position of plot elements in the
         # pyqtgraph data items list.
-
         if self.postsynaptic_events:
-            self.postsynaptic_events.sort(key=lambda x: x._event_peak_x)
+            self.postsynaptic_events.sort("_event_peak_x")
             self.final_events.sort()
-            final_dict["Acquisition"] = [i.acq_number for i in self.postsynaptic_events]
-            final_dict["Amplitude (pA)"] = [
-                i.amplitude for i in self.postsynaptic_events
-            ]
-            final_dict["Est tau (ms)"] = [
-                i.final_tau_x for i in self.postsynaptic_events
-            ]
-            final_dict["Event time (ms)"] = [
-                i.event_peak_x() for i in self.postsynaptic_events
-            ]
-            final_dict["Acq time stamp"] = [
-                self.time_stamp for i in self.postsynaptic_events
-            ]
-            final_dict["Rise time (ms)"] = [
-                i.rise_time for i in self.postsynaptic_events
-            ]
-            final_dict["Rise rate (pA/ms)"] = [
-                i.rise_rate for i in self.postsynaptic_events
-            ]
+            self.freq = len(self.postsynaptic_events) / (
+                len(self.final_array) / self.sample_rate
+            )
+        else:
+            self.freq = np.nan
+
+    def acq_data(self) -> dict:
+        """
+        Creates the final data from the columns of the postsynaptic event
+        table.
+        """
+        final_dict = {}
+        self.sort_events()
+        if self.postsynaptic_events:
+            events = self.postsynaptic_events
+            s_r_c = events.settings["s_r_c"]
+            final_dict["Acquisition"] = np.full(
+                len(events), events.settings["acq_number"]
+            )
+            final_dict["Amplitude (pA)"] = events.column("amplitude")
+            final_dict["Est tau (ms)"] = events.column("final_tau_x")
+            final_dict["Event time (ms)"] = events.column("_event_peak_x") / s_r_c
+            final_dict["Acq time stamp"] = np.full(len(events), self.time_stamp)
+            final_dict["Rise time (ms)"] = events.column("rise_time")
+            final_dict["Rise rate (pA/ms)"] = events.column("rise_rate")
             if self.curve_fit_decay:
-                final_dict["Curve fit tau (ms)"] = [
-                    i.fit_tau for i in self.postsynaptic_events
-                ]
+                final_dict["Curve fit tau (ms)"] = events.column("fit_tau")
 
             final_dict["IEI (ms)"] = np.append(
                 np.diff(final_dict["Event time (ms)"]), np.nan
             )
-            self.freq = len(final_dict["Amplitude (pA)"]) / (
-                len(self.final_array) / self.sample_rate
-            )
         else:
             final_dict["Acquisition"] = [np.nan]
             final_dict["Amplitude (pA)"] = [np.nan]
@@ -422,19 +865,25 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
 
             final_dict["IEI (ms)"] = [np.nan]
             final_dict["Log IEI (ms)"] = [np.nan]
-            self.freq = np.nan
         return final_dict
 
     def get_event_arrays(self) -> list:
-        events = [i.event_array - i.event_start_y for i in self.postsynaptic_events]
+        events = self.postsynaptic_events
+        events = [
+            self.final_array[start:end] - start_y
+            for start, end, start_y in zip(
+                events.column("_array_start"),
+                events.column("_array_end"),
+                events.column("event_start_y"),
+            )
+        ]
         return events
 
     def peak_values(self) -> list:
-        peak_align_values = [i.peak_align_value for i in self.postsynaptic_events]
-        return peak_align_values
+        return self.postsynaptic_events.column("peak_align_value").tolist()
 
-    def total_events(self) -> list:
-        return len([i.amplitude for i in self.postsynaptic_events])
+    def total_events(self) -> int:
+        return len(self.postsynaptic_events)
 
     def save_postsynaptic_events(self):
         """
@@ -447,21 +896,21 @@ class MiniAnalysisAcq(filter_acq.FilterAcq, analysis="mini"):
         None.
 
         """
-        self.saved_events_dict = []
-        for i in self.postsynaptic_events:
-            i.event_array = "saved"
-            self.saved_events_dict += [i.__dict__]
+        self.saved_events_dict = self.postsynaptic_events.to_dicts()
         self.postsynaptic_events = "saved"
 
     def create_postsynaptic_events(self):
         """This function is used to create postsynaptic events from a
         saved JSON file since mini events are load as a dictionary.
         """
-        self.postsynaptic_events = []
+        events = []
         for i in self.saved_events_dict:
             h = MiniEvent()
             h.load_event(event_dict=i, final_array=self.final_array)
-            self.postsynaptic_events += [h]
+            events += [h]
+        self.postsynaptic_events = MiniEventTable.from_events(
+            events, self.final_array, self.event_settings()
+        )
 
     def del_postsynaptic_event(self, index: int):
         del self.postsynaptic_events[index]
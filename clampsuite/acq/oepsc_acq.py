@@ -1,11 +1,17 @@
-from typing import Union
+from collections import defaultdict
+from typing import Callable, Union
 
 import numpy as np
 from scipy import integrate, optimize
 
+from ..functions.batch_functions import interp_first_crossing, window_rows
 from ..functions.curve_fit import db_exp_decay, s_exp_decay
 from . import filter_acq
 
+# Number of samples after the peak searched at a time for the baseline
+# crossing by oEPSCAcq.measure_batch.
+CROSSING_BLOCK = 1024
+
 
 class oEPSCAcq(filter_acq.FilterAcq, analysis="oepsc"):
     def analyze(
@@ -19,6 +25,31 @@ class oEPSCAcq(filter_acq.FilterAcq, analysis="oepsc"):
         find_est_decay: bool = False,
         curve_fit_decay: bool = False,
         curve_fit_type: str = "s_exp",
+    ):
+        self.reset_analysis(
+            pulse_start,
+            n_window_start,
+            n_window_end,
+            p_window_start,
+            p_window_end,
+            find_ct,
+            find_est_decay,
+            curve_fit_decay,
+            curve_fit_type,
+        )
+        self.run_analysis()
+
+    def reset_analysis(
+        self,
+        pulse_start: Union[int, float] = 1000,
+        n_window_start: Union[int, float] = 1001,
+        n_window_end: Union[int, float] = 1050,
+        p_window_start: Union[int, float] = 1045,
+        p_window_end: Union[int, float] = 1055,
+        find_ct: bool = False,
+        find_est_decay: bool = False,
+        curve_fit_decay: bool = False,
+        curve_fit_type: str = "s_exp",
     ):
         # Set all the attributes
         self.pulse_start = pulse_start
@@ -37,10 +68,146 @@ class oEPSCAcq(filter_acq.FilterAcq, analysis="oepsc"):
         self.find_fdecay = curve_fit_decay
         self.curve_fit_type = curve_fit_type
 
-        self.run_analysis()
+    @classmethod
+    def analyze_batch(
+        cls, acqs: list, callback: Union[Callable, None] = None, **kwargs
+    ):
+        """Analyzes acquisitions the same way as analyze. The filtered arrays
+        of acquisitions with the same length, windows and sample rate are
+        stacked into a 2-D array and each measurement is computed for every
+        row at once. The results are written back to each acquisition.
+
+        Args:
+            acqs (list): oEPSC acquisitions.
+            callback (Callable, optional): Called with each acquisition
+                after its group is measured. Defaults to None.
+            **kwargs: Passed to reset_analysis.
+        """
+        groups = defaultdict(list)
+        for acq in acqs:
+            acq.reset_analysis(**kwargs)
+            acq.update_filtered_array(acq.array)
+            key = (
+                len(acq.filtered_array),
+                acq.sample_rate,
+                acq._pulse_start,
+                acq._baseline_start,
+                acq._baseline_end,
+                acq._n_window_start,
+                acq._n_window_end,
+                acq._p_window_start,
+                acq._p_window_end,
+            )
+            groups[key].append(acq)
+        for group in groups.values():
+            cls.measure_batch(group)
+            if callback is not None:
+                for acq in group:
+                    callback(acq)
+
+    @staticmethod
+    def measure_batch(acqs: list):
+        """Runs the steps of measure_oepsc on acquisitions that have the same
+        array length, windows and sample rate.
+        """
+        acq = acqs[0]
+        stacked = np.vstack([i.filtered_array for i in acqs])
+        num_rows, length = stacked.shape
+        rows = np.arange(num_rows)
+        baseline_mean = np.mean(
+            stacked[:, acq._baseline_start : acq._baseline_end], axis=1
+        )
+        positive = np.abs(np.max(stacked, axis=1)) > np.abs(np.min(stacked, axis=1))
+
+        # Amplitude
+        peak_x = np.zeros(num_rows, dtype=np.intp)
+        if positive.any():
+            window = stacked[positive, acq._p_window_start : acq._p_window_end]
+            peak_x[positive] = np.argmax(window, axis=1) + acq._p_window_start
+        if not positive.all():
+            window = stacked[~positive, acq._n_window_start : acq._n_window_end]
+            peak_x[~positive] = np.argmin(window, axis=1) + acq._n_window_start
+        peak_y = stacked[rows, peak_x]
+
+        # First crossing of the baseline after the peak. The rows are
+        # searched in blocks so the search stops once every row crossed.
+        sign = np.where(positive, -1.0, 1.0)
+        flat = stacked.ravel()
+        index = np.full(num_rows, length)
+        pending = rows
+        for offset in range(0, length, CROSSING_BLOCK):
+            starts = np.minimum(peak_x[pending] + offset, length)
+            stops = np.minimum(starts + CROSSING_BLOCK, length)
+            block, valid = window_rows(
+                flat, pending * length + starts, pending * length + stops
+            )
+            crossed = valid & (
+                (block - baseline_mean[pending, None]) * sign[pending, None] > 0
+            )
+            found = crossed.any(axis=1)
+            index[pending[found]] = starts[found] + np.argmax(crossed[found], axis=1)
+            pending = pending[~found & (stops < length)]
+            if pending.size == 0:
+                break
+
+        if acq.find_ct:
+            # Charge transfer from the cumulative integral of each row.
+            charge_transfer = np.zeros(num_rows)
+            end = index.max()
+            if end - acq._pulse_start >= 2:
+                cumulative = integrate.cumulative_trapezoid(
+                    stacked[:, acq._pulse_start : end],
+                    acq.x_array[acq._pulse_start : end],
+                    axis=1,
+                    initial=0,
+                )
+                columns = index - acq._pulse_start - 1
+                integrated = columns >= 1
+                charge_transfer[integrated] = cumulative[
+                    rows[integrated], columns[integrated]
+                ]
+
+        if acq.find_edecay:
+            # Time the decay crosses 1/e of the peak.
+            est_tau_y = peak_y * (1 / np.exp(1))
+            decay_y, valid = window_rows(
+                stacked.ravel(), rows * length + peak_x, rows * length + index
+            )
+            decay_x = acq.x_array[
+                np.minimum(
+                    peak_x[:, None] + np.arange(decay_y.shape[1]), len(acq.x_array) - 1
+                )
+            ]
+            est_tau_x = interp_first_crossing(
+                est_tau_y * sign, decay_y * sign[:, None], decay_x, valid
+            )
+
+        for i, acq in enumerate(acqs):
+            acq.baseline_mean = baseline_mean[i]
+            acq.peak_direction = "positive" if positive[i] else "negative"
+            acq.peak_y = peak_y[i]
+            acq._peak_x = peak_x[i]
+            acq._index = index[i]
+            if acq.find_ct:
+                acq.charge_transfer = charge_transfer[i]
+            if acq.find_edecay:
+                acq.decay_y = acq.filtered_array[acq._peak_x : acq._index]
+                acq.decay_x = acq.x_array[acq._peak_x : acq._index]
+                if acq.decay_y.size > 0:
+                    acq.est_tau_y = est_tau_y[i]
+                else:
+                    acq.est_tau_y = np.nan
+                acq.est_tau_x = est_tau_x[i]
+            else:
+                acq.est_tau_x = np.nan
+            if acq.find_fdecay:
+                acq.find_fit_decay()
 
     def run_analysis(self):
-        self.filter_array(self.array)
+        self.update_filtered_array(self.array)
+        self.measure_oepsc()
+
+    def measure_oepsc(self):
         self.baseline_mean = np.mean(
             self.filtered_array[self._baseline_start : self._baseline_end]
         )
@@ -57,7 +224,7 @@ class oEPSCAcq(filter_acq.FilterAcq, analysis="oepsc"):
             self.find_fit_decay()
 
     def find_peak_dir(self):
-        if abs(max(self.filtered_array)) > abs(min(self.filtered_array)):
+        if abs(np.max(self.filtered_array)) > abs(np.min(self.filtered_array)):
             self.peak_direction = "positive"
         else:
             self.peak_direction = "negative"
@@ -99,27 +266,25 @@ class oEPSCAcq(filter_acq.FilterAcq, analysis="oepsc"):
             self._index = len(self.filtered_array)
 
     def find_charge_transfer(self):
-        self.charge_transfer = integrate.trapz(
+        self.charge_transfer = integrate.trapezoid(
             self.filtered_array[self._pulse_start : self._index],
             self.x_array[self._pulse_start : self._index],
         )
 
     def find_est_decay(self):
         self.decay_y = self.filtered_array[self._peak_x : self._index]
+        self.decay_x = self.x_array[self._peak_x : self._index]
         if self.decay_y.size > 0:
             self.est_tau_y = self.peak_y * (1 / np.exp(1))
+            sign = -1.0 if self.peak_direction == "positive" else 1.0
 
-        if self.peak_direction == "positive":
-            y = -self.est_tau_y
-            decay_y = -self.decay_y
-        else:
-            y = self.est_tau_y
-            decay_y = self.decay_y
-
-        if self.decay_y.size > 0:
-            self.decay_x = self.x_array[self._peak_x : self._index]
-            self.est_tau_x = np.interp(y, decay_y, self.decay_x)
-
+            # The decay is not always increasing so the time is interpolated
+            # at the first crossing of 1/e of the peak.
+            self.est_tau_x = interp_first_crossing(
+                np.array([self.est_tau_y * sign]),
+                self.decay_y[None, :] * sign,
+                self.decay_x[None, :],
+            )[0]
         else:
             self.est_tau_x = np.nan
             self.est_tau_y = np.nan
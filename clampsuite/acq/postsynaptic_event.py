@@ -3,7 +3,7 @@ import numpy as np
 from scipy import optimize, signal
 from scipy.stats import linregress
 
-from ..functions.curve_fit import db_exp_decay, s_exp_decay
+from ..functions.curve_fit import batch_exp_decay_fit, db_exp_decay, s_exp_decay
 
 
 class MiniEvent:
@@ -18,6 +18,32 @@ class MiniEvent:
     def __init__(self):
         self.mini_class = "Mini"
 
+    def __getattr__(self, name: str):
+        # Only called when the attribute is not in __dict__. A MiniEvent that
+        # is bound to a row of a MiniEventTable reads its values from the
+        # table.
+        table = self.__dict__.get("_table")
+        if table is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        return table.get_value(name, self.__dict__["_row"])
+
+    def __setattr__(self, name: str, value):
+        table = self.__dict__.get("_table")
+        if table is None or not table.set_value(name, self.__dict__["_row"], value):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def view(cls, table: "MiniEventTable", row: int) -> "MiniEvent":
+        """Creates a MiniEvent that reads and writes a row of a
+        MiniEventTable.
+        """
+        event = cls.__new__(cls)
+        event.__dict__["_table"] = table
+        event.__dict__["_row"] = row
+        return event
+
     def analyze(
         self,
         acq_number: int,
@@ -30,6 +56,31 @@ class MiniEvent:
             "s_exp",
             "db_exp",
         ] = "dp_exp",
+    ):
+        self.set_event_settings(
+            acq_number,
+            event_pos,
+            event_length,
+            sample_rate,
+            curve_fit_decay,
+            curve_fit_type,
+        )
+        self.create_event(y_array)
+        self.find_peak()
+        self.find_event_parameters(y_array)
+        self.peak_align_value = self._event_peak_x - self._array_start
+
+    def set_event_settings(
+        self,
+        acq_number: int,
+        event_pos: int,
+        event_length: int,
+        sample_rate: int,
+        curve_fit_decay: bool = False,
+        curve_fit_type: Literal[
+            "s_exp",
+            "db_exp",
+        ] = "dp_exp",
     ):
         self.acq_number = acq_number
         self._event_pos = int(event_pos)
@@ -40,10 +91,6 @@ class MiniEvent:
         self.fit_tau = np.nan
         self.event_length = event_length
         self._event_length = int(event_length * self.s_r_c)
-        self.create_event(y_array)
-        self.find_peak()
-        self.find_event_parameters(y_array)
-        self.peak_align_value = self._event_peak_x - self._array_start
 
     def create_event(self, y_array: Union[np.ndarray, list]):
         self._array_start = int(self._event_pos - (2 * self.s_r_c))
@@ -387,3 +434,220 @@ class MiniEvent:
 
         if "_event_tau_x" or "event_tau_x" not in event_dict.keys():
             self.est_decay()
+
+
+class MiniEventTable:
+    """
+    This class stores the mini events of an acquisition as columns. Each
+    measurement is a numpy array with one value per event so values for the
+    whole acquisition are column slices. Indexing the table returns a
+    MiniEvent that reads and writes its row which is how the user interface
+    edits events.
+    """
+
+    int_columns = (
+        "_event_pos",
+        "_array_start",
+        "_array_end",
+        "adjust_pos",
+        "_event_peak_x",
+        "_event_start_x",
+        "peak_align_value",
+    )
+    float_columns = (
+        "event_peak_y",
+        "event_start_y",
+        "amplitude",
+        "est_tau_y",
+        "_event_tau_x",
+        "final_tau_x",
+        "rise_time",
+        "rise_rate",
+        "fit_tau",
+        "event_baseline",
+    )
+    bool_columns = ("fit_converged",)
+    object_columns = ("fit_decay_x", "fit_decay_y")
+    settings_keys = (
+        "mini_class",
+        "acq_number",
+        "sample_rate",
+        "s_r_c",
+        "curve_fit_decay",
+        "curve_fit_type",
+        "event_length",
+        "_event_length",
+    )
+
+    def __init__(self, y_array: np.ndarray, settings: dict, size: int = 0):
+        self.y_array = y_array
+        self.settings = {key: settings.get(key) for key in self.settings_keys}
+        self.columns = {}
+        for key in self.int_columns:
+            self.columns[key] = np.zeros(size, dtype=np.int64)
+        for key in self.float_columns:
+            self.columns[key] = np.full(size, np.nan)
+        for key in self.bool_columns:
+            self.columns[key] = np.zeros(size, dtype=bool)
+        for key in self.object_columns:
+            self.columns[key] = np.full(size, None, dtype=object)
+
+    @classmethod
+    def from_events(
+        cls, events: list, y_array: np.ndarray, settings: dict
+    ) -> "MiniEventTable":
+        """Creates a table from analyzed or loaded MiniEvents. The settings
+        of the first event are used over the settings that are passed.
+        """
+        if events:
+            settings = dict(settings)
+            for key in cls.settings_keys:
+                if key in events[0].__dict__:
+                    settings[key] = events[0].__dict__[key]
+        table = cls(y_array, settings, len(events))
+        for row, event in enumerate(events):
+            table.set_row(row, event)
+        return table
+
+    def __len__(self) -> int:
+        return self.columns["_event_pos"].size
+
+    def __getitem__(self, index: int) -> MiniEvent:
+        return MiniEvent.view(self, range(len(self))[index])
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield MiniEvent.view(self, row)
+
+    def __delitem__(self, index: int):
+        row = range(len(self))[index]
+        for key, column in self.columns.items():
+            self.columns[key] = np.delete(column, row)
+
+    def column(self, key: str) -> np.ndarray:
+        return self.columns[key]
+
+    def get_value(self, key: str, row: int):
+        if key in self.columns:
+            return self.columns[key][row]
+        elif key in self.settings:
+            return self.settings[key]
+        elif key == "event_array":
+            start = self.columns["_array_start"][row]
+            end = self.columns["_array_end"][row]
+            return self.y_array[start:end]
+        raise AttributeError(f"'MiniEvent' object has no attribute '{key}'")
+
+    def set_value(self, key: str, row: int, value) -> bool:
+        if key not in self.columns:
+            return False
+        self.columns[key][row] = value
+        return True
+
+    def set_row(self, row: int, event: MiniEvent):
+        """Copies the values of a MiniEvent that is not bound to a table."""
+        for key, column in self.columns.items():
+            if key in event.__dict__:
+                column[row] = event.__dict__[key]
+
+    def set_windows(self, positions: np.ndarray):
+        """Sets the event position and the window of each event the same way
+        as MiniEvent.create_event.
+        """
+        s_r_c = self.settings["s_r_c"]
+        positions = np.asarray(positions, dtype=np.int64)
+        self.columns["_event_pos"][:] = positions
+        self.columns["_array_start"][:] = np.trunc(positions - (2 * s_r_c))
+        self.columns["adjust_pos"][:] = positions - self.columns["_array_start"]
+        self.columns["_array_end"][:] = np.minimum(
+            positions + self.settings["_event_length"], len(self.y_array) - 1
+        )
+
+    def decay_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the decay of each event as a row of a 2-D array and the
+        length of each decay. The decays are the same as
+        MiniEvent.find_decay_array.
+        """
+        peak_x = self.columns["_event_peak_x"]
+        array_end = self.columns["_array_end"]
+        width = int(np.max(array_end - peak_x, initial=1))
+        samples = peak_x[:, None] + np.arange(width)[None, :]
+        in_event = samples < array_end[:, None]
+        decays = np.asarray(self.y_array)[np.minimum(samples, len(self.y_array) - 1)]
+        above = (decays > self.columns["event_start_y"][:, None]) & in_event
+        lengths = np.where(
+            above.any(axis=1),
+            np.argmax(above, axis=1),
+            np.argmax(np.where(in_event, decays, -np.inf), axis=1),
+        )
+        return decays, lengths
+
+    def fit_decays(self, fit_type: Literal["s_exp", "db_exp"] = "s_exp"):
+        """Fits the decay of every event with batch_exp_decay_fit. The
+        results are stored like MiniEvent.fit_decay and fit_converged is
+        True for the events where the fit converged. The fit values of
+        events where the fit did not converge are nan, the same as when
+        curve_fit fails in MiniEvent.fit_decay.
+        """
+        if len(self) == 0:
+            return
+        decays, lengths = self.decay_arrays()
+        est_tau = self.columns["_event_tau_x"] - self.columns["_event_peak_x"]
+        params, converged = batch_exp_decay_fit(
+            decays, lengths, self.columns["event_peak_y"], est_tau, fit_type
+        )
+        s_r_c = self.settings["s_r_c"]
+        self.columns["fit_converged"][:] = converged
+        self.columns["fit_tau"][:] = np.where(converged, params[:, 1], np.nan)
+        for row in range(len(self)):
+            if not converged[row]:
+                self.columns["fit_decay_x"][row] = np.nan
+                self.columns["fit_decay_y"][row] = np.nan
+                continue
+            decay_x = np.arange(lengths[row], dtype=np.float64)
+            if fit_type == "db_exp":
+                fit_decay_y = (
+                    db_exp_decay(decay_x, *params[row])
+                    + self.columns["event_start_y"][row]
+                )
+            else:
+                fit_decay_y = s_exp_decay(decay_x, *params[row])
+            self.columns["fit_decay_y"][row] = fit_decay_y
+            self.columns["fit_decay_x"][row] = (
+                decay_x + self.columns["_event_peak_x"][row]
+            ) / s_r_c
+
+    def append(self, event: MiniEvent):
+        new_row = MiniEventTable(self.y_array, self.settings, 1)
+        new_row.set_row(0, event)
+        for key, column in self.columns.items():
+            self.columns[key] = np.concatenate((column, new_row.columns[key]))
+
+    def take(self, rows: Union[np.ndarray, list]) -> "MiniEventTable":
+        table = MiniEventTable(self.y_array, self.settings)
+        rows = np.asarray(rows, dtype=np.int64)
+        table.columns = {key: value[rows] for key, value in self.columns.items()}
+        return table
+
+    def sort(self, key: str = "_event_peak_x"):
+        order = np.argsort(self.columns[key], kind="stable")
+        for name, column in self.columns.items():
+            self.columns[name] = column[order]
+
+    def to_dicts(self) -> list:
+        """Returns a dictionary for each event with the same keys as a
+        saved MiniEvent.
+        """
+        events = []
+        for row in range(len(self)):
+            event = dict(self.settings)
+            event["event_array"] = "saved"
+            for key, column in self.columns.items():
+                value = column[row]
+                if key in self.object_columns and value is None:
+                    continue
+                if key == "event_baseline" and np.isnan(value):
+                    continue
+                event[key] = value.item() if isinstance(value, np.generic) else value
+            events.append(event)
+        return events
@@ -1,6 +1,11 @@
 import datetime
+from pathlib import PurePath
+from typing import Literal, Union
+
+import pandas as pd
 
 import clampsuite
+from ..functions.load_functions import load_parquet_tables, save_parquet_tables
 
 
 class FinalAnalysis:
@@ -31,12 +36,45 @@ class FinalAnalysis:
         }
         return obj
 
-    def save_data(self):
+    def save_data(
+        self,
+        save_filename: Union[PurePath, str],
+        file_format: Literal["xlsx", "parquet"] = "xlsx",
+    ):
+        """Saves the final analysis dataframes.
+
+        Args:
+            save_filename (Union[PurePath, str]): Path and file name stem.
+            file_format (str, optional): "xlsx" saves an excel file with a
+                sheet per dataframe ({save_filename}.xlsx). "parquet" saves a
+                parquet file per dataframe in a directory
+                ({save_filename}.parquet), which is much faster for large
+                dataframes and keeps the dtypes. Defaults to "xlsx".
+        """
+        if file_format == "xlsx":
+            self.save_excel(save_filename)
+        elif file_format == "parquet":
+            save_parquet_tables(
+                f"{save_filename}.parquet", self.df_dict, self.program_data
+            )
+        else:
+            raise AttributeError("File format not recognized!")
+
+    def save_excel(self, save_filename: Union[PurePath, str]):
         raise NotImplementedError
 
     def load_data(self):
         raise NotImplementedError
 
+    def read_tables(self, file_path: Union[PurePath, str]) -> dict:
+        """Reads the dataframes saved by save_data. Parquet directories are
+        recognized by their suffix, anything else is read as an excel file.
+        """
+        if PurePath(file_path).suffix == ".parquet":
+            df_dict, self.program_data = load_parquet_tables(file_path)
+            return df_dict
+        return pd.read_excel(file_path, sheet_name=None)
+
     def create_program_df(self):
         self.program_data = {
             "Program": self.program,
@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from scipy.stats import linregress
 
+from ..functions.load_functions import save_excel_sheets
 from . import final_analysis
 
 
@@ -25,22 +26,13 @@ class FinalCurrentClampAnalysis(final_analysis.FinalAnalysis, analysis="current_
         self.final_data_pulse()
         self.final_data_ramp()
         self.create_first_ap_dfs(acq_dict, self.pulse_indexes, self.ramp_indexes)
+        self.create_spike_data(acq_dict)
 
     def load_data(self, file_path: str):
-        self.df_dict = {}
-        self.hertz = False
-        self.pulse_ap = False
-        self.ramp_ap = False
-
-        with pd.ExcelFile(file_path) as dfs:
-            for i in dfs.sheet_names:
-                self.df_dict[i] = pd.read_excel(file_path, sheet_name=i)
-                if i == "Hertz":
-                    self.hertz = True
-                if i == "Pulse APs":
-                    self.pulse_ap = True
-                if i == "Ramp APs":
-                    self.ramp_ap = True
+        self.df_dict = self.read_tables(file_path)
+        self.hertz = "Hertz" in self.df_dict
+        self.pulse_ap = "Pulse APs" in self.df_dict
+        self.ramp_ap = "Ramp APs" in self.df_dict
 
     def create_raw_data(self, acq_dict):
         raw_df = pd.DataFrame([acq_dict[i].acq_data() for i in acq_dict.keys()])
@@ -53,6 +45,32 @@ class FinalCurrentClampAnalysis(final_analysis.FinalAnalysis, analysis="current_
         raw_df.reset_index(drop=True, inplace=True)
         self.df_dict["Raw data"] = raw_df
 
+    def create_spike_data(self, acq_dict: dict):
+        """Puts the values of every spike of every acquisition into one
+        dataframe and averages the spikes by their position in the spike
+        train so the spike adaptation can be compared between epochs.
+        """
+        data = [acq_dict[i].spike_data() for i in acq_dict.keys()]
+        data = [i for i in data if len(i["Spike"]) > 0]
+        if not data:
+            return
+        spike_df = pd.DataFrame(
+            {key: np.concatenate([i[key] for i in data]) for key in data[0].keys()}
+        )
+        spike_df["Epoch"] = pd.to_numeric(spike_df["Epoch"])
+        spike_df["Pulse_amp (pA)"] = pd.to_numeric(spike_df["Pulse_amp (pA)"])
+        spike_df["Ramp"] = pd.to_numeric(spike_df["Ramp"])
+        spike_df["Acquisition"] = pd.to_numeric(spike_df["Acquisition"])
+        spike_df.sort_values(["Epoch", "Ramp", "Acquisition", "Spike"], inplace=True)
+        spike_df.reset_index(drop=True, inplace=True)
+        self.df_dict["Spike data"] = spike_df
+        self.df_dict["Spike averages"] = (
+            spike_df.drop(columns=["Acquisition", "Pulse_amp (pA)"])
+            .groupby(["Epoch", "Ramp", "Spike"])
+            .mean(numeric_only=True)
+            .reset_index()
+        )
+
     def create_average_data(self):
         ave_df = (
             self.df_dict["Raw data"]
@@ -179,20 +197,15 @@ class FinalCurrentClampAnalysis(final_analysis.FinalAnalysis, analysis="current_
         df.columns = columns
         self.df_dict[name] = df
 
-    def save_data(self, save_filename: str):
+    def save_excel(self, save_filename: str):
         """
         This function saves the resulting pandas data frames to an excel file.
         The function saves the data to the current directory so all that is
         needed is a name for the excel file.
         """
-        with pd.ExcelWriter(
-            f"{save_filename}.xlsx", mode="w", engine="xlsxwriter"
-        ) as writer:
-            for key, value in self.df_dict.items():
-                if key == "Final data":
-                    value.to_excel(writer, sheet_name=key)
-                else:
-                    value.to_excel(writer, index=False, sheet_name=key)
+        save_excel_sheets(
+            f"{save_filename}.xlsx", self.df_dict, index_sheets=["Final data"]
+        )
 
     def pulse_averages(self, raw_df: pd.DataFrame) -> pd.DataFrame:
         df_pulse = raw_df.loc[raw_df["Ramp"] == 0]
@@ -5,6 +5,7 @@ import pandas as pd
 from scipy.optimize import curve_fit
 
 from ..functions.curve_fit import s_exp_decay
+from ..functions.load_functions import save_excel_sheets
 from . import final_analysis
 
 
@@ -37,7 +38,9 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
         acquisition and the array for the average mini. One thing to note is
         that ieis have an added nan at the end of the data for each
         acquisition so that the ieis are aligned with the other data from
-        the acquisition.
+        the acquisition. The columns of the event tables are copied into
+        arrays that are allocated once for all the acquisitions and the
+        dataframe is created once from the arrays.
 
         Returns
         -------
@@ -47,14 +50,52 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
         acq_dict = {
             i[0]: i[1] for i in acq_dict.items() if len(i[1].postsynaptic_events) > 0
         }
-        df_list = [pd.DataFrame(i.acq_data()) for i in acq_dict.values()]
-        keys = list(acq_dict.keys())
-        self.s_r_c = acq_dict[keys[0]].s_r_c
+        acqs = list(acq_dict.values())
+        for acq in acqs:
+            acq.sort_events()
+        self.s_r_c = acqs[0].s_r_c
 
-        raw_df = pd.concat(df_list, axis=0, ignore_index=True)
+        counts = np.array([len(acq.postsynaptic_events) for acq in acqs])
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        columns = [
+            "amplitude",
+            "final_tau_x",
+            "_event_peak_x",
+            "rise_time",
+            "rise_rate",
+        ]
+        if acqs[0].curve_fit_decay:
+            columns.append("fit_tau")
+        values = {key: np.empty(ends[-1]) for key in columns}
+        for acq, start, end in zip(acqs, starts, ends):
+            for key in columns:
+                values[key][start:end] = acq.postsynaptic_events.column(key)
+
+        settings = [acq.postsynaptic_events.settings for acq in acqs]
+        event_time = values["_event_peak_x"] / np.repeat(
+            [i["s_r_c"] for i in settings], counts
+        )
+        iei = np.empty(ends[-1])
+        iei[:-1] = np.diff(event_time)
+        iei[ends - 1] = np.nan
+
+        raw_data = {
+            "Acquisition": np.repeat([i["acq_number"] for i in settings], counts),
+            "Amplitude (pA)": values["amplitude"],
+            "Est tau (ms)": values["final_tau_x"],
+            "Event time (ms)": event_time,
+            "Acq time stamp": np.repeat([acq.time_stamp for acq in acqs], counts),
+            "Rise time (ms)": values["rise_time"],
+            "Rise rate (pA/ms)": values["rise_rate"],
+        }
+        if acqs[0].curve_fit_decay:
+            raw_data["Curve fit tau (ms)"] = values["fit_tau"]
+        raw_data["IEI (ms)"] = iei
+        raw_df = pd.DataFrame(raw_data)
 
         raw_df["Acq time stamp"] = (
-            raw_df["Acq time stamp"] - raw_df["Acq time stamp"].unique()[0]
+            raw_df["Acq time stamp"] - raw_df["Acq time stamp"].iloc[0]
         ) * 1000
         raw_df["Real time"] = raw_df["Acq time stamp"] + raw_df["Event time (ms)"]
         raw_df.sort_values("Acquisition", inplace=True)
@@ -122,19 +163,67 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
         final_df.drop(["index"], axis=1, inplace=True)
         self.df_dict["Final data"] = final_df
 
-    def create_average_mini(self, acq_dict: dict):
-        peak_align_values = sum([item.peak_values() for item in acq_dict.values()], [])
-        events_list = sum([item.get_event_arrays() for item in acq_dict.values()], [])
-        max_min = max(peak_align_values)
-        start_values = [max_min - i for i in peak_align_values]
-        arrays = [np.append(i * [j[0]], j) for i, j in zip(start_values, events_list)]
-        max_length = max(map(len, arrays))
-        end_values = [max_length - len(i) for i in arrays]
-        final_arrays = [np.append(j, i * [j[-1]]) for i, j in zip(end_values, arrays)]
-        average_mini = np.average(np.array(final_arrays), axis=0)
-        return average_mini
-
-    def analyze_average_mini(self, average_mini: np.ndarray):
+    def aligned_events(self, acq_dict: dict) -> np.ndarray:
+        """
+        Creates a 2-D array with a row for each event where the events are
+        aligned to their peak. Each row is padded with the first value of the
+        event before the event and the last value of the event after it. The
+        array is allocated once and the rows of each acquisition are filled
+        with a single indexing of its final array.
+
+        Returns
+        -------
+        events : 2-D array of the aligned events.
+
+        """
+        columns = [
+            (
+                item.final_array,
+                np.asarray(item.postsynaptic_events.column("_array_start"), dtype=int),
+                np.asarray(item.postsynaptic_events.column("_array_end"), dtype=int),
+                np.asarray(item.postsynaptic_events.column("event_start_y")),
+                np.asarray(item.postsynaptic_events.column("peak_align_value"), int),
+            )
+            for item in acq_dict.values()
+        ]
+        peak_align_values = np.concatenate([i[4] for i in columns])
+        lengths = np.concatenate([i[2] - i[1] for i in columns])
+        max_min = peak_align_values.max()
+        max_length = (max_min - peak_align_values + lengths).max()
+        events = np.empty((peak_align_values.size, max_length))
+        row = 0
+        for final_array, start, end, start_y, peak_align_value in columns:
+            rows = slice(row, row + start.size)
+            index = np.clip(
+                np.arange(max_length) - (max_min - peak_align_value)[:, None],
+                0,
+                (end - start - 1)[:, None],
+            )
+            events[rows] = final_array[start[:, None] + index] - start_y[:, None]
+            row += start.size
+        return events
+
+    def create_average_mini(
+        self, acq_dict: dict
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the mean, SEM and median of the events aligned to their peak.
+        """
+        events = self.aligned_events(acq_dict)
+        average_mini = np.mean(events, axis=0)
+        if events.shape[0] > 1:
+            sem_mini = np.std(events, axis=0, ddof=1) / np.sqrt(events.shape[0])
+        else:
+            sem_mini = np.full(events.shape[1], np.nan)
+        median_mini = np.median(events, axis=0)
+        return average_mini, sem_mini, median_mini
+
+    def analyze_average_mini(
+        self,
+        average_mini: np.ndarray,
+        sem_mini: Union[np.ndarray, None] = None,
+        median_mini: Union[np.ndarray, None] = None,
+    ):
         average_mini = average_mini - np.mean(average_mini[0:10])
         event_peak_x = np.argmin(average_mini)
         event_peak_y = np.min(average_mini)
@@ -157,13 +246,18 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
             pd.Series(fit_decay_y, name="fit_decay_y"),
             pd.Series(decay_x, name="fit_decay_x"),
         ]
+        if sem_mini is not None:
+            temp_list.append(pd.Series(sem_mini, name="ave_mini_sem"))
+        if median_mini is not None:
+            median_mini = median_mini - np.mean(median_mini[0:10])
+            temp_list.append(pd.Series(median_mini, name="median_mini_y"))
         extra_data = pd.concat(temp_list, axis=1)
         self.df_dict["Extra data"] = extra_data
 
     def compute_data(self, acq_dict: dict):
         self.extract_raw_data(acq_dict)
-        average_mini = self.create_average_mini(acq_dict)
-        self.analyze_average_mini(average_mini)
+        average_mini, sem_mini, median_mini = self.create_average_mini(acq_dict)
+        self.analyze_average_mini(average_mini, sem_mini, median_mini)
         self.extract_final_data(acq_dict)
 
     def stem_components(
@@ -177,22 +271,19 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
             stems_x = np.stack([array_x, array_x], axis=-1).flatten()
             return array_x, array_y, stems_x, stems_y
 
-    def save_data(self, save_filename: str):
+    def save_excel(self, save_filename: str):
         """
         This function saves the resulting pandas data frames to an excel file.
         The function saves the data to the current directory so all that is
         needed is a name for the excel file.
         """
         prog_data = pd.DataFrame(self.program_data, index=None)
-        with pd.ExcelWriter(
-            f"{save_filename}.xlsx", mode="w", engine="openpyxl"
-        ) as writer:
-            for key, df in self.df_dict.items():
-                df.to_excel(writer, index=False, sheet_name=key)
-            prog_data.to_excel(writer, index=False, sheet_name="Program data")
+        save_excel_sheets(
+            f"{save_filename}.xlsx", {**self.df_dict, "Program data": prog_data}
+        )
 
     def load_data(self, file_path: str):
-        self.df_dict = pd.read_excel(file_path, sheet_name=None)
+        self.df_dict = self.read_tables(file_path)
         if "Final data" in self.df_dict:
             self.load_final_data(self.df_dict)
 
@@ -224,6 +315,20 @@ class FinalMiniAnalysis(final_analysis.FinalAnalysis, analysis="mini"):
         else:
             return np.array([])
 
+    def average_event_sem(self) -> np.ndarray:
+        df = self.extra_data()
+        if df is not None and "ave_mini_sem" in df:
+            return df["ave_mini_sem"].dropna().to_numpy()
+        else:
+            return np.array([])
+
+    def median_event_y(self) -> np.ndarray:
+        df = self.extra_data()
+        if df is not None and "median_mini_y" in df:
+            return df["median_mini_y"].dropna().to_numpy()
+        else:
+            return np.array([])
+
     def fit_decay_y(self) -> np.ndarray:
         df = self.extra_data()
         if df is not None:
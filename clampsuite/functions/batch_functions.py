@@ -0,0 +1,415 @@
+import math
+from typing import Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+
+def find_peaks_rows(
+    array: np.ndarray, distance: Union[int, float, None] = None, **kwargs
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the peaks of each row of a 2-D array with a single call to
+    signal.find_peaks. The rows are joined by runs of a value that is larger
+    than any value in the array. The runs are longer than twice the distance
+    and the prominence search window is limited to about one row so the peaks
+    found in a row are the same as calling find_peaks on the row by itself.
+
+    Args:
+        array (np.ndarray): 2-D array.
+        distance (Union[int, float, None], optional): Passed to find_peaks.
+        **kwargs: Passed to find_peaks. wlen is set by this function.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Row and column of each peak.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    num_rows, length = array.shape
+    if num_rows == 0 or length == 0:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    gap = 2 * (1 if distance is None else math.ceil(distance)) + 2
+    stride = length + gap
+    joined = np.full((num_rows, stride), np.max(array) + 1)
+    joined[:, :length] = array
+    peaks, _ = signal.find_peaks(
+        joined.ravel(), distance=distance, wlen=2 * stride + 1, **kwargs
+    )
+    rows, columns = np.divmod(peaks, stride)
+    keep = columns < length
+    return rows[keep], columns[keep]
+
+
+def window_rows(
+    array: np.ndarray,
+    starts: Union[np.ndarray, list],
+    stops: Union[np.ndarray, list],
+    fill: Union[int, float] = np.nan,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns array[starts[i] : stops[i]] as the rows of a 2-D array. Rows
+    shorter than the longest window are padded with fill. The starts cannot
+    be negative.
+
+    Args:
+        array (np.ndarray): 1-D array.
+        starts (Union[np.ndarray, list]): Start of each window.
+        stops (Union[np.ndarray, list]): End of each window.
+        fill (Union[int, float], optional): Value of the padding. Defaults to
+            np.nan.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The rows and a mask that is True for
+        the values inside each window.
+    """
+    array = np.asarray(array)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    width = max(1, int(np.max(stops - starts, initial=1)))
+    index = starts[:, None] + np.arange(width)[None, :]
+    valid = index < stops[:, None]
+    rows = np.asarray(
+        array[np.minimum(index, array.size - 1, out=index)],
+        dtype=np.result_type(array, fill),
+    )
+    rows[~valid] = fill
+    return rows, valid
+
+
+def find_peaks_windows(
+    array: np.ndarray,
+    starts: Union[np.ndarray, list],
+    stops: Union[np.ndarray, list],
+    invert: bool = False,
+    **kwargs,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Finds the same peaks as calling signal.find_peaks on
+    array[starts[i] : stops[i]] for each window with a single call to
+    find_peaks_rows. The windows are padded with a value larger than any
+    value in the windows so the padding does not change the peaks.
+
+    Args:
+        array (np.ndarray): 1-D array.
+        starts (Union[np.ndarray, list]): Start of each window.
+        stops (Union[np.ndarray, list]): End of each window.
+        invert (bool, optional): Find the peaks of -array. Defaults to False.
+        **kwargs: Passed to find_peaks_rows.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Window and position in the window of
+        each peak.
+    """
+    rows, valid = window_rows(array, starts, stops)
+    if invert:
+        np.negative(rows, out=rows)
+    if not valid.any():
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    rows[~valid] = np.max(rows[valid]) + 1
+    windows, columns = find_peaks_rows(rows, **kwargs)
+    keep = valid[windows, columns]
+    return windows[keep], columns[keep]
+
+
+def first_in_row(rows: np.ndarray, num_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns a mask of the rows that have a value and the position of the
+    first value of each of those rows in a sorted array of row numbers.
+    """
+    found = np.zeros(num_rows, dtype=bool)
+    found[rows] = True
+    first = np.searchsorted(rows, np.flatnonzero(found))
+    return found, first
+
+
+def interp_first_crossing(
+    x: np.ndarray,
+    xp: np.ndarray,
+    fp: np.ndarray,
+    valid: Union[np.ndarray, None] = None,
+) -> np.ndarray:
+    """Interpolates x[i] on each row of xp and fp. The interpolation is done
+    between the first value of xp[i] that is larger than x[i] and the value
+    before it, which gives the same result as np.interp for rows where xp is
+    increasing and is still defined for rows that are not. Rows without
+    valid values are nan.
+
+    Args:
+        x (np.ndarray): Value to interpolate for each row.
+        xp (np.ndarray): 2-D array of x-coordinates.
+        fp (np.ndarray): 2-D array of y-coordinates.
+        valid (Union[np.ndarray, None], optional): Mask of the values of each
+            row to use. The valid values need to be at the start of each row.
+            Defaults to None, which uses every value.
+
+    Returns:
+        np.ndarray: Interpolated value of each row.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    num_rows, width = xp.shape
+    if valid is None:
+        valid = np.ones(xp.shape, dtype=bool)
+    lengths = valid.sum(axis=1)
+    above = valid & (xp > x[:, None])
+    k = np.where(above.any(axis=1), np.argmax(above, axis=1), lengths)
+    rows = np.arange(num_rows)
+    j = np.clip(k - 1, 0, max(width - 2, 0))
+    following = np.minimum(j + 1, width - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (fp[rows, following] - fp[rows, j]) / (
+            xp[rows, following] - xp[rows, j]
+        )
+        result = slope * (x - xp[rows, j]) + fp[rows, j]
+    result = np.where(k == 0, fp[:, 0], result)
+    result = np.where(k == lengths, fp[rows, np.maximum(lengths - 1, 0)], result)
+    result[lengths == 0] = np.nan
+    return result
+
+
+def _relative_extrema(
+    windows: np.ndarray,
+    comparator,
+    order: int,
+    lengths: np.ndarray,
+    offsets: Union[np.ndarray, None] = None,
+) -> np.ndarray:
+    # Same as signal.argrelextrema(mode="clip") applied to
+    # windows[i, offsets[i] : offsets[i] + lengths[i]] for each row. Returns a
+    # mask where column j is window position j.
+    num_rows = windows.shape[0]
+    columns = np.arange(max(1, int(np.max(lengths, initial=1))))[None, :]
+    if offsets is None:
+        offsets = np.zeros(num_rows, dtype=np.intp)
+    offsets = offsets[:, None]
+    last = np.maximum(lengths[:, None] - 1, 0)
+    main = np.take_along_axis(windows, offsets + np.minimum(columns, last), axis=1)
+    results = columns < lengths[:, None]
+    for shift in range(1, order + 1):
+        plus = np.take_along_axis(
+            windows, offsets + np.minimum(columns + shift, last), axis=1
+        )
+        minus = np.take_along_axis(
+            windows, offsets + np.maximum(columns - shift, 0), axis=1
+        )
+        results &= comparator(main, plus)
+        results &= comparator(main, minus)
+    return results
+
+
+def _last_true(mask: np.ndarray) -> np.ndarray:
+    return mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+
+
+def _interp_increasing(
+    x: np.ndarray, xp: np.ndarray, fp: np.ndarray, lengths: np.ndarray
+) -> np.ndarray:
+    # np.interp(x[i], xp[i, : lengths[i]], fp[i, : lengths[i]]) for rows where
+    # xp is non-decreasing. Follows the branches of numpy's implementation so
+    # the results are identical.
+    rows = np.arange(x.size)
+    columns = np.arange(xp.shape[1])[None, :]
+    valid = columns < lengths[:, None]
+    last = lengths - 1
+    j = np.count_nonzero(valid & (xp <= x[:, None]), axis=1) - 1
+    j_safe = np.clip(j, 0, np.maximum(last - 1, 0))
+    x_j = xp[rows, j_safe]
+    x_next = xp[rows, np.minimum(j_safe + 1, last)]
+    f_j = fp[rows, j_safe]
+    f_next = fp[rows, np.minimum(j_safe + 1, last)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (f_next - f_j) / (x_next - x_j)
+        result = slope * (x - x_j) + f_j
+    result = np.where(xp[rows, j_safe] == x, f_j, result)
+    result = np.where(j == last, fp[rows, last], result)
+    result = np.where(x > xp[rows, last], fp[rows, last], result)
+    result = np.where(x < xp[:, 0], fp[:, 0], result)
+    result = np.where(lengths == 1, fp[:, 0], result)
+    return result
+
+
+def measure_mini_events(
+    y_array: Union[np.ndarray, list],
+    event_positions: Union[np.ndarray, list],
+    event_length: Union[int, float],
+    sample_rate: Union[int, float],
+) -> tuple[dict, np.ndarray]:
+    """Measures the peak, baseline, amplitude, rise time, rise rate and
+    estimated tau of many mini events at once. The measurements are the same
+    as MiniEvent.analyze without the curve fit. Each event window is a row of
+    a 2-D array so every step is an array operation over all the events.
+
+    Events that need the alternate peak or baseline methods, or whose windows
+    are cut off by the ends of the array, are not measured and need to be
+    analyzed with MiniEvent.analyze.
+
+    Args:
+        y_array (Union[np.ndarray, list]): Filtered array of the acquisition.
+        event_positions (Union[np.ndarray, list]): Sample position of each
+            event.
+        event_length (Union[int, float]): Length of the event window (ms).
+        sample_rate (Union[int, float]): Sample rate of the array.
+
+    Returns:
+        tuple[dict, np.ndarray]: Dictionary of MiniEvent attribute names and
+        arrays with a value for each event, and a boolean array that is False
+        for the events that were not measured.
+    """
+    y_array = np.asarray(y_array, dtype=np.float64)
+    positions = np.asarray(event_positions, dtype=np.int64)
+    num_events = positions.size
+    s_r_c = sample_rate / 1000
+
+    starts = np.trunc(positions - (2 * s_r_c)).astype(np.int64)
+    ends = positions + int(event_length * s_r_c)
+    lengths = ends - starts
+    measured = (starts >= 0) & (ends <= y_array.size - 1)
+    if measured.any():
+        length = int(np.max(lengths[measured]))
+        measured &= lengths == length
+    peak_order = int(0.4 * s_r_c)
+    if peak_order < 1 or not measured.any():
+        measured[:] = False
+        return {}, measured
+
+    index = np.flatnonzero(measured)
+    windows = sliding_window_view(y_array, length)[starts[index]]
+    starts = starts[index]
+    adjust = positions[index] - starts
+    rows = np.arange(index.size)
+    columns = np.arange(length)[None, :]
+    ok = np.ones(index.size, dtype=bool)
+
+    # MiniEvent.find_peak. Events without a peak use find_peak_alt.
+    peak_rows, peak_columns = find_peaks_rows(
+        -1 * windows,
+        prominence=4,
+        width=0.4 * s_r_c,
+        distance=int(3 * s_r_c),
+    )
+    keep = peak_columns > adjust[peak_rows]
+    peak_rows, peak_columns = peak_rows[keep], peak_columns[keep]
+    first_peak = np.full(index.size, -1, dtype=np.int64)
+    unique_rows, first = np.unique(peak_rows, return_index=True)
+    first_peak[unique_rows] = peak_columns[first]
+    ok &= first_peak > 0
+    peak_1 = np.where(ok, first_peak, 1)
+
+    # MiniEvent.peak_corr
+    minima = _relative_extrema(windows, np.less, peak_order, peak_1)
+    minima = np.pad(minima, ((0, 0), (0, length - minima.shape[1])))
+    minima &= columns > (peak_1 - 4 * s_r_c)[:, None]
+    minima &= windows < (0.85 * windows[rows, peak_1])[:, None]
+    peak = np.where(minima.any(axis=1), np.argmax(minima, axis=1), peak_1)
+    peak_y = windows[rows, peak]
+
+    # MiniEvent.find_baseline. The maximum is taken up to the absolute
+    # position of the peak like MiniEvent does.
+    max_stop = np.minimum(starts + peak, length)
+    ok &= max_stop > 0
+    baseline_max = np.max(
+        np.where(columns < max_stop[:, None], windows, -np.inf), axis=1
+    )
+    baselined = windows - baseline_max[:, None]
+    search = (baselined > (0.35 * peak_y)[:, None]) & (columns < peak[:, None])
+    ok &= search.any(axis=1)
+    search_start = _last_true(search)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = (windows - peak_y[:, None]) / (peak[:, None] - columns)
+    slope_start = slopes[rows, search_start]
+    ok &= slope_start + 1 > slope_start
+    # The slope loop stops at the first sample before search_start whose
+    # slope is not larger than the slope of the next sample.
+    stops = ~(slopes[:, :-1] > slopes[:, 1:])
+    stops &= columns[:, :-1] <= (search_start - 1)[:, None]
+    ok &= stops.any(axis=1)
+    i = _last_true(stops)
+    base_offset = i - s_r_c
+    ok &= base_offset > -1
+    lo = np.where(ok, np.trunc(base_offset), 0).astype(np.int64)
+    segment_lengths = np.where(ok, i + 2 - lo, 1)
+    maxima = _relative_extrema(baselined, np.greater, 2, segment_lengths, lo)
+    baseline_found = maxima.any(axis=1)
+    temp = np.where(
+        baseline_found,
+        np.trunc(_last_true(maxima) + base_offset),
+        np.trunc(base_offset),
+    ).astype(np.int64)
+    temp = np.where(ok, temp, 0)
+    start_y = windows[rows, temp]
+    peak_x = starts + peak
+    start_x = starts + temp
+
+    amplitude = np.abs(peak_y - start_y)
+
+    # MiniEvent.est_decay
+    decay_level = (peak_y - start_y) * 0.25
+    returned = ((windows - start_y[:, None]) >= decay_level[:, None]) & (
+        columns >= peak[:, None]
+    )
+    return_to_baseline = np.where(
+        returned.any(axis=1), np.argmax(returned, axis=1), peak
+    )
+    decay_lengths = return_to_baseline - peak
+    has_decay = decay_lengths > 0
+    est_tau_y = np.where(
+        has_decay, ((peak_y - start_y) * (1 / np.exp(1))) + start_y, np.nan
+    )
+    decay_width = max(1, int(np.max(decay_lengths, initial=1)))
+    decay_columns = np.minimum(
+        peak[:, None] + np.arange(decay_width)[None, :], length - 1
+    )
+    decay_y = np.take_along_axis(windows, decay_columns, axis=1)
+    decay_x = (starts[:, None] + decay_columns).astype(np.float64)
+    in_decay = np.arange(decay_width)[None, :] < decay_lengths[:, None]
+    increasing = np.all((decay_y[:, 1:] >= decay_y[:, :-1]) | ~in_decay[:, 1:], axis=1)
+    event_tau_x = np.full(index.size, np.nan)
+    simple = has_decay & increasing
+    if simple.any():
+        event_tau_x[simple] = _interp_increasing(
+            est_tau_y[simple],
+            decay_y[simple],
+            decay_x[simple],
+            decay_lengths[simple],
+        )
+    for row in np.flatnonzero(has_decay & ~increasing):
+        event_tau_x[row] = np.interp(
+            est_tau_y[row],
+            decay_y[row, : decay_lengths[row]],
+            decay_x[row, : decay_lengths[row]],
+        )
+    final_tau_x = (event_tau_x - peak_x) / s_r_c
+
+    # MiniEvent.calc_event_rise_time
+    rise_length = peak - temp
+    rise_time = (peak_x - start_x) / s_r_c
+    rise_start = temp + np.trunc(np.maximum(rise_length, 0) * 0.1).astype(np.int64)
+    rise_end = temp + np.trunc(np.maximum(rise_length, 0) * 0.9).astype(np.int64)
+    rise_count = rise_end - rise_start
+    in_rise = (columns >= rise_start[:, None]) & (columns < rise_end[:, None])
+    rise_x = (starts[:, None] + columns) / s_r_c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = np.sum(rise_x, axis=1, where=in_rise) / rise_count
+        mean_y = np.sum(windows, axis=1, where=in_rise) / rise_count
+        dx = rise_x - mean_x[:, None]
+        dy = windows - mean_y[:, None]
+        rise_slope = np.sum(dx * dy, axis=1, where=in_rise) / np.sum(
+            dx * dx, axis=1, where=in_rise
+        )
+    rise_rate = np.where(rise_count > 3, np.abs(rise_slope), np.nan)
+
+    measured[index] = ok
+    values = {
+        "_event_peak_x": peak_x,
+        "event_peak_y": peak_y,
+        "_event_start_x": start_x,
+        "event_start_y": start_y,
+        "amplitude": amplitude,
+        "est_tau_y": est_tau_y,
+        "_event_tau_x": event_tau_x,
+        "final_tau_x": final_tau_x,
+        "rise_time": rise_time,
+        "rise_rate": rise_rate,
+        "peak_align_value": peak,
+    }
+    columns_dict = {}
+    for key, value in values.items():
+        column = np.zeros(num_events, dtype=value.dtype)
+        column[index] = value
+        columns_dict[key] = column
+    return columns_dict, measured
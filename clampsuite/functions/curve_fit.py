@@ -43,6 +43,182 @@ def est_decay(
     return est_tau_y, est_tau_x
 
 
+def _exp_decay_terms(x_array, params):
+    # Parameters are stored as log(-amplitude) and log(tau) for each
+    # exponential so the amplitudes stay negative and the taus positive
+    # without bounds.
+    amps = -np.exp(params[:, 0::2])
+    taus = np.exp(params[:, 1::2])
+    return amps[:, None, :] * np.exp(-x_array[:, :, None] / taus[:, None, :])
+
+
+def _log_linear_decay(y_array, x_array, mask):
+    # Weighted least squares fit of log(-y) against x. The weights (y**2)
+    # make the fit approximate the least squares fit of the exponential.
+    mask = mask & (y_array < 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.log(-y_array)
+        w = np.where(mask, y_array**2, 0)
+        sw = np.sum(w, axis=1)
+        mean_x = np.sum(w * x_array, axis=1) / sw
+        mean_z = np.sum(np.where(mask, w * z, 0), axis=1) / sw
+        dx = x_array - mean_x[:, None]
+        slope = np.sum(np.where(mask, w * dx * (z - mean_z[:, None]), 0), axis=1) / (
+            np.sum(w * dx**2, axis=1)
+        )
+        intercept = mean_z - slope * mean_x
+        log_tau = np.log(-1 / slope)
+    valid = (np.sum(mask, axis=1) > 1) & (slope < 0) & np.isfinite(intercept)
+    return intercept, log_tau, valid
+
+
+def _exp_decay_jacobian(x_array, params, terms, mask):
+    # Derivatives of the decay with respect to log(-amplitude) and log(tau).
+    taus = np.exp(params[:, 1::2])
+    jacobian = np.empty(terms.shape[:2] + (params.shape[1],))
+    jacobian[:, :, 0::2] = terms
+    jacobian[:, :, 1::2] = terms * x_array[:, :, None] / taus[:, None, :]
+    jacobian *= mask[:, :, None]
+    return np.einsum("nlk,nlj->nkj", jacobian, jacobian), jacobian
+
+
+def batch_exp_decay_fit(
+    y_array: np.ndarray,
+    lengths: np.ndarray,
+    amplitude: np.ndarray,
+    tau: np.ndarray,
+    fit_type: str = "s_exp",
+    max_iter: int = 200,
+    ftol: float = 1e-8,
+    xtol: float = 1e-8,
+    max_tau: float = 100,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fits s_exp_decay or db_exp_decay to many decays at once. Each row of
+    y_array is a decay that starts at x = 0 and is lengths samples long. The
+    amplitudes of the fit are negative and the taus positive like the bounds
+    used by MiniEvent.fit_decay.
+
+    The starting values come from a log-linear fit of each decay, or from
+    amplitude and tau if that fails. All the decays are then refined together
+    with Levenberg-Marquardt steps. A nearly flat decay can meet ftol while
+    its tau grows without limit, so fits with a tau longer than max_tau times
+    the length of the decay, or with a singular covariance, are not counted
+    as converged.
+
+    Args:
+        y_array (np.ndarray): 2-D array with a decay in each row.
+        lengths (np.ndarray): Length of the decay in each row.
+        amplitude (np.ndarray): Fallback starting amplitude of each decay.
+        tau (np.ndarray): Fallback starting tau of each decay (samples).
+        fit_type (str, optional): "s_exp" or "db_exp". Defaults to "s_exp".
+        max_iter (int, optional): Maximum number of steps. Defaults to 200.
+        ftol (float, optional): Relative change in the sum of squares that
+            counts as converged. Defaults to 1e-8.
+        xtol (float, optional): Relative change in the amplitudes and taus
+            that counts as converged. Defaults to 1e-8.
+        max_tau (float, optional): Longest tau of a converged fit as a
+            multiple of the length of the decay. Defaults to 100.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Parameters of each fit in the order
+        used by s_exp_decay or db_exp_decay, and a boolean array that is True
+        for the fits that converged. Fits that did not converge keep the best
+        parameters that were found. Decays that could not be fit are nan.
+    """
+    if fit_type not in ("s_exp", "db_exp"):
+        raise AttributeError("Fit type not recognized.")
+    y_array = np.asarray(y_array, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    num_fits, width = y_array.shape
+    num_params = 2 if fit_type == "s_exp" else 4
+    x_array = np.broadcast_to(np.arange(width, dtype=np.float64), y_array.shape)
+    mask = np.arange(width)[None, :] < lengths[:, None]
+
+    log_amp, log_tau, valid = _log_linear_decay(y_array, x_array, mask)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_amp = np.where(valid, log_amp, np.log(-np.asarray(amplitude, float)))
+        log_tau = np.where(valid, log_tau, np.log(np.asarray(tau, float)))
+    if fit_type == "s_exp":
+        params = np.column_stack((log_amp, log_tau))
+    else:
+        # The double exponential starts from the single exponential fit.
+        single, single_converged = batch_exp_decay_fit(
+            y_array, lengths, amplitude, tau, "s_exp", max_iter, ftol, xtol, max_tau
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_amp = np.where(single_converged, np.log(-single[:, 0]), log_amp)
+            log_tau = np.where(single_converged, np.log(single[:, 1]), log_tau)
+        params = np.column_stack(
+            (
+                log_amp + np.log(0.8),
+                log_tau,
+                log_amp + np.log(0.2),
+                log_tau - np.log(5),
+            )
+        )
+    start = np.all(np.isfinite(params), axis=1) & (lengths >= num_params)
+    converged = np.zeros(num_fits, dtype=bool)
+    active = np.flatnonzero(start)
+    params = np.where(start[:, None], params, 0)
+
+    def cost(rows, values):
+        terms = _exp_decay_terms(x_array[rows], values)
+        residuals = np.where(mask[rows], np.sum(terms, axis=2) - y_array[rows], 0)
+        return residuals, terms
+
+    residuals, terms = cost(active, params[active])
+    sum_sq = np.sum(residuals**2, axis=1)
+    damping = np.full(active.size, 1e-3)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        jtj, jacobian = _exp_decay_jacobian(
+            x_array[active], params[active], terms, mask[active]
+        )
+        gradient = np.einsum("nlk,nl->nk", jacobian, residuals)
+        diagonal = np.einsum("nkk->nk", jtj)
+        system = jtj + (damping[:, None] * diagonal + 1e-12)[:, :, None] * np.eye(
+            num_params
+        )
+        step = -np.linalg.solve(system, gradient[:, :, None])[:, :, 0]
+        new_params = params[active] + step
+        with np.errstate(over="ignore", invalid="ignore"):
+            new_residuals, new_terms = cost(active, new_params)
+            new_sum_sq = np.sum(new_residuals**2, axis=1)
+        better = np.isfinite(new_sum_sq) & (new_sum_sq <= sum_sq)
+        done = better & (sum_sq - new_sum_sq <= ftol * sum_sq)
+        done |= better & (np.max(np.abs(step), axis=1) <= xtol)
+        params[active] = np.where(better[:, None], new_params, params[active])
+        residuals = np.where(better[:, None], new_residuals, residuals)
+        terms = np.where(better[:, None, None], new_terms, terms)
+        sum_sq = np.where(better, new_sum_sq, sum_sq)
+        damping = np.where(better, damping / 10, damping * 10)
+        converged[active[done]] = True
+        keep = ~done & (damping < 1e16)
+        active = active[keep]
+        residuals, terms = residuals[keep], terms[keep]
+        sum_sq, damping = sum_sq[keep], damping[keep]
+
+    # Check the taus and covariance of the fits that met ftol or xtol.
+    rows = np.flatnonzero(converged)
+    with np.errstate(over="ignore", invalid="ignore"):
+        jtj, _ = _exp_decay_jacobian(
+            x_array[rows], params[rows], cost(rows, params[rows])[1], mask[rows]
+        )
+        taus = np.exp(params[rows][:, 1::2])
+        converged[rows] = (
+            np.all(taus <= max_tau * lengths[rows, None], axis=1)
+            & np.all(np.isfinite(jtj), axis=(1, 2))
+            & (np.linalg.cond(jtj) < 1 / np.finfo(np.float64).eps)
+        )
+
+    fits = np.empty((num_fits, num_params))
+    fits[:, 0::2] = -np.exp(params[:, 0::2])
+    fits[:, 1::2] = np.exp(params[:, 1::2])
+    fits[~start] = np.nan
+    return fits, converged
+
+
 if __name__ == "__main__":
     s_exp_decay()
     db_exp_decay()
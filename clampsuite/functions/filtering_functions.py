@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Literal, Union
 
 import numpy as np
@@ -36,7 +37,9 @@ Windows = Literal[
 def median_filter(array: Union[np.ndarray, list], order: int):
     if isinstance(order, float):
         order = int(order)
-    filt_array = signal.medfilt(array, order)
+    # Only filter along the last axis when a 2-D array of sweeps is passed.
+    kernel_size = (1,) * (np.ndim(array) - 1) + (order,)
+    filt_array = signal.medfilt(array, kernel_size)
     return filt_array
 
 
@@ -68,33 +71,202 @@ def check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_ra
             raise AttributeError("high_pass must be > 0")
 
 
-def bessel(
-    array: Union[np.ndarray, list],
+FILTER_CACHE_SIZE = 64
+
+
+def _freeze(coefficients: np.ndarray) -> np.ndarray:
+    # Cached coefficients are shared between calls so they must not be
+    # modified in place.
+    coefficients.flags.writeable = False
+    return coefficients
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def iir_sos(
+    design: Literal["bessel", "butter", "ellip"],
     order: int,
     sample_rate: Union[int, float],
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
-):
+) -> np.ndarray:
+    """Designs an IIR filter in second-order sections. The designs are
+    cached (least recently used) since the same filter is typically used for
+    every acquisition in an experiment.
+    """
+    design_func = getattr(signal, design)
     if high_pass is not None and low_pass is not None:
-        sos = signal.bessel(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfilt(sos, array)
-        return filt_array
+        Wn = [high_pass, low_pass]
+        btype = "bandpass"
     elif high_pass is not None and low_pass is None:
-        sos = signal.bessel(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
+        Wn = high_pass
+        btype = "highpass"
     elif high_pass is None and low_pass is not None:
-        sos = signal.bessel(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
+        Wn = low_pass
+        btype = "lowpass"
+    else:
+        raise AttributeError("high_pass and/or low_pass must be provided")
+    # sosfilt needs a writeable array so the sections are not frozen.
+    sos = design_func(order, Wn=Wn, btype=btype, output="sos", fs=sample_rate)
+    return sos
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def fir_coefficients(
+    order: int,
+    sample_rate: Union[int, float],
+    high_pass: Union[int, float, None] = None,
+    high_width: Union[int, float, None] = None,
+    low_pass: Union[int, float, None] = None,
+    low_width: Union[int, float, None] = None,
+    window: str = "hann",
+) -> np.ndarray:
+    """Designs a windowed FIR filter using firwin2. The designs are cached
+    (least recently used) since the same filter is typically used for every
+    acquisition in an experiment.
+    """
+    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
+    if high_pass is not None and low_pass is not None:
+        freq = [
+            0,
+            high_pass - high_width,
+            high_pass,
+            low_pass,
+            low_pass + low_width,
+            sample_rate / 2,
+        ]
+        gain = [0, 0, 1, 1, 0, 0]
+    elif high_pass is not None and low_pass is None:
+        freq = [0, high_pass - high_width, high_pass, sample_rate / 2]
+        gain = [0, 0, 1, 1]
+    elif high_pass is None and low_pass is not None:
+        freq = [0, low_pass, low_pass + low_width, sample_rate / 2]
+        gain = [1, 1, 0, 0]
+    else:
+        raise AttributeError("high_pass and/or low_pass must be provided")
+    filt = signal.firwin2(order, freq=freq, gain=gain, window=window, fs=sample_rate)
+    return _freeze(filt)
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def remez_coefficients(
+    order: int,
+    sample_rate: Union[int, float],
+    high_pass: Union[int, float, None] = None,
+    high_width: Union[int, float, None] = None,
+    low_pass: Union[int, float, None] = None,
+    low_width: Union[int, float, None] = None,
+) -> np.ndarray:
+    """Designs an equiripple FIR filter using remez. The designs are cached
+    (least recently used) since the same filter is typically used for every
+    acquisition in an experiment.
+    """
+    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
+    if high_pass is not None and low_pass is not None:
+        bands = [
+            0,
+            high_pass - high_width,
+            high_pass,
+            low_pass,
+            low_pass + low_width,
+            sample_rate / 2,
+        ]
+        desired = [0, 1, 0]
+    elif high_pass is not None and low_pass is None:
+        bands = [0, high_pass - high_width, high_pass, sample_rate / 2]
+        desired = [0, 1]
+    elif high_pass is None and low_pass is not None:
+        bands = [0, low_pass, low_pass + low_width, sample_rate / 2]
+        desired = [1, 0]
+    else:
+        raise AttributeError("high_pass and/or low_pass must be provided")
+    filt = signal.remez(order, bands, desired, fs=sample_rate)
+    return _freeze(filt)
+
+
+# Above this number of taps overlap-add convolution is faster than the
+# direct-form convolution used by lfilter and filtfilt.
+FFT_TAP_THRESHOLD = 256
+
+
+def _use_fft(taps: int, length: int, method: Literal["auto", "direct", "fft"]) -> bool:
+    if method == "auto":
+        return taps >= FFT_TAP_THRESHOLD and length > taps
+    elif method == "fft":
+        return True
+    elif method == "direct":
+        return False
+    else:
+        raise AttributeError("method must be auto, direct or fft")
+
+
+def _fir_steady_state(filt: np.ndarray, array: np.ndarray) -> np.ndarray:
+    # Equivalent to lfilter with the initial conditions from lfilter_zi
+    # scaled by the first sample, i.e. the signal is assumed to have been
+    # constant before it started.
+    history = np.repeat(array[..., :1], filt.size - 1, axis=-1)
+    padded = np.concatenate((history, array), axis=-1)
+    kernel = filt.reshape((1,) * (array.ndim - 1) + (-1,))
+    return signal.oaconvolve(padded, kernel, mode="valid", axes=-1)
+
+
+def fir_filtfilt(
+    filt: np.ndarray,
+    array: Union[np.ndarray, list],
+    method: Literal["auto", "direct", "fft"] = "auto",
+) -> np.ndarray:
+    """Zero-phase FIR filtering along the last axis. The output is
+    numerically equivalent to signal.filtfilt(filt, 1.0, array) with the
+    default odd padding. The fft method runs both passes as overlap-add
+    convolutions.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    edge = 3 * filt.size
+    if not _use_fft(filt.size, array.shape[-1], method) or array.shape[-1] <= edge:
+        return signal.filtfilt(filt, 1.0, array, axis=-1)
+    left = 2 * array[..., :1] - array[..., edge:0:-1]
+    right = 2 * array[..., -1:] - array[..., -2 : -(edge + 2) : -1]
+    ext = np.concatenate((left, array, right), axis=-1)
+    forward = _fir_steady_state(filt, ext)
+    backward = _fir_steady_state(filt, forward[..., ::-1])[..., ::-1]
+    return backward[..., edge:-edge]
+
+
+def fir_group_delay_filter(
+    filt: np.ndarray,
+    array: Union[np.ndarray, list],
+    method: Literal["auto", "direct", "fft"] = "auto",
+) -> np.ndarray:
+    """Filters forward along the last axis and removes the group delay of
+    the filter, (order - 1) / 2 samples, so odd ordered filters are zero
+    phase. The fft method uses an overlap-add convolution.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    grp_delay = int(0.5 * (filt.size - 1))
+    if not _use_fft(filt.size, array.shape[-1], method):
+        padding = np.zeros(array.shape[:-1] + (grp_delay,))
+        acq1 = np.concatenate((array, padding), axis=-1)
+        filt_acq = signal.lfilter(filt, 1.0, acq1, axis=-1)
+        return filt_acq[..., grp_delay:]
+    kernel = filt.reshape((1,) * (array.ndim - 1) + (-1,))
+    filt_acq = signal.oaconvolve(array, kernel, mode="full", axes=-1)
+    return filt_acq[..., grp_delay : grp_delay + array.shape[-1]]
+
+
+def clear_filter_cache():
+    iir_sos.cache_clear()
+    fir_coefficients.cache_clear()
+    remez_coefficients.cache_clear()
+
+
+def bessel(
+    array: Union[np.ndarray, list],
+    order: int,
+    sample_rate: Union[int, float],
+    high_pass: Union[int, float, None] = None,
+    low_pass: Union[int, float, None] = None,
+):
+    sos = iir_sos("bessel", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfilt(sos, array)
     return filt_array
 
 
@@ -105,26 +277,8 @@ def bessel_zero(
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
 ):
-    if high_pass is not None and low_pass is not None:
-        sos = signal.bessel(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-        return filt_array
-    elif high_pass is not None and low_pass is None:
-        sos = signal.bessel(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-    elif high_pass is None and low_pass is not None:
-        sos = signal.bessel(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
+    sos = iir_sos("bessel", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfiltfilt(sos, array)
     return filt_array
 
 
@@ -135,26 +289,8 @@ def butterworth(
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
 ):
-    if high_pass is not None and low_pass is not None:
-        sos = signal.butter(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfilt(sos, array)
-        return filt_array
-    elif high_pass is not None and low_pass is None:
-        sos = signal.butter(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
-    elif high_pass is None and low_pass is not None:
-        sos = signal.butter(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
+    sos = iir_sos("butter", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfilt(sos, array)
     return filt_array
 
 
@@ -165,26 +301,8 @@ def butterworth_zero(
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
 ):
-    if high_pass is not None and low_pass is not None:
-        sos = signal.butter(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-        return filt_array
-    elif high_pass is not None and low_pass is None:
-        sos = signal.butter(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-    elif high_pass is None and low_pass is not None:
-        sos = signal.butter(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
+    sos = iir_sos("butter", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfiltfilt(sos, array)
     return filt_array
 
 
@@ -195,26 +313,8 @@ def elliptic(
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
 ):
-    if high_pass is not None and low_pass is not None:
-        sos = signal.ellip(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfilt(sos, array)
-        return filt_array
-    elif high_pass is not None and low_pass is None:
-        sos = signal.ellip(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
-    elif high_pass is None and low_pass is not None:
-        sos = signal.ellip(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfilt(sos, array)
+    sos = iir_sos("ellip", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfilt(sos, array)
     return filt_array
 
 
@@ -225,26 +325,8 @@ def elliptic_zero(
     high_pass: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
 ):
-    if high_pass is not None and low_pass is not None:
-        sos = signal.ellip(
-            order,
-            Wn=[high_pass, low_pass],
-            btype="bandpass",
-            output="sos",
-            fs=sample_rate,
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-        return filt_array
-    elif high_pass is not None and low_pass is None:
-        sos = signal.ellip(
-            order, Wn=high_pass, btype="highpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
-    elif high_pass is None and low_pass is not None:
-        sos = signal.ellip(
-            order, Wn=low_pass, btype="lowpass", output="sos", fs=sample_rate
-        )
-        filt_array = signal.sosfiltfilt(sos, array)
+    sos = iir_sos("ellip", order, sample_rate, high_pass, low_pass)
+    filt_array = signal.sosfiltfilt(sos, array)
     return filt_array
 
 
@@ -257,42 +339,12 @@ def fir_zero_1(
     low_pass: Union[int, float, None] = None,
     low_width: Union[int, float, None] = None,
     window: str = "hann",
+    method: Literal["auto", "direct", "fft"] = "auto",
 ):
-    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
-    if high_pass is not None and low_pass is not None:
-        filt = signal.firwin2(
-            order,
-            freq=[
-                0,
-                high_pass - high_width,
-                high_pass,
-                low_pass,
-                low_pass + low_width,
-                sample_rate / 2,
-            ],
-            gain=[0, 0, 1, 1, 0, 0],
-            window=window,
-            fs=sample_rate,
-        )
-        filt_array = signal.filtfilt(filt, 1.0, array)
-    elif high_pass is not None and low_pass is None:
-        filt = signal.firwin2(
-            order,
-            freq=[0, high_pass - high_width, high_pass, sample_rate / 2],
-            gain=[0, 0, 1, 1],
-            window=window,
-            fs=sample_rate,
-        )
-        filt_array = signal.filtfilt(filt, 1.0, array)
-    elif high_pass is None and low_pass is not None:
-        filt = signal.firwin2(
-            order,
-            freq=[0, low_pass, low_pass + low_width, sample_rate / 2],
-            gain=[1, 1, 0, 0],
-            window=window,
-            fs=sample_rate,
-        )
-        filt_array = signal.filtfilt(filt, 1.0, array)
+    filt = fir_coefficients(
+        order, sample_rate, high_pass, high_width, low_pass, low_width, window
+    )
+    filt_array = fir_filtfilt(filt, array, method)
     return filt_array
 
 
@@ -305,49 +357,12 @@ def fir_zero_2(
     low_pass: Union[int, float, None] = None,
     low_width: Union[int, float, None] = None,
     window: str = "hann",
+    method: Literal["auto", "direct", "fft"] = "auto",
 ):
-    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
-    grp_delay = int(0.5 * (order - 1))
-    if high_pass is not None and low_pass is not None:
-        filt = signal.firwin2(
-            order,
-            freq=[
-                0,
-                high_pass - high_width,
-                high_pass,
-                low_pass,
-                low_pass + low_width,
-                sample_rate / 2,
-            ],
-            gain=[0, 0, 1, 1, 0, 0],
-            window=window,
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(filt, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
-    elif high_pass is not None and low_pass is None:
-        hi = signal.firwin2(
-            order,
-            [0, high_pass - high_width, high_pass, sample_rate / 2],
-            gain=[0, 0, 1, 1],
-            window=window,
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(hi, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
-    elif high_pass is None and low_pass is not None:
-        lo = signal.firwin2(
-            order,
-            [0, low_pass, low_pass + low_width, sample_rate / 2],
-            gain=[1, 1, 0, 0],
-            window=window,
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(lo, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
+    filt = fir_coefficients(
+        order, sample_rate, high_pass, high_width, low_pass, low_width, window
+    )
+    filt_array = fir_group_delay_filter(filt, array, method)
     return filt_array
 
 
@@ -359,39 +374,12 @@ def remez_1(
     high_width: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
     low_width: Union[int, float, None] = None,
+    method: Literal["auto", "direct", "fft"] = "auto",
 ):
-    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
-    if high_pass is not None and low_pass is not None:
-        filt = signal.remez(
-            order,
-            [
-                0,
-                high_pass - high_width,
-                high_pass,
-                low_pass,
-                low_pass + low_width,
-                sample_rate / 2,
-            ],
-            [0, 1, 0],
-            fs=sample_rate,
-        )
-        filt_acq = signal.filtfilt(filt, 1.0, array)
-    elif high_pass is not None and low_pass is None:
-        hi = signal.remez(
-            order,
-            [0, high_pass - high_width, high_pass, sample_rate / 2],
-            [0, 1],
-            fs=sample_rate,
-        )
-        filt_acq = signal.filtfilt(hi, 1.0, array)
-    elif high_pass is None and low_pass is not None:
-        lo = signal.remez(
-            order,
-            [0, low_pass, low_pass + low_width, sample_rate / 2],
-            [1, 0],
-            fs=sample_rate,
-        )
-        filt_acq = signal.filtfilt(lo, 1.0, array)
+    filt = remez_coefficients(
+        order, sample_rate, high_pass, high_width, low_pass, low_width
+    )
+    filt_acq = fir_filtfilt(filt, array, method)
     return filt_acq
 
 
@@ -403,46 +391,12 @@ def remez_2(
     high_width: Union[int, float, None] = None,
     low_pass: Union[int, float, None] = None,
     low_width: Union[int, float, None] = None,
+    method: Literal["auto", "direct", "fft"] = "auto",
 ):
-    check_fir_filter_input(high_pass, high_width, low_pass, low_width, sample_rate)
-    grp_delay = int(0.5 * (order - 1))
-    if high_pass is not None and low_pass is not None:
-        filt = signal.remez(
-            numtaps=order,
-            bands=[
-                0,
-                high_pass - high_width,
-                high_pass,
-                low_pass,
-                low_pass + low_width,
-                sample_rate / 2,
-            ],
-            desired=[0, 1, 0],
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(filt, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
-    elif high_pass is not None and low_pass is None:
-        hi = signal.remez(
-            order,
-            [0, high_pass - high_width, high_pass, sample_rate / 2],
-            [0, 1],
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(hi, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
-    elif high_pass is None and low_pass is not None:
-        lo = signal.remez(
-            order,
-            [0, low_pass, low_pass + low_width, sample_rate / 2],
-            [1, 0],
-            fs=sample_rate,
-        )
-        acq1 = np.hstack((array, np.zeros(grp_delay)))
-        filt_acq = signal.lfilter(lo, 1.0, acq1)
-        filt_array = filt_acq[grp_delay:]
+    filt = remez_coefficients(
+        order, sample_rate, high_pass, high_width, low_pass, low_width
+    )
+    filt_array = fir_group_delay_filter(filt, array, method)
     return filt_array
 
 
@@ -1,10 +1,12 @@
 import json
 import re
 from math import nan
-from pathlib import PurePath, PurePosixPath, PureWindowsPath
-from typing import Union
+from pathlib import Path, PurePath, PurePosixPath, PureWindowsPath
+from typing import Iterable, Union
 
 import numpy as np
+import pandas as pd
+import xlsxwriter
 from scipy.io import loadmat, matlab
 
 
@@ -183,25 +185,12 @@ class NumpyEncoder(json.JSONEncoder):
     """
 
     def default(self, obj):
-        if isinstance(
-            obj,
-            (
-                np.int_,
-                np.intc,
-                np.intp,
-                np.int8,
-                np.int16,
-                np.int32,
-                np.int64,
-                np.uint8,
-                np.uint16,
-                np.uint32,
-                np.uint64,
-            ),
-        ):
+        if isinstance(obj, np.integer):
             return int(obj)
-        elif isinstance(obj, (np.float_, np.float16, np.float32, np.float64)):
+        elif isinstance(obj, np.floating):
             return float(obj)
+        elif isinstance(obj, np.bool_):
+            return bool(obj)
         elif isinstance(obj, (np.ndarray,)):
             return obj.tolist()
         elif isinstance(obj, (PurePath, PurePosixPath, PureWindowsPath)):
@@ -285,3 +274,283 @@ def load_json_file(path: Union[PurePath, str]) -> dict:
             if key not in ["postsynaptic_events", "final_events"]:
                 data[key] = np.array(data[key])
     return data
+
+
+HDF5_FORMAT_VERSION = 1
+
+
+def _import_h5py():
+    try:
+        import h5py
+    except ImportError as error:
+        raise ImportError(
+            "h5py is needed to save and load HDF5 experiments. "
+            "Install it with pip install clampsuite[data]."
+        ) from error
+    return h5py
+
+
+def _is_numeric_array(value) -> bool:
+    return isinstance(value, np.ndarray) and value.dtype.kind in "biuf"
+
+
+def _write_event_columns(group, events: list):
+    """Writes a list of event dictionaries as columns. Columns that only
+    contain numbers are stored as typed datasets, everything else is stored
+    as JSON in the group attributes.
+    """
+    keys = []
+    for i in events:
+        keys.extend(key for key in i.keys() if key not in keys)
+    other = {}
+    for key in keys:
+        column = [i.get(key, nan) for i in events]
+        if all(isinstance(j, (int, float, np.integer, np.floating)) for j in column):
+            group.create_dataset(key, data=np.asarray(column))
+        else:
+            other[key] = column
+    group.attrs["num_events"] = len(events)
+    group.attrs["metadata"] = json.dumps(other, cls=NumpyEncoder)
+
+
+def _read_event_columns(group) -> list:
+    columns = json.loads(group.attrs["metadata"])
+    for key, dset in group.items():
+        columns[key] = dset[()].tolist()
+    events = [{} for _ in range(int(group.attrs["num_events"]))]
+    for key, values in columns.items():
+        for event, value in zip(events, values):
+            event[key] = value
+    return events
+
+
+def save_hdf5_file(path: Union[PurePath, str], acq_dicts: Iterable[dict]):
+    """
+    Saves acquisitions to a single HDF5 file. Each acquisition is stored as
+    a group named after the acquisition. Numeric arrays are stored as typed
+    datasets, saved mini events are stored column-wise in an events subgroup
+    and all the remaining attributes are stored as JSON metadata.
+    """
+    h5py = _import_h5py()
+    with h5py.File(path, "w") as h5_file:
+        h5_file.attrs["program"] = "ClampSuite"
+        h5_file.attrs["format_version"] = HDF5_FORMAT_VERSION
+        acqs = h5_file.create_group("acqs")
+        for acq_dict in acq_dicts:
+            group = acqs.create_group(str(acq_dict["name"]))
+            metadata = {}
+            for key, value in acq_dict.items():
+                if key == "saved_events_dict":
+                    _write_event_columns(group.create_group("events"), value)
+                elif _is_numeric_array(value):
+                    group.create_dataset(key, data=value)
+                else:
+                    metadata[key] = value
+            group.attrs["metadata"] = json.dumps(metadata, cls=NumpyEncoder)
+
+
+def load_hdf5_file(path: Union[PurePath, str], lazy: bool = False) -> list:
+    """
+    This function loads all the acquisitions stored in an HDF5 file created
+    by save_hdf5_file. Arrays are read directly from the datasets so no text
+    parsing is needed. If lazy is True the arrays are not read, instead
+    LazyArray handles are stored in the _lazy_arrays key.
+    """
+    h5py = _import_h5py()
+    acq_dicts = []
+    with h5py.File(path, "r") as h5_file:
+        for group in h5_file["acqs"].values():
+            data = json.loads(group.attrs["metadata"])
+            for key in data.keys():
+                if isinstance(data[key], list):
+                    if key not in ["postsynaptic_events", "final_events"]:
+                        data[key] = np.array(data[key])
+            if lazy:
+                data["_lazy_arrays"] = {}
+            for key, item in group.items():
+                if key == "events":
+                    data["saved_events_dict"] = _read_event_columns(item)
+                elif lazy:
+                    data["_lazy_arrays"][key] = LazyArray(path, item.name)
+                else:
+                    data[key] = item[()]
+            acq_dicts.append(data)
+    return acq_dicts
+
+
+class LazyArray:
+    """
+    Handle to an array stored on disk. The array is only read when load is
+    called. Arrays stored contiguously in an HDF5 file are returned as a
+    copy-on-write memory map so only the pages that are used are read.
+    """
+
+    def __init__(self, path: Union[PurePath, str], key: str):
+        self.path = PurePath(path)
+        self.key = key
+
+    def __repr__(self):
+        return f"LazyArray({self.path}, {self.key})"
+
+    def load(self) -> np.ndarray:
+        if self.path.suffix == ".h5":
+            h5py = _import_h5py()
+            with h5py.File(self.path, "r") as h5_file:
+                dset = h5_file[self.key]
+                offset = dset.id.get_offset()
+                if dset.chunks is not None or offset is None:
+                    return dset[()]
+                dtype = dset.dtype
+                shape = dset.shape
+            return np.memmap(
+                str(self.path), dtype=dtype, mode="c", offset=offset, shape=shape
+            )
+        elif self.path.suffix == ".mat":
+            # The raw trace is the only array that is read from a mat file.
+            if self.key != "array":
+                raise AttributeError(f"{self.key} is not stored in {self.path}")
+            return load_mat(self.path)[self.path.stem]["data"]
+        elif self.path.suffix == ".json":
+            return load_json_file(self.path)[self.key]
+        else:
+            raise AttributeError("File type not recognized!")
+
+
+def read_lazy_arrays(lazy_arrays: dict, name: str) -> dict:
+    """Reads the lazy array name. A JSON file can only be read by parsing
+    the whole file, so the other arrays in lazy_arrays that point to the
+    same JSON file are read along with it.
+
+    Returns:
+        dict: The arrays that were read.
+    """
+    handle = lazy_arrays[name]
+    if handle.path.suffix != ".json":
+        return {name: handle.load()}
+    data = load_json_file(handle.path)
+    return {
+        key: data[value.key]
+        for key, value in lazy_arrays.items()
+        if value.path == handle.path
+    }
+
+
+def make_lazy(acq_dict: dict, path: Union[PurePath, str]) -> dict:
+    """Replaces the numeric arrays in an acquisition dictionary with
+    LazyArray handles that point back to the file they were loaded from.
+    Only the raw trace of a mat file is lazy since the other values are
+    read from the header.
+    """
+    lazy_arrays = {}
+    mat_file = PurePath(path).suffix == ".mat"
+    for key, value in list(acq_dict.items()):
+        if mat_file and key != "array":
+            continue
+        if _is_numeric_array(value) and value.ndim > 0:
+            lazy_arrays[key] = LazyArray(path, key)
+            del acq_dict[key]
+    acq_dict["_lazy_arrays"] = lazy_arrays
+    return acq_dict
+
+
+PARQUET_FORMAT_VERSION = 1
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError(
+            "pyarrow is needed to save and load parquet final analysis. "
+            "Install it with pip install clampsuite[data]."
+        ) from error
+    return pyarrow
+
+
+def save_parquet_tables(
+    path: Union[PurePath, str], df_dict: dict, program_data: dict
+) -> None:
+    """
+    Saves each dataframe to a parquet file named after the dataframe in the
+    path directory. Parquet only stores string column labels so the labels
+    that are not strings, the order of the dataframes and the program data
+    are stored in metadata.json.
+    """
+    _import_pyarrow()
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    metadata = {
+        "program": "ClampSuite",
+        "format_version": PARQUET_FORMAT_VERSION,
+        "program_data": program_data,
+        "tables": list(df_dict.keys()),
+        "columns": {},
+    }
+    for name, df in df_dict.items():
+        if not all(isinstance(i, str) for i in df.columns):
+            metadata["columns"][name] = {
+                "labels": list(df.columns),
+                "name": df.columns.name,
+            }
+            df = df.set_axis([str(i) for i in df.columns], axis=1)
+        df.to_parquet(path / f"{name}.parquet")
+    with open(path / "metadata.json", "w") as write_file:
+        json.dump(metadata, write_file, cls=NumpyEncoder)
+
+
+def load_parquet_tables(path: Union[PurePath, str]) -> tuple:
+    """
+    This function loads the dataframes saved by save_parquet_tables.
+
+    Returns:
+        tuple: Dictionary of the dataframes and the program data.
+    """
+    _import_pyarrow()
+    path = Path(path)
+    with open(path / "metadata.json", "r") as read_file:
+        metadata = json.load(read_file)
+    df_dict = {}
+    for name in metadata["tables"]:
+        df = pd.read_parquet(path / f"{name}.parquet")
+        if name in metadata["columns"]:
+            columns = metadata["columns"][name]
+            df.columns = pd.Index(columns["labels"], name=columns["name"])
+        df_dict[name] = df
+    return df_dict, metadata["program_data"]
+
+
+def _write_excel_row(worksheet, row: int, values: Iterable):
+    for col, value in enumerate(values):
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float):
+            if np.isnan(value):
+                continue
+            elif np.isinf(value):
+                value = "inf" if value > 0 else "-inf"
+        elif value is None or value is pd.NA or value is pd.NaT:
+            continue
+        worksheet.write(row, col, value)
+
+
+def save_excel_sheets(
+    path: Union[PurePath, str], df_dict: dict, index_sheets: Iterable[str] = ()
+) -> None:
+    """
+    Saves each dataframe to a sheet of an excel file with the same layout as
+    DataFrame.to_excel. The sheets are written row by row with the constant
+    memory mode of xlsxwriter so only the current row of the workbook is
+    kept in memory. The index is written for the sheets in index_sheets.
+    Nan values are left blank and infinite values are written as inf like
+    pandas does.
+    """
+    with xlsxwriter.Workbook(str(path), {"constant_memory": True}) as workbook:
+        for name, df in df_dict.items():
+            index = name in index_sheets
+            worksheet = workbook.add_worksheet(name)
+            header = list(df.columns)
+            if index:
+                header.insert(0, df.index.name)
+            _write_excel_row(worksheet, 0, header)
+            for row, values in enumerate(df.itertuples(index=index, name=None), 1):
+                _write_excel_row(worksheet, row, values)
@@ -0,0 +1,151 @@
+from typing import Callable, Union
+
+import numpy as np
+from scipy import signal
+
+
+def chunk_bounds(size: int, chunk_size: int) -> list:
+    """Start and stop of each chunk of an array of size values."""
+    chunk_size = max(int(chunk_size), 1)
+    return [
+        (start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)
+    ]
+
+
+def padded_slice(
+    array: np.ndarray, start: int, stop: int, period: Union[int, None] = None
+) -> np.ndarray:
+    """Returns array[start:stop] where start and stop can be outside of the
+    array. Values outside of the array are zero. If period is given the
+    array is treated as one period of a signal that is zero padded to period
+    values, which is how a FFT of length period sees the array.
+    """
+    size = len(array)
+    if start >= 0 and stop <= size:
+        return np.asarray(array[start:stop], dtype=np.float64)
+    indexes = np.arange(start, stop)
+    if period is not None:
+        indexes = indexes % period
+    inside = (indexes >= 0) & (indexes < size)
+    values = np.zeros(indexes.size)
+    if inside.any():
+        first, last = indexes[inside].min(), indexes[inside].max()
+        values[inside] = np.asarray(array[first : last + 1])[indexes[inside] - first]
+    return values
+
+
+def select_by_peak_distance(
+    peaks: np.ndarray, priority: np.ndarray, distance: Union[int, float]
+) -> np.ndarray:
+    """Same selection as the distance argument of scipy.signal.find_peaks.
+    Peaks are kept in order of priority and any peak closer than distance to
+    a kept peak is removed.
+    """
+    distance = np.ceil(distance)
+    keep = np.ones(peaks.size, dtype=bool)
+    priority_to_position = np.argsort(priority)
+    for i in range(peaks.size - 1, -1, -1):
+        j = priority_to_position[i]
+        if not keep[j]:
+            continue
+        k = j - 1
+        while 0 <= k and peaks[j] - peaks[k] < distance:
+            keep[k] = False
+            k -= 1
+        k = j + 1
+        while k < peaks.size and peaks[k] - peaks[j] < distance:
+            keep[k] = False
+            k += 1
+    return keep
+
+
+def _side_minimum(
+    read: Callable[[int, int], np.ndarray],
+    peak: int,
+    size: int,
+    step: int,
+    direction: int,
+) -> float:
+    # Minimum from the peak to the first higher value (or the end of the
+    # array) in one direction, which is how scipy finds the prominence.
+    height = read(peak, peak + 1)[0]
+    minimum = height
+    position = peak
+    while 0 <= position < size:
+        if direction < 0:
+            start, stop = max(position - step, 0), position
+            values = read(start, stop)[::-1]
+        else:
+            start, stop = position + 1, min(position + 1 + step, size)
+            values = read(start, stop)
+        if values.size == 0:
+            break
+        higher = np.flatnonzero(values > height)
+        if higher.size > 0:
+            return min(minimum, values[: higher[0]].min(initial=minimum))
+        minimum = min(minimum, values.min())
+        position = start if direction < 0 else stop - 1
+        if direction > 0 and stop == size:
+            break
+    return minimum
+
+
+def find_peaks_chunks(
+    read: Callable[[int, int], np.ndarray],
+    size: int,
+    chunk_size: int,
+    height: Union[int, float],
+    distance: Union[int, float, None] = None,
+    prominence: Union[int, float, None] = None,
+    context: Union[int, None] = None,
+) -> np.ndarray:
+    """Finds the same peaks as scipy.signal.find_peaks with the height,
+    distance and prominence arguments for an array that is read in chunks.
+    read(start, stop) returns the values of the array from start to stop.
+
+    Peaks above height are found in each chunk with context values on each
+    side. The distance selection is done on the peaks of all the chunks. The
+    prominence of a peak that does not have a higher value inside the
+    context on each side is found by reading further from the peak.
+
+    Returns:
+        np.ndarray: Positions of the peaks.
+    """
+    if context is None:
+        context = max(chunk_size // 4, 1)
+    positions = []
+    heights = []
+    prominences = []
+    for start, stop in chunk_bounds(size, chunk_size):
+        low, high = max(start - context, 0), min(stop + context, size)
+        values = read(low, high)
+        peaks, properties = signal.find_peaks(values, height=height)
+        inside = (peaks + low >= start) & (peaks + low < stop)
+        peaks = peaks[inside]
+        positions.append(peaks + low)
+        heights.append(properties["peak_heights"][inside])
+        if prominence is None or peaks.size == 0:
+            prominences.append(np.full(peaks.size, np.inf))
+            continue
+        chunk_prominences = signal.peak_prominences(values, peaks)[0]
+        left_max = np.maximum.accumulate(values)
+        right_max = np.maximum.accumulate(values[::-1])[::-1]
+        left_found = (low == 0) | (left_max[np.maximum(peaks - 1, 0)] > values[peaks])
+        left_found |= peaks == 0
+        right_found = high == size
+        right_found |= right_max[np.minimum(peaks + 1, values.size - 1)] > values[peaks]
+        for index in np.flatnonzero(~(left_found & right_found)):
+            peak = peaks[index] + low
+            left = _side_minimum(read, peak, size, chunk_size, -1)
+            right = _side_minimum(read, peak, size, chunk_size, 1)
+            chunk_prominences[index] = values[peaks[index]] - max(left, right)
+        prominences.append(chunk_prominences)
+    positions = np.concatenate(positions)
+    heights = np.concatenate(heights)
+    prominences = np.concatenate(prominences)
+    keep = np.ones(positions.size, dtype=bool)
+    if distance is not None:
+        keep &= select_by_peak_distance(positions, heights, distance)
+    if prominence is not None:
+        keep &= prominences >= prominence
+    return positions[keep]
@@ -1,6 +1,12 @@
+from functools import lru_cache
 from typing import Union
 
 import numpy as np
+from scipy.fft import irfft, rfft
+
+SPECTRUM_CACHE_SIZE = 16
+KERNEL_TOLERANCE = 1e-15
+MAX_KERNEL_LENGTH = 2**24
 
 
 def create_template(
@@ -41,3 +47,111 @@ def create_template(
     )
     template[offset:] = y
     return template
+
+
+@lru_cache(maxsize=SPECTRUM_CACHE_SIZE)
+def template_spectrum(
+    amplitude: Union[int, float],
+    tau_1: Union[int, float],
+    tau_2: Union[int, float],
+    risepower: Union[int, float],
+    length: Union[int, float],
+    spacer: Union[int, float],
+    sample_rate: int,
+    nfft: int,
+) -> np.ndarray:
+    """Real FFT of the template zero padded to nfft values. The spectra are cached
+    (least recently used) since every acquisition in an experiment is
+    deconvolved with the same template and usually has the same length.
+
+    Returns:
+        np.array: Read only numpy array of the spectrum.
+    """
+    template = create_template(
+        amplitude, tau_1, tau_2, risepower, length, spacer, sample_rate
+    )
+    H = rfft(template, n=nfft)
+    H.flags.writeable = False
+    return H
+
+
+@lru_cache(maxsize=SPECTRUM_CACHE_SIZE)
+def wiener_spectrum(
+    amplitude: Union[int, float],
+    tau_1: Union[int, float],
+    tau_2: Union[int, float],
+    risepower: Union[int, float],
+    length: Union[int, float],
+    spacer: Union[int, float],
+    sample_rate: int,
+    nfft: int,
+    lambd: Union[int, float],
+) -> np.ndarray:
+    """Wiener deconvolution filter, conj(H) / (|H|^2 + lambd^2), for the
+    template spectrum H. Cached the same way as template_spectrum.
+
+    Returns:
+        np.array: Read only numpy array of the filter.
+    """
+    H = template_spectrum(
+        amplitude, tau_1, tau_2, risepower, length, spacer, sample_rate, nfft
+    )
+    G = np.conj(H) / (H * np.conj(H) + lambd**2)
+    G.flags.writeable = False
+    return G
+
+
+@lru_cache(maxsize=SPECTRUM_CACHE_SIZE)
+def deconvolution_kernel(
+    amplitude: Union[int, float],
+    tau_1: Union[int, float],
+    tau_2: Union[int, float],
+    risepower: Union[int, float],
+    length: Union[int, float],
+    spacer: Union[int, float],
+    sample_rate: int,
+    decon_type: str,
+    lambd: Union[int, float] = 4,
+) -> tuple[np.ndarray, int]:
+    """Time domain kernel of the fft (1 / H) or wiener deconvolution. The
+    kernel is found with a FFT length that is doubled until the kernel has
+    decayed to KERNEL_TOLERANCE of its maximum and is then cut where it is
+    smaller than that. Convolving with the kernel gives the same values as
+    the frequency domain deconvolution of the whole array, but can be done a
+    piece of the array at a time.
+
+    Returns:
+        tuple[np.ndarray, int]: Read only kernel and the number of samples
+        of the kernel that are before time zero.
+    """
+    args = (amplitude, tau_1, tau_2, risepower, length, spacer, sample_rate)
+    nfft = 4 * create_template(*args).size
+    while True:
+        if decon_type == "fft":
+            spectrum = 1 / template_spectrum(*args, nfft)
+        elif decon_type == "wiener":
+            spectrum = wiener_spectrum(*args, nfft, lambd)
+        else:
+            raise AttributeError(f"{decon_type} does not have a kernel")
+        kernel = irfft(spectrum, n=nfft)
+        magnitude = np.abs(kernel)
+        cutoff = KERNEL_TOLERANCE * magnitude.max()
+        if (
+            magnitude[nfft // 4 : 3 * nfft // 4].max() <= cutoff
+            or nfft >= MAX_KERNEL_LENGTH
+        ):
+            break
+        nfft *= 2
+    half = nfft // 2
+    after = int(np.flatnonzero(magnitude[:half] > cutoff).max())
+    negative = np.flatnonzero(magnitude[half:] > cutoff)
+    before = int(nfft - half - negative.min()) if negative.size > 0 else 0
+    kernel = np.concatenate((kernel[nfft - before :], kernel[: after + 1]))
+    kernel.flags.writeable = False
+    return kernel, before
+
+
+def clear_spectrum_cache():
+    deconvolution_kernel.cache_clear()
+    wiener_spectrum.cache_clear()
+    template_spectrum.cache_clear()
@@ -1,5 +1,5 @@
 import math
-from typing import Union, Literal
+from typing import Callable, Iterable, Literal, Union
 
 import numpy as np
 from numpy.random import default_rng
@@ -7,6 +7,8 @@ from scipy import fft
 
 from clampsuite.functions.template_psc import create_template
 
+HISTOGRAM_BINS = 4096
+
 
 def round_sig(x, sig=2):
     if np.isnan(x):
@@ -21,6 +23,195 @@ def round_sig(x, sig=2):
             return round(x, sig - int(temp) - 1)
 
 
+def _lerp(a: float, b: float, t: float) -> float:
+    # Same interpolation as np.percentile's linear method.
+    diff = b - a
+    if t >= 0.5:
+        return b - diff * (1 - t)
+    return a + diff * t
+
+
+def trimmed_rms(
+    array: np.ndarray,
+    lower: Union[int, float] = 2.5,
+    upper: Union[int, float] = 97.5,
+    decimate: int = 1,
+) -> tuple[float, float]:
+    """Mean and root mean square deviation of the values that are between the
+    lower and upper percentiles of an array. The percentiles are found by
+    selection (np.partition) and interpolated the same way as np.percentile.
+    The array is copied once for the selection and the squared deviations are
+    computed in that copy, so the only other allocation is a boolean mask.
+
+    Args:
+        array (np.ndarray): 1-D array.
+        lower (Union[int, float], optional): Lower percentile. Defaults to 2.5.
+        upper (Union[int, float], optional): Upper percentile. Defaults to 97.5.
+        decimate (int, optional): Only use every nth value of the array. This
+            is faster on long arrays but is an estimate. Defaults to 1.
+
+    Returns:
+        tuple[float, float]: Mean and rms of the middle values.
+    """
+    array = np.asarray(array)[::decimate]
+    size = array.size
+    indexes = []
+    kth = []
+    for percentile in (lower, upper):
+        index = (size - 1) * (percentile / 100)
+        previous = min(math.floor(index), size - 1)
+        indexes.append((index, previous, min(previous + 1, size - 1)))
+        kth.extend(indexes[-1][1:])
+    buffer = array.astype(np.float64)
+    buffer.partition(kth)
+    bottom, top = (
+        _lerp(buffer[previous], buffer[following], index - previous)
+        for index, previous, following in indexes
+    )
+    # The order of the values does not matter for the sums so the
+    # partitioned copy is used from here on.
+    middle = (buffer > bottom) & (buffer < top)
+    count = np.count_nonzero(middle)
+    mu = np.sum(buffer, where=middle) / count
+    np.subtract(buffer, mu, out=buffer)
+    np.square(buffer, out=buffer)
+    rms = np.sqrt(np.sum(buffer, where=middle) / count)
+    return mu, rms
+
+
+def trimmed_rms_chunks(
+    chunks: Callable[[], Iterable[np.ndarray]],
+    size: int,
+    lower: Union[int, float] = 2.5,
+    upper: Union[int, float] = 97.5,
+    max_values: int = 2**20,
+) -> tuple[float, float]:
+    """Same as trimmed_rms for an array that is read in chunks so the whole
+    array never needs to be in memory. chunks is called once for each of the
+    two passes and returns the chunks of the array in order.
+
+    The values the percentiles are interpolated from are the kth smallest
+    values of the array. The first pass brackets each one between the
+    smallest and largest value of the same relative rank in each chunk,
+    which always contains it. The second pass keeps only the values inside
+    the brackets so the percentiles are exact and sums the values that are
+    between the brackets. If there are more than max_values inside the
+    brackets the second pass is repeated with the brackets narrowed to the
+    bins of a histogram of the brackets.
+
+    Args:
+        chunks (Callable[[], Iterable[np.ndarray]]): Returns the chunks.
+        size (int): Total number of values in the chunks.
+        lower (Union[int, float], optional): Lower percentile. Defaults to 2.5.
+        upper (Union[int, float], optional): Upper percentile. Defaults to 97.5.
+        max_values (int, optional): Maximum number of values that are kept
+            in memory. Defaults to 2**20.
+
+    Returns:
+        tuple[float, float]: Mean and rms of the middle values.
+    """
+    ranks = []
+    for percentile in (lower, upper):
+        index = (size - 1) * (percentile / 100)
+        previous = min(math.floor(index), size - 1)
+        ranks.append((index, previous, min(previous + 1, size - 1)))
+    brackets = np.array([[np.inf, -np.inf], [np.inf, -np.inf]])
+    for chunk in chunks():
+        # A chunk has at most floor(k * n / size) values below the kth
+        # smallest value of the array unless it is below all the chunk
+        # values of that rank, and likewise for the upper end.
+        kth = []
+        for _, previous, following in ranks:
+            kth.append(previous * chunk.size // size)
+            kth.append(min(-(-(following + 1) * chunk.size // size), chunk.size) - 1)
+        kth = np.maximum(kth, 0)
+        values = np.partition(chunk, kth)[kth]
+        brackets[:, 0] = np.minimum(brackets[:, 0], values[0::2])
+        brackets[:, 1] = np.maximum(brackets[:, 1], values[1::2])
+    shift = (brackets[0, 1] + brackets[1, 0]) / 2
+
+    while True:
+        (low_start, low_end), (high_start, high_end) = brackets
+        # Tied values can narrow a bracket to a few ulps, which is too
+        # narrow to split into histogram bins, so every value inside the
+        # brackets is kept.
+        widths = brackets[:, 1] - brackets[:, 0]
+        if np.any(widths <= HISTOGRAM_BINS * np.spacing(np.abs(brackets).max(1))):
+            max_values = np.inf
+        edge_values = []
+        num_edge_values = 0
+        counts = np.zeros((2, HISTOGRAM_BINS), dtype=np.int64)
+        below = np.zeros(2, dtype=np.int64)
+        count = 0
+        total = 0.0
+        total_sq = 0.0
+        for chunk in chunks():
+            below += np.count_nonzero(chunk[:, None] < brackets[:, 0], axis=0)
+            in_edges = ((chunk >= low_start) & (chunk <= low_end)) | (
+                (chunk >= high_start) & (chunk <= high_end)
+            )
+            if edge_values is not None:
+                edge_values.append(chunk[in_edges])
+                num_edge_values += edge_values[-1].size
+                if num_edge_values > max_values:
+                    edge_values = None
+            if max_values != np.inf:
+                for row, (start, end) in enumerate(brackets):
+                    counts[row] += np.histogram(chunk, HISTOGRAM_BINS, (start, end))[0]
+            inner = (chunk > low_end) & (chunk < high_start) & ~in_edges
+            count += np.count_nonzero(inner)
+            total += np.sum(chunk - shift, where=inner)
+            total_sq += np.sum(np.square(chunk - shift), where=inner)
+        if edge_values is not None:
+            break
+
+        # Too many values are inside the brackets, so the brackets are
+        # narrowed to the histogram bins that contain the kth smallest
+        # values and the pass is repeated.
+        narrowed = brackets.copy()
+        for row, ((_, previous, following), (start, end)) in enumerate(
+            zip(ranks, brackets)
+        ):
+            edges = np.linspace(start, end, HISTOGRAM_BINS + 1)
+            cumulative = np.cumsum(counts[row]) + below[row]
+            first = np.searchsorted(cumulative, previous, side="right")
+            last = np.searchsorted(cumulative, following, side="right")
+            # One extra bin on each side in case a value on the edge of a
+            # bin was counted in the next bin.
+            narrowed[row] = (
+                edges[max(first - 1, 0)],
+                edges[min(last + 2, HISTOGRAM_BINS)],
+            )
+        if np.array_equal(narrowed, brackets):
+            max_values = np.inf
+        brackets = narrowed
+    edge_values = np.sort(np.concatenate(edge_values))
+
+    percentiles = []
+    for (index, previous, following), (start, end), num_below in zip(
+        ranks, brackets, below
+    ):
+        values = edge_values[(edge_values >= start) & (edge_values <= end)]
+        if previous < num_below or following - num_below >= values.size:
+            raise RuntimeError("The percentile is outside of its bracket.")
+        percentiles.append(
+            _lerp(
+                values[previous - num_below],
+                values[following - num_below],
+                index - previous,
+            )
+        )
+    bottom, top = percentiles
+    middle = edge_values[(edge_values > bottom) & (edge_values < top)]
+    count += middle.size
+    total += np.sum(middle - shift)
+    total_sq += np.sum(np.square(middle - shift))
+    mean = total / count
+    mu = shift + mean
+    rms = np.sqrt(max(total_sq / count - mean**2, 0))
+    return mu, rms
+
+
 def white_noise_array(N):
     rng = default_rng(42)
     X_white = fft.rfft(rng.standard_normal(N))
@@ -150,3 +341,57 @@ def create_event_array(
         if (event_index + temp_event.size) < event_array.size:
             event_array[event_index : event_index + temp_event.size] += temp_event
     return event_array
+
+
+def create_spike_array(
+    sample_rate: int = 10000,
+    length: Union[int, float] = 1000,
+    pulse_start: Union[int, float] = 100,
+    pulse_end: Union[int, float] = 800,
+    spike_times: Union[list, np.ndarray, None] = None,
+    resting_v: Union[int, float] = -70,
+    pulse_v: Union[int, float] = -55,
+    white_noise_amp: Union[int, float] = 0.05,
+):
+    """Creates a current clamp array with a current pulse and action
+    potentials. The times are in ms. By default there is a spike every 60 ms
+    during the pulse.
+    """
+    s_r_c = sample_rate / 1000
+    x = np.arange(int(length * s_r_c)) / s_r_c
+    # The membrane charges and discharges with a 10 ms time constant.
+    on = 1 - np.exp(-np.maximum(x - pulse_start, 0) / 10)
+    off = 1 - np.exp(-np.maximum(x - pulse_end, 0) / 10)
+    spike_array = resting_v + (pulse_v - resting_v) * (on - off)
+    if spike_times is None:
+        spike_times = np.arange(pulse_start + 20, pulse_end - 20, 60)
+    for time in spike_times:
+        # Depolarization before the spike, the spike and the AHP.
+        spike_array += 6 * np.exp(np.minimum(x - time, 0) / 2) * (x < time)
+        spike_array += 95 * np.exp(-(((x - time) / 0.35) ** 2))
+        after = np.maximum(x - time - 0.6, 0)
+        spike_array -= 12 * (np.exp(-after / 8) - np.exp(-after))
+    spike_array += white_noise_amp * white_noise_array(x.size)
+    return spike_array
+
+
+def create_lfp_array(
+    sample_rate: int = 10000,
+    length: Union[int, float] = 2000,
+    pulse_start: Union[int, float] = 1000,
+    fv_amp: Union[int, float] = -0.3,
+    fp_amp: Union[int, float] = -1.5,
+    fp_time: Union[int, float] = 8,
+    white_noise_amp: Union[int, float] = 0.01,
+):
+    """Creates a field potential array with a fiber volley 2 ms and a field
+    potential fp_time ms after the pulse. The times are in ms.
+    """
+    s_r_c = sample_rate / 1000
+    x = np.arange(int(length * s_r_c)) / s_r_c - pulse_start
+    lfp_array = fv_amp * np.exp(-(((x - 2) / 0.4) ** 2))
+    lfp_array += 0.3 * np.exp(-(((x - 3.2) / 0.5) ** 2))
+    rise = np.maximum(x - 3.2, 0)
+    lfp_array += fp_amp * (rise / (fp_time - 3.2)) * np.exp(1 - rise / (fp_time - 3.2))
+    lfp_array += white_noise_amp * white_noise_array(x.size)
+    return lfp_array
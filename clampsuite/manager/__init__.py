@@ -1 +1,2 @@
 from .exp_manager import ExpManager  # noqa: F401
+from .cohort import Cohort  # noqa: F401
@@ -0,0 +1,164 @@
+import datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path, PurePath
+from typing import Callable, Iterable, Literal, Union
+
+import pandas as pd
+
+import clampsuite
+from ..final_analysis import FinalAnalysis
+from ..functions.load_functions import save_excel_sheets, save_parquet_tables
+from .exp_manager import ExpManager
+
+
+def _load_final_tables(analysis: str, path: Union[str, Path, PurePath]) -> dict:
+    """Loads the final analysis tables of a saved experiment. Only the final
+    analysis is read, the acquisitions are not loaded. This is a module level
+    function so that it can be pickled and sent to worker processes.
+    """
+    final_analysis = FinalAnalysis(analysis)
+    final_analysis.load_data(ExpManager.find_final_analysis(path))
+    return {
+        key: df for key, df in final_analysis.df_dict.items() if key != "Program data"
+    }
+
+
+class Cohort:
+    """
+    Combines the final analysis of many saved experiments, one experiment
+    per cell, into one dataframe per table with Cell and Group columns so
+    cells and groups (e.g. genotypes) can be compared.
+    """
+
+    def __init__(self, analysis: str) -> None:
+        self.analysis = analysis
+        self.cells = {}
+        self.df_dict = {}
+        self.callback_func = print
+
+    def set_callback(self, func: Callable) -> None:
+        self.callback_func = func
+
+    def add_exp(
+        self,
+        file_path: Union[str, Path, PurePath],
+        group: str,
+        cell: Union[str, None] = None,
+    ) -> None:
+        """Adds a saved experiment to the cohort.
+
+        Args:
+            file_path (Union[str, Path, PurePath]): Experiment directory
+                written by ExpManager.save_data, or the final analysis file.
+            group (str): Group of the cell.
+            cell (str, optional): Name of the cell. Defaults to the name of
+                the experiment directory or the stem of the file.
+        """
+        path = Path(file_path)
+        if cell is None:
+            cell = path.stem if path.suffix in (".parquet", ".xlsx") else path.name
+        if cell in self.cells:
+            raise AttributeError(f"Cell {cell} is already in the cohort!")
+        self.cells[cell] = {"path": path, "group": group}
+
+    def add_exps(self, file_paths: Iterable, group: str) -> None:
+        for i in file_paths:
+            self.add_exp(i, group)
+
+    def load(
+        self,
+        tables: Union[Iterable[str], None] = None,
+        workers: Union[int, None] = None,
+    ) -> None:
+        """Loads the final analysis of every cell and concatenates each table
+        across the cells. The tables of each cell are added as they are
+        loaded so only the combined tables are kept.
+
+        Args:
+            tables (Iterable[str], optional): Names of the tables to combine.
+                None combines every table. Defaults to None.
+            workers (int, optional): Number of processes used to read the
+                final analysis files. None or 1 reads them in the current
+                process. Defaults to None.
+        """
+        paths = [i["path"] for i in self.cells.values()]
+        if workers is None or workers <= 1:
+            self._combine(map(_load_final_tables, repeat(self.analysis), paths), tables)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self._combine(
+                    executor.map(_load_final_tables, repeat(self.analysis), paths),
+                    tables,
+                )
+        self.callback_func("Loaded cohort")
+
+    def _combine(self, loaded: Iterable[dict], tables: Union[Iterable, None]) -> None:
+        # Results come back in the order the cells were added.
+        if tables is not None:
+            tables = set(tables)
+        frames = defaultdict(list)
+        for (cell, info), df_dict in zip(self.cells.items(), loaded):
+            for key, df in df_dict.items():
+                if tables is None or key in tables:
+                    df.insert(0, "Group", info["group"])
+                    df.insert(0, "Cell", cell)
+                    frames[key].append(df)
+            self.callback_func(cell)
+        self.df_dict = {
+            key: pd.concat(dfs, ignore_index=True) for key, dfs in frames.items()
+        }
+
+    def cell_summary(self, table: str = "Raw data") -> pd.DataFrame:
+        """Number of rows and mean of the numeric columns of a table for each
+        cell.
+        """
+        grouped = self.df_dict[table].groupby(["Group", "Cell"], sort=False)
+        summary = grouped.mean(numeric_only=True)
+        summary.insert(0, "Count", grouped.size())
+        return summary.reset_index()
+
+    def group_summary(self, table: str = "Raw data") -> pd.DataFrame:
+        """Mean and standard error of the cell means of each group so every
+        cell is weighted equally regardless of its number of rows. Cells is
+        the number of cells in the group.
+        """
+        cells = self.cell_summary(table).drop(columns=["Cell", "Count"])
+        grouped = cells.groupby("Group", sort=False)
+        summary = pd.concat(
+            {"Mean": grouped.mean(), "SEM": grouped.sem()}, names=["Statistic"]
+        )
+        summary.insert(0, "Cells", grouped.size().reindex(summary.index, level=1))
+        return summary.reset_index()
+
+    def cells_df(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "Cell": list(self.cells.keys()),
+                "Group": [i["group"] for i in self.cells.values()],
+                "Path": [str(i["path"]) for i in self.cells.values()],
+            }
+        )
+
+    def save_data(
+        self,
+        save_filename: Union[PurePath, str],
+        file_format: Literal["xlsx", "parquet"] = "xlsx",
+    ) -> None:
+        """Saves the combined tables and the list of cells in the same
+        formats as FinalAnalysis.save_data.
+        """
+        df_dict = {"Cells": self.cells_df(), **self.df_dict}
+        if file_format == "xlsx":
+            save_excel_sheets(f"{save_filename}.xlsx", df_dict)
+        elif file_format == "parquet":
+            program_data = {
+                "Program": ["ClampSuite"],
+                "Version": clampsuite.__version__,
+                "Time stamp": [str(datetime.datetime.now())],
+                "Analysis": [self.analysis],
+            }
+            save_parquet_tables(f"{save_filename}.parquet", df_dict, program_data)
+        else:
+            raise AttributeError("File format not recognized!")
@@ -1,17 +1,48 @@
 import json
 import typing
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
+from itertools import repeat
 from pathlib import Path, PurePath
 from typing import Callable, Literal, Union
 
 import yaml
 import numpy as np
+import pandas as pd
 
 from ..acq import Acquisition
 from ..final_analysis import FinalAnalysis
 from ..functions.filtering_functions import Filters, Windows
-from ..functions.load_functions import NumpyEncoder, load_json_file, load_scanimage_file
+from ..functions.load_functions import (
+    NumpyEncoder,
+    load_hdf5_file,
+    load_json_file,
+    load_scanimage_file,
+    make_lazy,
+    save_hdf5_file,
+)
+
+# Number of samples filtered per block by ExpManager.filter_exp. Larger
+# blocks fall out of the CPU cache and filter slower than single sweeps.
+FILTER_BATCH_SAMPLES = 2**17
+
+
+def _analyze_acq(
+    acq: Acquisition,
+    filter_args: Union[dict, None],
+    template_args: Union[dict, None],
+    analysis_args: dict,
+) -> Acquisition:
+    """Analyzes a single acquisition. This is a module level function so
+    that it can be pickled and sent to worker processes.
+    """
+    if filter_args is not None:
+        acq.set_filter(**filter_args)
+    if template_args is not None:
+        acq.set_template(**template_args)
+    acq.analyze(**analysis_args)
+    return acq
 
 
 class ExpManager:
@@ -32,18 +63,59 @@ class ExpManager:
         self.analyzed = False
 
     def create_exp(
-        self, analysis: Union[str, None], file: Union[list, tuple, str, Path, PurePath]
+        self,
+        analysis: Union[str, None],
+        file: Union[list, tuple, str, Path, PurePath],
+        lazy: bool = False,
     ) -> None:
-        self._load_acqs(analysis, file)
+        """Loads the acquisitions of an experiment.
+
+        Args:
+            analysis (str): Analysis type of the acquisitions.
+            file (Union[list, tuple, str, Path, PurePath]): File path or paths.
+            lazy (bool, optional): Only load the metadata of each acquisition.
+                The arrays are read from disk the first time they are
+                accessed. Defaults to False.
+        """
+        self._load_acqs(analysis, file, lazy)
         for key in self.exp_dict.keys():
             self.set_cycle(key)
         self._set_start_end_acq()
 
     def analyze_exp(
-        self, exp: str, filter_args=None, template_args=None, analysis_args=None
+        self,
+        exp: str,
+        filter_args=None,
+        template_args=None,
+        analysis_args=None,
+        workers: Union[int, None] = None,
+        batch_filter: bool = False,
+        batch: bool = False,
     ) -> None:
+        """Analyzes all the acquisitions of an experiment. Each acquisition
+        only recomputes the analysis stages whose settings or input changed
+        since it was last analyzed.
+
+        Args:
+            exp (str): Experiment (analysis type) to analyze.
+            filter_args (dict, optional): Arguments passed to set_filter.
+            template_args (dict, optional): Arguments passed to set_template.
+            analysis_args (dict, optional): Arguments passed to analyze.
+            workers (int, optional): Number of processes to spread the
+                acquisitions across. None or 1 analyzes the acquisitions
+                one at a time in the current process. Defaults to None.
+            batch_filter (bool, optional): Filter the acquisitions together
+                with filter_exp before they are analyzed. Defaults to False.
+            batch (bool, optional): Analyze the acquisitions together with
+                analyze_batch if the acquisition type has one (LFP and
+                oEPSC) and workers is None or 1. Progress is reported after
+                each group of acquisitions that are measured together.
+                Defaults to False.
+        """
         if self.exp_dict.get(exp):
             acq_dict = self.exp_dict[exp]
+            if analysis_args is None:
+                analysis_args = {}
             pref_dict = {}
             if filter_args is not None:
                 pref_dict.update(filter_args)
@@ -51,16 +123,124 @@ class ExpManager:
                 pref_dict.update(template_args)
             pref_dict.update(analysis_args)
             self.analysis_prefs = pref_dict
-            for i in acq_dict.values():
-                if filter_args is not None:
-                    i.set_filter(**filter_args)
-                if template_args is not None:
-                    i.set_template(**template_args)
-                i.analyze(**analysis_args)
-                self.callback_func(i.acq_number)
+            if batch_filter:
+                self.filter_exp(exp, filter_args, analysis_args)
+                filter_args = None
+            acqs = list(acq_dict.values())
+            serial = workers is None or workers <= 1
+            if batch and serial and hasattr(acqs[0], "analyze_batch"):
+                # Acquisitions that can be analyzed together as a 2-D array.
+                for i in acqs:
+                    if filter_args is not None:
+                        i.set_filter(**filter_args)
+                    if template_args is not None:
+                        i.set_template(**template_args)
+                type(acqs[0]).analyze_batch(
+                    acqs,
+                    callback=lambda acq: self.callback_func(acq.acq_number),
+                    **analysis_args,
+                )
+            elif serial:
+                for i in acqs:
+                    _analyze_acq(i, filter_args, template_args, analysis_args)
+                    self.callback_func(i.acq_number)
+            else:
+                self._analyze_parallel(
+                    acq_dict, filter_args, template_args, analysis_args, workers
+                )
             self.analyzed = True
             self.callback_func(f"Analyzed {exp} acquisitions")
 
+    def filter_exp(
+        self,
+        exp: str,
+        filter_args: Union[dict, None] = None,
+        analysis_args: Union[dict, None] = None,
+    ) -> None:
+        """Filters all the acquisitions of an experiment in batches.
+        Acquisitions that share an array length and filter settings are
+        stacked and filtered in blocks of 2-D arrays. The result for each
+        acquisition is stored on the acquisition and used instead of
+        filtering again the next time it is analyzed with the same settings.
+
+        Args:
+            exp (str): Experiment (analysis type) to filter.
+            filter_args (dict, optional): Arguments passed to set_filter.
+            analysis_args (dict, optional): Arguments that will be passed to
+                analyze. Some analyses use them to select the part of the
+                array that is filtered.
+        """
+        if analysis_args is None:
+            analysis_args = {}
+        groups = defaultdict(list)
+        for acq in self.exp_dict.get(exp, {}).values():
+            if filter_args is not None:
+                acq.set_filter(**filter_args)
+            if getattr(acq, "filter_type", None) is None:
+                continue
+            array = acq.filter_input(**analysis_args)
+            groups[(len(array), acq.filter_settings())].append((acq, array))
+        for (length, _), group in groups.items():
+            rows = max(1, FILTER_BATCH_SAMPLES // max(1, length))
+            for start in range(0, len(group), rows):
+                block = group[start : start + rows]
+                stacked = np.vstack([array for _, array in block])
+                filtered = block[0][0].apply_filter(stacked)
+                for (acq, array), filtered_array in zip(block, filtered):
+                    acq.cache_stage("filtered", acq.filter_key(array), filtered_array)
+
+    def sweep(
+        self,
+        sensitivity: Union[list, None] = None,
+        mini_spacing: Union[list, None] = None,
+        templates: Union[dict, None] = None,
+    ) -> pd.DataFrame:
+        """Tests every combination of the detection settings on each mini
+        acquisition with MiniAnalysisAcq.sweep. The acquisitions need to be
+        analyzed first and their events are not changed.
+
+        Args:
+            sensitivity (list, optional): Sensitivities to test.
+            mini_spacing (list, optional): Mini spacings to test in ms.
+            templates (dict, optional): Maps set_template argument names to
+                the values to test.
+
+        Returns:
+            pd.DataFrame: A row for each acquisition and combination of
+            settings with the number of events, frequency and mean event
+            measurements.
+        """
+        records = []
+        for acq in self.exp_dict.get("mini", {}).values():
+            records.extend(acq.sweep(sensitivity, mini_spacing, templates))
+            self.callback_func(acq.acq_number)
+        return pd.DataFrame(records)
+
+    def _analyze_parallel(
+        self,
+        acq_dict: dict,
+        filter_args: Union[dict, None],
+        template_args: Union[dict, None],
+        analysis_args: dict,
+        workers: int,
+    ) -> None:
+        # Results come back in submission order so the merge is deterministic.
+        # The analyzed state is copied back onto the existing objects so that
+        # any references held elsewhere (e.g. the GUI) stay valid.
+        chunksize = max(1, len(acq_dict) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            analyzed = executor.map(
+                _analyze_acq,
+                acq_dict.values(),
+                repeat(filter_args),
+                repeat(template_args),
+                repeat(analysis_args),
+                chunksize=chunksize,
+            )
+            for acq, result in zip(list(acq_dict.values()), analyzed):
+                acq.__dict__.update(result.__dict__)
+                self.callback_func(acq.acq_number)
+
     def set_ui_prefs(self, pref_dict: dict) -> None:
         self.ui_prefs = pref_dict
         self.ui_prefs["Deleted acqs"] = {}
@@ -76,23 +256,47 @@ class ExpManager:
             oepsc = self.exp_dict.get("oepsc")
             self.final_analysis.analyze(o_acq_dict=oepsc, lfp_acq_dict=lfp)
 
-    def save_data(self, file_path: Union[Path, PurePath, str]) -> None:
+    def save_data(
+        self,
+        file_path: Union[Path, PurePath, str],
+        file_format: Literal["json", "hdf5"] = "json",
+        final_format: Literal["xlsx", "parquet"] = "xlsx",
+    ) -> None:
+        """Saves the preferences, final analysis and acquisitions.
+
+        Args:
+            file_path (Union[Path, PurePath, str]): Path and file name stem.
+            file_format (str, optional): "json" saves one JSON file per
+                acquisition. "hdf5" saves all the acquisitions in a single
+                binary file ({file_path}.h5). Defaults to "json".
+            final_format (str, optional): "xlsx" saves the final analysis to
+                an excel file. "parquet" saves the final analysis to a
+                directory of parquet files ({file_path}.parquet). Defaults
+                to "xlsx".
+        """
         if self.ui_prefs is not None:
             for key, data in self.deleted_acqs.items():
                 self.ui_prefs["Deleted acqs"] = {key: list(data.keys())}
             self.save_ui_prefs(file_path, self.ui_prefs)
         if self.final_analysis is not None:
-            self.save_final_analysis(file_path)
-        self._save_acqs(file_path)
+            self.save_final_analysis(file_path, final_format)
+        self._save_acqs(file_path, file_format)
         self.callback_func("Finished saving")
 
     @staticmethod
-    def save_acq(acq, save_filename) -> None:
+    def acq_save_dict(acq) -> dict:
         x = deepcopy(acq)
+        x.load_lazy_arrays()
+        x.clear_stage_cache()
         if x.analysis == "mini":
             x.save_postsynaptic_events()
-        with open(f"{save_filename}_{x.name}.json", "w") as write_file:
-            json.dump(x.__dict__, write_file, cls=NumpyEncoder)
+        return x.__dict__
+
+    @staticmethod
+    def save_acq(acq, save_filename) -> None:
+        data = ExpManager.acq_save_dict(acq)
+        with open(f"{save_filename}_{data['name']}.json", "w") as write_file:
+            json.dump(data, write_file, cls=NumpyEncoder)
 
     @staticmethod
     def save_acqs(acq_dict, file_path: Union[PurePath, Path, str]) -> None:
@@ -100,8 +304,16 @@ class ExpManager:
             ExpManager.save_acq(i, file_path)
         print("Finished saving")
 
-    def _save_acqs(self, file_path: Union[PurePath, Path, str]) -> None:
+    def _save_acqs(
+        self,
+        file_path: Union[PurePath, Path, str],
+        file_format: Literal["json", "hdf5"] = "json",
+    ) -> None:
         self.callback_func("Saving acquisitions")
+        if file_format == "hdf5":
+            save_hdf5_file(f"{file_path}.h5", self._acq_save_dicts())
+            self.callback_func("Saved acqs")
+            return
         count = 0
         for i in self.exp_dict.keys():
             count += len(self.exp_dict[i].keys())
@@ -120,6 +332,12 @@ class ExpManager:
                 self.callback_func(acq.acq_number)
         self.callback_func("Saved acqs")
 
+    def _acq_save_dicts(self):
+        for i in (*self.exp_dict.values(), *self.deleted_acqs.values()):
+            for acq in i.values():
+                yield self.acq_save_dict(acq)
+                self.callback_func(acq.acq_number)
+
     def save_ui_prefs(self, file_path: Union[PurePath, Path, str], ui_prefs) -> None:
         self.callback_func("Saving preferences")
         with open(f"{file_path}.yaml", "w") as file:
@@ -131,9 +349,13 @@ class ExpManager:
             yaml.dump(self.analysis_prefs, file)
         self.callback_func("Saved user preferences")
 
-    def save_final_analysis(self, file_path: Union[PurePath, Path, str]) -> None:
+    def save_final_analysis(
+        self,
+        file_path: Union[PurePath, Path, str],
+        file_format: Literal["xlsx", "parquet"] = "xlsx",
+    ) -> None:
         self.callback_func("Saving final analysis")
-        self.final_analysis.save_data(file_path)
+        self.final_analysis.save_data(file_path, file_format)
         self.callback_func("Saved final analysis")
 
     def load_file(self, file_path: str, extension: str) -> Union[list, PurePath]:
@@ -145,7 +367,7 @@ class ExpManager:
             file_name = file_path
         else:
             directory = Path(file_path)
-            file_name = list(directory.glob(extension))[0]
+            file_name = list(directory.glob(f"*{extension}"))[0]
         return file_name
 
     def load_ui_prefs(self, file_path: Union[None, str, Path, PurePath] = None) -> dict:
@@ -162,13 +384,30 @@ class ExpManager:
             analysis_prefs = yaml.safe_load(file)
         return analysis_prefs
 
+    @staticmethod
+    def find_final_analysis(file_path: Union[None, str, Path, PurePath] = None) -> Path:
+        """Finds the final analysis saved by save_data. file_path can be a
+        parquet directory, an excel file or an experiment directory. If an
+        experiment directory contains both the parquet directory is used.
+        """
+        path = Path() if file_path is None else Path(file_path)
+        if path.suffix in (".parquet", ".xlsx"):
+            return path
+        file_names = list(path.glob("*.parquet")) or list(path.glob("*.xlsx"))
+        if not file_names:
+            raise AttributeError("No final analysis found!")
+        return file_names[0]
+
     def load_final_analysis(self, analysis: str, file_path: Union[None, str] = None):
-        file_name = self.load_file(file_path, extension=".xlsx")
+        file_name = self.find_final_analysis(file_path)
         self.final_analysis = FinalAnalysis(analysis)
         self.final_analysis.load_data(file_name)
 
     def load_exp(
-        self, analysis: str, file_path: Union[str, list, tuple, PurePath, Path]
+        self,
+        analysis: str,
+        file_path: Union[str, list, tuple, PurePath, Path],
+        lazy: bool = False,
     ):
         if isinstance(file_path, (str, PurePath)):
             temp_path = Path(file_path)
@@ -180,19 +419,23 @@ class ExpManager:
         else:
             file_paths = [PurePath(i) for i in file_path]
         file_paths_edit = [
-            i for i in file_paths if (i.suffix == ".json") & (i.name[0] != ".")
+            i for i in file_paths if (i.suffix in (".json", ".h5")) & (i.name[0] != ".")
         ]
+        can_load_data = False
+        final_paths = [i for i in file_paths if i.suffix in (".parquet", ".xlsx")]
         for path in file_paths:
             if path.suffix == ".yaml":
                 self.ui_prefs = self.load_ui_prefs(path)
                 can_load_data = True
                 self.analyzed = True
                 self.callback_func("Loaded settings")
-            elif path.suffix == ".xlsx":
-                self.load_final_analysis(analysis, path)
-                self.callback_func("Loaded final data")
+        if final_paths:
+            # The parquet tables are loaded instead of an excel export of them.
+            final_paths.sort(key=lambda x: x.suffix != ".parquet")
+            self.load_final_analysis(analysis, final_paths[0])
+            self.callback_func("Loaded final data")
         if can_load_data:
-            self._load_acqs(analysis=None, file_path=file_paths_edit)
+            self._load_acqs(analysis=None, file_path=file_paths_edit, lazy=lazy)
             self._set_start_end_acq()
             self._set_deleted_acqs()
         else:
@@ -202,14 +445,20 @@ class ExpManager:
         self,
         analysis: Union[str, None],
         file_path: Union[list, tuple, str, Path, PurePath],
+        lazy: bool = False,
     ) -> None:
         if isinstance(file_path, (str, Path, PurePath)):
-            file_path = list(file_path)
+            file_path = [file_path]
         num_of_acqs = len(file_path)
         # cycle_dict = {}
         for count, i in enumerate(file_path):
-            if Path(i).exists():
-                acq = self.load_acq(analysis, i)
+            if not Path(i).exists():
+                pass
+            elif PurePath(i).suffix == ".h5":
+                for acq in self.load_hdf5_acqs(i, lazy):
+                    self._set_acq(acq)
+            else:
+                acq = self.load_acq(analysis, i, lazy)
                 self._set_acq(acq)
             self.callback_func(int((100 * (count + 1) / num_of_acqs)))
         self.callback_func("Loaded acquisitions")
@@ -218,6 +467,7 @@ class ExpManager:
     def load_acq(
         analysis: Union[Literal["mini", "current_clamp", "lfp", "oepsc"], None],
         path: Union[str, Path, PurePath],
+        lazy: bool = False,
     ) -> Acquisition:
         path_obj = PurePath(path)
         if not Path(path_obj).exists():
@@ -228,6 +478,8 @@ class ExpManager:
             acq_comp = load_json_file(path_obj)
         else:
             raise AttributeError("File type not recognized!")
+        if lazy:
+            acq_comp = make_lazy(acq_comp, path_obj)
         if "analysis" in acq_comp:
             obj = Acquisition(acq_comp["analysis"])
         elif isinstance(analysis, str):
@@ -237,6 +489,18 @@ class ExpManager:
         obj.load_data(acq_comp)
         return obj
 
+    @staticmethod
+    def load_hdf5_acqs(path: Union[str, Path, PurePath], lazy: bool = False) -> list:
+        """Loads all the acquisitions saved in an HDF5 experiment file. If lazy
+        is True the arrays are memory-mapped when they are first accessed.
+        """
+        acqs = []
+        for acq_comp in load_hdf5_file(path, lazy):
+            obj = Acquisition(acq_comp["analysis"])
+            obj.load_data(acq_comp)
+            acqs.append(obj)
+        return acqs
+
     @staticmethod
     def load_acqs(
         analysis: Union[str, None],
@@ -34,6 +34,9 @@ exp_manager.save_ui_prefs("my/path/to_folder")
 # Save all data at once
 exp_manager.save_data("my/path/to_folder")
 
+# Or save all the acquisitions in a single binary HDF5 file (requires h5py)
+exp_manager.save_data("my/path/to_folder", file_format="hdf5")
+
 # %%
 # Load existing "mini" data from ClampSuite
 # Note that a yaml file needs to be include.
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clampsuite import Cohort, FinalAnalysis
+
+
+def create_cohort(tmp_path, file_format: str = "xlsx") -> Cohort:
+    rng = np.random.default_rng(0)
+    cohort = Cohort("mini")
+    cohort.set_callback(lambda x: None)
+    for i, (group, num_events) in enumerate([("WT", 5), ("WT", 3), ("KO", 4)]):
+        final_analysis = FinalAnalysis("mini")
+        final_analysis.df_dict["Raw data"] = pd.DataFrame(
+            {
+                "Acquisition": np.arange(num_events) // 2 + 1,
+                "Amplitude (pA)": rng.uniform(5, 30, num_events),
+            }
+        )
+        final_analysis.df_dict["Final data"] = pd.DataFrame(
+            {"Events deleted": [i], "Acqs deleted": [0]}
+        )
+        path = tmp_path / f"cell_{i}"
+        path.mkdir()
+        final_analysis.save_data(path / "exp", file_format=file_format)
+        cohort.add_exp(path, group)
+    return cohort
+
+
+def test_cohort_summaries(tmp_path):
+    cohort = create_cohort(tmp_path)
+    cohort.load()
+    raw_df = cohort.df_dict["Raw data"]
+    assert list(raw_df.columns[:2]) == ["Cell", "Group"]
+    assert list(raw_df["Cell"].unique()) == ["cell_0", "cell_1", "cell_2"]
+    assert list(cohort.df_dict["Final data"]["Events deleted"]) == [0, 1, 2]
+
+    cells = cohort.cell_summary()
+    assert list(cells["Count"]) == [5, 3, 4]
+    means = raw_df.groupby("Cell")["Amplitude (pA)"].mean()
+    assert np.allclose(cells["Amplitude (pA)"], means.to_numpy())
+
+    groups = cohort.group_summary().set_index(["Statistic", "Group"])
+    assert groups.loc[("Mean", "WT"), "Cells"] == 2
+    assert np.isclose(
+        groups.loc[("Mean", "WT"), "Amplitude (pA)"], means[["cell_0", "cell_1"]].mean()
+    )
+    assert np.isclose(
+        groups.loc[("SEM", "WT"), "Amplitude (pA)"], means[["cell_0", "cell_1"]].sem()
+    )
+    assert np.isnan(groups.loc[("SEM", "KO"), "Amplitude (pA)"])
+
+
+def test_cohort_parallel_matches_serial(tmp_path):
+    pytest.importorskip("pyarrow")
+    cohort = create_cohort(tmp_path, "parquet")
+    cohort.load(tables=["Raw data"])
+    assert list(cohort.df_dict) == ["Raw data"]
+
+    parallel = Cohort("mini")
+    parallel.set_callback(lambda x: None)
+    parallel.cells = cohort.cells
+    parallel.load(tables=["Raw data"], workers=2)
+    pd.testing.assert_frame_equal(
+        parallel.df_dict["Raw data"], cohort.df_dict["Raw data"]
+    )
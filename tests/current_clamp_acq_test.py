@@ -1,8 +1,10 @@
+import numpy as np
+
 from clampsuite.acq import (
     Acquisition,
     CurrentClampAcq,
 )
-from clampsuite.functions.utilities import create_acq_data
+from clampsuite.functions.utilities import create_acq_data, create_spike_array
 
 
 def test_current_clamp_acq_creation():
@@ -13,3 +15,47 @@ def test_current_clamp_acq_creation():
     current_clamp.load_data(data)
     current_clamp.set_filter(filter_type="None", baseline_start=0, baseline_end=300)
     current_clamp.analyze()
+
+
+def test_all_spike_features(monkeypatch):
+    current_clamp = Acquisition("current_clamp")
+    data = create_acq_data(array_len=10000, pulse_start=100, pulse_end=800)
+    data["array"] = create_spike_array(spike_times=[150, 300, 310, 500])
+    current_clamp.load_data(data)
+    current_clamp.set_filter(filter_type="None", baseline_start=0, baseline_end=100)
+    for threshold_method in ["third_derivative", "max_curvature", "legacy"]:
+        current_clamp.analyze(threshold_method=threshold_method)
+        assert np.allclose(
+            current_clamp.spikes_threshold_x, [149.5, 299.5, 309.5, 499.5], atol=0.5
+        )
+        assert current_clamp.spikes_threshold_x[0] == current_clamp.spike_threshold_x()
+        assert current_clamp.spikes_threshold_y[0] == current_clamp.spike_threshold
+        assert current_clamp.spikes_ap_v[0] == current_clamp.ap_v
+        assert current_clamp.spikes_width[0] == current_clamp.spike_width()
+        assert current_clamp.spikes_ahp_x[0] == current_clamp.ahp_x
+        assert current_clamp.spikes_ahp_y[0] == current_clamp.ahp_y
+        assert np.all(current_clamp.spikes_ahp_x > current_clamp.spike_peaks_x())
+
+    # The derivatives are stored so analyzing again does not recompute them.
+    calls = []
+    gradient = np.gradient
+
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return gradient(*args, **kwargs)
+
+    monkeypatch.setattr(np, "gradient", counted)
+    current_clamp.analyze(threshold_method="third_derivative")
+    assert calls == []
+
+
+def test_later_spike_thresholds_noisy():
+    # With slow firing and noise the third derivative crosses 1 long before
+    # the later spikes.
+    current_clamp = Acquisition("current_clamp")
+    data = create_acq_data(array_len=10000, pulse_start=100, pulse_end=800)
+    data["array"] = create_spike_array(spike_times=[150, 450, 700], white_noise_amp=0.5)
+    current_clamp.load_data(data)
+    current_clamp.set_filter(filter_type="None", baseline_start=0, baseline_end=100)
+    current_clamp.analyze(threshold_method="third_derivative")
+    assert np.allclose(current_clamp.spikes_threshold_x[1:], [449.5, 699.5], atol=0.5)
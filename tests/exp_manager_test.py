@@ -0,0 +1,290 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clampsuite import ExpManager
+from clampsuite.acq import Acquisition, LFPAcq
+from clampsuite.functions import load_functions
+from clampsuite.functions.load_functions import LazyArray, make_lazy
+from clampsuite.functions.utilities import (
+    create_acq_data,
+    create_event_array,
+    create_lfp_array,
+)
+
+filter_args = {
+    "baseline_start": 0,
+    "baseline_end": 300,
+    "filter_type": "fir_zero_2",
+    "order": 301,
+    "high_pass": None,
+    "high_width": None,
+    "low_pass": 600,
+    "low_width": 300,
+    "window": "hann",
+    "polyorder": None,
+}
+
+template_args = {
+    "tmp_amplitude": -20,
+    "tmp_tau_1": 0.3,
+    "tmp_tau_2": 5.0,
+    "tmp_risepower": 0.5,
+    "tmp_length": 30,
+    "tmp_spacer": 1.5,
+}
+
+analysis_args = {"rc_check": False}
+
+
+def create_mini_exp(num_acqs: int = 3) -> ExpManager:
+    exp_manager = ExpManager()
+    exp_manager.set_callback(lambda x: None)
+    for i in range(1, num_acqs + 1):
+        mini = Acquisition("mini")
+        data = create_acq_data(acq_num=i, acq_name=f"AD0_{i}")
+        data["array"] = create_event_array(
+            sample_rate=10000, event_length=30, direction="negative"
+        )
+        mini.load_data(data)
+        exp_manager._set_acq(mini)
+    return exp_manager
+
+
+def test_analyze_exp_parallel_matches_serial():
+    serial = create_mini_exp()
+    serial.analyze_exp("mini", filter_args, template_args, analysis_args)
+
+    parallel = create_mini_exp()
+    acqs = list(parallel.exp_dict["mini"].values())
+    parallel.analyze_exp("mini", filter_args, template_args, analysis_args, workers=2)
+
+    # The analyzed state is merged back into the original objects.
+    assert acqs == list(parallel.exp_dict["mini"].values())
+    for key, acq in serial.exp_dict["mini"].items():
+        other = parallel.exp_dict["mini"][key]
+        assert acq.final_events == other.final_events
+        assert np.array_equal(acq.final_array, other.final_array)
+        assert [i.amplitude for i in acq.postsynaptic_events] == [
+            i.amplitude for i in other.postsynaptic_events
+        ]
+
+
+def test_save_load_hdf5_exp(tmp_path):
+    pytest.importorskip("h5py")
+    exp_manager = create_mini_exp(2)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    exp_manager.set_ui_prefs({"Acq_number": 1})
+    exp_manager.save_data(tmp_path / "exp", file_format="hdf5")
+    assert (tmp_path / "exp.h5").exists()
+
+    loaded = ExpManager()
+    loaded.set_callback(lambda x: None)
+    loaded.load_exp("mini", tmp_path)
+    for key, acq in exp_manager.exp_dict["mini"].items():
+        other = loaded.exp_dict["mini"][key]
+        assert np.array_equal(acq.array, other.array)
+        assert np.array_equal(acq.final_array, other.final_array)
+        assert acq.sample_rate == other.sample_rate
+        assert [i.amplitude for i in acq.postsynaptic_events] == [
+            i.amplitude for i in other.postsynaptic_events
+        ]
+
+
+def test_save_load_json_exp(tmp_path):
+    exp_manager = create_mini_exp(1)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    exp_manager.set_ui_prefs({"Acq_number": 1})
+    exp_manager.save_data(tmp_path / "exp")
+
+    loaded = ExpManager()
+    loaded.set_callback(lambda x: None)
+    loaded.load_exp("mini", tmp_path)
+    acq = exp_manager.exp_dict["mini"][1]
+    other = loaded.exp_dict["mini"][1]
+    assert np.allclose(acq.final_array, other.final_array)
+    assert len(acq.postsynaptic_events) == len(other.postsynaptic_events)
+
+
+def test_lazy_load_hdf5_exp(tmp_path):
+    pytest.importorskip("h5py")
+    exp_manager = create_mini_exp(2)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    exp_manager.set_ui_prefs({"Acq_number": 1})
+    exp_manager.save_data(tmp_path / "exp", file_format="hdf5")
+
+    loaded = ExpManager()
+    loaded.set_callback(lambda x: None)
+    loaded.load_exp("mini", tmp_path, lazy=True)
+    acq = loaded.exp_dict["mini"][2]
+    assert "array" not in acq.__dict__
+    assert isinstance(acq.array, np.memmap)
+    assert np.array_equal(acq.array, exp_manager.exp_dict["mini"][2].array)
+    assert "array" not in acq._lazy_arrays
+
+    # Saving reads the remaining arrays.
+    loaded.save_data(tmp_path / "resaved", file_format="hdf5")
+    assert "rc_check_array" in acq._lazy_arrays
+    resaved = ExpManager.load_hdf5_acqs(tmp_path / "resaved.h5")
+    assert np.array_equal(resaved[0].rc_check_array, acq.rc_check_array)
+
+
+def test_batch_filter_matches_serial():
+    serial = create_mini_exp()
+    serial.analyze_exp("mini", filter_args, template_args, analysis_args)
+
+    batch = create_mini_exp()
+    batch.filter_exp("mini", filter_args, analysis_args)
+    for acq in batch.exp_dict["mini"].values():
+        assert "filtered" in acq._stage_cache
+    batch.analyze_exp("mini", None, template_args, analysis_args)
+    for key, acq in serial.exp_dict["mini"].items():
+        other = batch.exp_dict["mini"][key]
+        assert "filtered" not in other._stage_cache
+        assert np.array_equal(acq.final_array, other.final_array)
+        assert acq.final_events == other.final_events
+
+
+def test_analyze_exp_recomputes_changed_stages(monkeypatch):
+    exp_manager = create_mini_exp(2)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    acqs = list(exp_manager.exp_dict["mini"].values())
+    fingerprints = [dict(acq._stage_fingerprints) for acq in acqs]
+
+    calls = []
+    for acq in acqs:
+        for name in ["apply_filter", "create_deconvolved_array"]:
+            method = getattr(acq, name)
+
+            def counted(*args, name=name, method=method):
+                calls.append(name)
+                return method(*args)
+
+            monkeypatch.setattr(acq, name, counted)
+
+    exp_manager.analyze_exp(
+        "mini", filter_args, template_args, {**analysis_args, "amp_threshold": 6}
+    )
+    assert calls == []
+    for acq, recorded in zip(acqs, fingerprints):
+        changed = [i for i in recorded if recorded[i] != acq._stage_fingerprints[i]]
+        assert changed == ["screened"]
+
+    exp_manager.analyze_exp(
+        "mini", filter_args, {**template_args, "tmp_tau_2": 4}, analysis_args
+    )
+    assert calls == ["create_deconvolved_array"] * 2
+
+    calls.clear()
+    exp_manager.analyze_exp(
+        "mini", {**filter_args, "low_pass": 500}, template_args, analysis_args
+    )
+    assert calls == ["apply_filter", "create_deconvolved_array"] * 2
+
+
+def test_sweep_matches_analysis():
+    exp_manager = create_mini_exp(2)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    final_events = {
+        key: list(acq.final_events) for key, acq in exp_manager.exp_dict["mini"].items()
+    }
+    df = exp_manager.sweep([3, 4], [2], {"tmp_tau_2": [4.0, 5.0]})
+    assert len(df) == 8
+    assert set(df["Acquisition"]) == {1, 2}
+
+    # Sweeping does not change the analyzed events.
+    for key, acq in exp_manager.exp_dict["mini"].items():
+        assert acq.final_events == final_events[key]
+
+    for _, row in df.iterrows():
+        acq = exp_manager.exp_dict["mini"][row["Acquisition"]]
+        acq.set_template(**{**template_args, "tmp_tau_2": row["tmp_tau_2"]})
+        acq.analyze(**analysis_args, sensitivity=row["sensitivity"])
+        assert row["Events"] == len(acq.final_events)
+        assert np.isclose(
+            row["Amplitude (pA)"],
+            np.mean([i.amplitude for i in acq.postsynaptic_events]),
+        )
+
+
+def test_save_load_parquet_final_analysis(tmp_path):
+    pytest.importorskip("pyarrow")
+    exp_manager = create_mini_exp(2)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    for acq in exp_manager.exp_dict["mini"].values():
+        acq.time_stamp = 10.0 * acq.acq_number
+    exp_manager.run_final_analysis()
+    exp_manager.set_ui_prefs({"Acq_number": 1})
+    exp_manager.save_data(tmp_path / "exp", final_format="parquet")
+    exp_manager.final_analysis.save_data(tmp_path / "exp")
+    assert (tmp_path / "exp.parquet").is_dir()
+
+    loaded = ExpManager()
+    loaded.set_callback(lambda x: None)
+    loaded.load_exp("mini", tmp_path)
+    assert isinstance(loaded.final_analysis.df_dict["Raw data"], pd.DataFrame)
+    for key, df in exp_manager.final_analysis.df_dict.items():
+        pd.testing.assert_frame_equal(loaded.final_analysis.df_dict[key], df)
+    assert (
+        loaded.final_analysis.events_deleted
+        == exp_manager.final_analysis.events_deleted
+    )
+
+
+def test_analyze_exp_batch_is_opt_in(monkeypatch):
+    exp_manager = ExpManager()
+    for i in range(1, 4):
+        lfp = Acquisition("lfp")
+        data = create_acq_data(array_len=20000, acq_num=i, acq_name=f"AD0_{i}")
+        data["array"] = create_lfp_array(fp_time=5 + i)
+        lfp.load_data(data)
+        exp_manager._set_acq(lfp)
+    lfp_filter = {"filter_type": "None", "baseline_start": 0, "baseline_end": 1000}
+    progress = []
+    exp_manager.set_callback(progress.append)
+
+    calls = []
+    monkeypatch.setattr(
+        LFPAcq, "analyze_batch", classmethod(lambda cls, *args, **kw: calls.append(1))
+    )
+    exp_manager.analyze_exp("lfp", lfp_filter, None, {"pulse_start": 1000})
+    assert calls == []
+    assert progress == [1, 2, 3, "Analyzed lfp acquisitions"]
+    monkeypatch.undo()
+
+    progress.clear()
+    exp_manager.analyze_exp("lfp", lfp_filter, None, {"pulse_start": 1000}, batch=True)
+    assert progress == [1, 2, 3, "Analyzed lfp acquisitions"]
+
+
+def test_lazy_load_json_exp(tmp_path, monkeypatch):
+    exp_manager = create_mini_exp(1)
+    exp_manager.analyze_exp("mini", filter_args, template_args, analysis_args)
+    exp_manager.set_ui_prefs({"Acq_number": 1})
+    exp_manager.save_data(tmp_path / "exp")
+
+    # The lazy arrays of the JSON file are read with one parse of the file.
+    calls = []
+    load_json_file = load_functions.load_json_file
+
+    def counted(path):
+        calls.append(path)
+        return load_json_file(path)
+
+    monkeypatch.setattr(load_functions, "load_json_file", counted)
+    loaded = ExpManager()
+    loaded.set_callback(lambda x: None)
+    loaded.load_exp("mini", tmp_path, lazy=True)
+    acq = loaded.exp_dict["mini"][1]
+    acq.load_lazy_arrays()
+    assert len(calls) == 1
+    assert np.array_equal(acq.array, exp_manager.exp_dict["mini"][1].array)
+    assert np.allclose(acq.final_array, exp_manager.exp_dict["mini"][1].final_array)
+
+
+def test_lazy_mat_array():
+    acq_dict = make_lazy({"array": np.zeros(10), "time_stamp": np.ones(2)}, "AD0_1.mat")
+    assert list(acq_dict["_lazy_arrays"]) == ["array"]
+    assert np.array_equal(acq_dict["time_stamp"], np.ones(2))
+    with pytest.raises(AttributeError):
+        LazyArray("AD0_1.mat", "time_stamp").load()
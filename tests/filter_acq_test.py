@@ -1,7 +1,18 @@
+import numpy as np
+import pytest
+
 from clampsuite.acq import (
     Acquisition,
     FilterAcq,
 )
+from clampsuite.functions.filtering_functions import (
+    clear_filter_cache,
+    fir_zero_1,
+    fir_zero_2,
+    remez_1,
+    remez_2,
+    remez_coefficients,
+)
 from clampsuite.functions.utilities import create_acq_data
 
 
@@ -31,3 +42,42 @@ def test_bandpass_fir_filter():
     )
 
     filter.analyze()
+
+
+def test_filter_coefficients_cached():
+    clear_filter_cache()
+    for i in range(2):
+        filter = Acquisition("filter")
+        filter.load_data(create_acq_data(acq_num=i))
+        filter.set_filter(
+            baseline_start=0,
+            baseline_end=300,
+            filter_type="remez_2",
+            order=201,
+            high_pass=None,
+            high_width=None,
+            low_pass=600,
+            low_width=300,
+        )
+        filter.analyze()
+    info = remez_coefficients.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
+@pytest.mark.parametrize("filter_func", [fir_zero_1, fir_zero_2, remez_1, remez_2])
+def test_fir_fft_matches_direct(filter_func):
+    array = create_acq_data()["array"]
+    kwargs = {
+        "order": 351,
+        "sample_rate": 10000,
+        "high_pass": None,
+        "high_width": None,
+        "low_pass": 600,
+        "low_width": 300,
+    }
+    direct = filter_func(array, method="direct", **kwargs)
+    fft = filter_func(array, method="fft", **kwargs)
+    assert np.allclose(direct, fft, rtol=0, atol=1e-10)
+    stacked = filter_func(np.vstack([array, array]), method="fft", **kwargs)
+    assert np.allclose(stacked[1], direct, rtol=0, atol=1e-10)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clampsuite.acq import Acquisition
+from clampsuite.final_analysis import FinalAnalysis
+from clampsuite.functions.utilities import create_acq_data, create_spike_array
+
+
+def create_current_clamp_acqs() -> dict:
+    acq_dict = {}
+    pulses = [(20, []), (40, []), (60, [150, 300, 500]), (80, None)]
+    for acq_num, (pulse_amp, spike_times) in enumerate(pulses, 1):
+        current_clamp = Acquisition("current_clamp")
+        data = create_acq_data(
+            array_len=10000,
+            acq_num=acq_num,
+            pulse_start=100,
+            pulse_end=800,
+            pulse_amp=pulse_amp,
+        )
+        pulse_v = -55 if spike_times is None or spike_times else -70 + pulse_amp / 10
+        data["array"] = create_spike_array(spike_times=spike_times, pulse_v=pulse_v)
+        current_clamp.load_data(data)
+        current_clamp.cycle = 1
+        current_clamp.pulse_pattern = 1
+        current_clamp.set_filter(filter_type="None", baseline_start=0, baseline_end=100)
+        current_clamp.analyze()
+        acq_dict[acq_num] = current_clamp
+    return acq_dict
+
+
+def test_spike_data():
+    acq_dict = create_current_clamp_acqs()
+    final_analysis = FinalAnalysis("current_clamp")
+    final_analysis.analyze(acq_dict)
+
+    spike_df = final_analysis.df_dict["Spike data"]
+    assert len(spike_df) == 3 + 11
+    for acq_num in [3, 4]:
+        acq = acq_dict[acq_num]
+        spikes = spike_df[spike_df["Acquisition"] == acq_num]
+        assert np.array_equal(spikes["Spike"], np.arange(1, len(acq.peaks) + 1))
+        assert spikes["Spike_threshold (mV)"].iloc[0] == acq.spike_threshold
+        assert spikes["Spike_width (ms)"].iloc[0] == acq.spike_width()
+        assert spikes["Peak_AHP (mV)"].iloc[0] == acq.ahp_y
+        assert np.allclose(
+            spikes["Spike_amplitude (mV)"],
+            acq.array[acq.peaks] - acq.spikes_threshold_y,
+        )
+
+    averages = final_analysis.df_dict["Spike averages"]
+    assert np.array_equal(averages["Spike"], np.arange(1, 12))
+    assert np.isclose(
+        averages["Max_AP_vel"].iloc[0],
+        spike_df.loc[spike_df["Spike"] == 1, "Max_AP_vel"].mean(),
+    )
+
+
+def test_save_load_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    final_analysis = FinalAnalysis("current_clamp")
+    final_analysis.analyze(create_current_clamp_acqs())
+    final_analysis.save_data(tmp_path / "final", file_format="parquet")
+
+    loaded = FinalAnalysis("current_clamp")
+    loaded.load_data(tmp_path / "final.parquet")
+    assert list(loaded.df_dict) == list(final_analysis.df_dict)
+    for key, df in final_analysis.df_dict.items():
+        pd.testing.assert_frame_equal(loaded.df_dict[key], df)
+    assert loaded.pulse_ap and not loaded.ramp_ap
+    assert loaded.program_data == final_analysis.program_data
+
+
+def test_save_excel_matches_pandas(tmp_path):
+    final_analysis = FinalAnalysis("current_clamp")
+    final_analysis.analyze(create_current_clamp_acqs())
+    final_analysis.df_dict["Final data"] = pd.DataFrame(
+        {"Rheobase": [np.nan, np.inf]}, index=pd.Index([1, 2], name="Epoch")
+    )
+    final_analysis.save_data(tmp_path / "final")
+
+    with pd.ExcelWriter(tmp_path / "pandas.xlsx") as writer:
+        for key, df in final_analysis.df_dict.items():
+            df.to_excel(writer, index=key == "Final data", sheet_name=key)
+    saved = pd.read_excel(tmp_path / "final.xlsx", sheet_name=None)
+    expected = pd.read_excel(tmp_path / "pandas.xlsx", sheet_name=None)
+    assert list(saved) == list(expected)
+    for key, df in expected.items():
+        pd.testing.assert_frame_equal(saved[key], df)
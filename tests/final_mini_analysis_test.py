@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from clampsuite.acq import Acquisition
+from clampsuite.final_analysis import FinalAnalysis
+from clampsuite.functions.utilities import create_acq_data, create_event_array
+
+filter_args = {
+    "baseline_start": 0,
+    "baseline_end": 300,
+    "filter_type": "fir_zero_2",
+    "order": 301,
+    "high_pass": None,
+    "high_width": None,
+    "low_pass": 600,
+    "low_width": 300,
+    "window": "hann",
+    "polyorder": None,
+}
+
+template_args = {
+    "tmp_amplitude": -20,
+    "tmp_tau_1": 0.3,
+    "tmp_tau_2": 5.0,
+    "tmp_risepower": 0.5,
+    "tmp_length": 30,
+    "tmp_spacer": 1.5,
+}
+
+
+def create_mini_dict(num_acqs: int = 2) -> dict:
+    acq_dict = {}
+    for i in range(1, num_acqs + 1):
+        mini = Acquisition("mini")
+        mini.load_data(create_acq_data(acq_num=i, acq_name=f"AD0_{i}"))
+        mini.array = create_event_array(
+            sample_rate=10000, event_length=30, direction="negative"
+        )
+        mini.time_stamp = 10.0 * i
+        mini.set_filter(**filter_args)
+        mini.set_template(**template_args)
+        mini.analyze(rc_check=False)
+        acq_dict[i] = mini
+    return acq_dict
+
+
+def test_create_average_mini():
+    acq_dict = create_mini_dict()
+
+    # Align the events by padding them one at a time.
+    peak_values = [j for i in acq_dict.values() for j in i.peak_values()]
+    event_arrays = [j for i in acq_dict.values() for j in i.get_event_arrays()]
+    start = max(peak_values)
+    arrays = [
+        np.append(np.full(start - i, j[0]), j)
+        for i, j in zip(peak_values, event_arrays)
+    ]
+    length = max(map(len, arrays))
+    arrays = np.array([np.append(i, np.full(length - len(i), i[-1])) for i in arrays])
+
+    final_analysis = FinalAnalysis("mini")
+    assert np.array_equal(final_analysis.aligned_events(acq_dict), arrays)
+    average_mini, sem_mini, median_mini = final_analysis.create_average_mini(acq_dict)
+    assert np.array_equal(average_mini, np.average(arrays, axis=0))
+    assert np.allclose(sem_mini, np.std(arrays, axis=0, ddof=1) / np.sqrt(len(arrays)))
+    assert np.array_equal(median_mini, np.median(arrays, axis=0))
+
+
+def test_extract_raw_data():
+    acq_dict = create_mini_dict(3)
+    final_analysis = FinalAnalysis("mini")
+    final_analysis.extract_raw_data(acq_dict)
+    raw_df = final_analysis.df_dict["Raw data"]
+
+    # Concatenate the data of each acquisition.
+    data = [i.acq_data() for i in acq_dict.values()]
+    df = pd.DataFrame({key: np.concatenate([i[key] for i in data]) for key in data[0]})
+    df["Acq time stamp"] = (df["Acq time stamp"] - df["Acq time stamp"][0]) * 1000
+    df["Real time"] = df["Acq time stamp"] + df["Event time (ms)"]
+    pd.testing.assert_frame_equal(raw_df, df)
+    assert raw_df["IEI (ms)"].isna().sum() == len(acq_dict)
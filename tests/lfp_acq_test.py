@@ -1,9 +1,42 @@
+from copy import deepcopy
+
+import numpy as np
+
 from clampsuite.acq import (
     Acquisition,
     LFPAcq,
 )
+from clampsuite.functions.utilities import create_acq_data, create_lfp_array
 
 
 def test_lfp_acq():
     lfp = Acquisition("lfp")
     assert isinstance(lfp, LFPAcq)
+
+
+def test_analyze_batch_matches_analyze():
+    rng = np.random.default_rng(0)
+    serial = []
+    for acq_num in range(1, 21):
+        lfp = Acquisition("lfp")
+        data = create_acq_data(array_len=20000, acq_num=acq_num)
+        data["array"] = create_lfp_array(
+            fv_amp=rng.choice([0, -0.3]),
+            fp_amp=rng.choice([1.0, -0.8, -1.5]),
+            fp_time=rng.uniform(5, 12),
+        )
+        lfp.load_data(data)
+        lfp.set_filter(filter_type="None", baseline_start=0, baseline_end=1000)
+        serial.append(lfp)
+    batch = deepcopy(serial)
+    for lfp in serial:
+        lfp.analyze(pulse_start=1000)
+    LFPAcq.analyze_batch(batch, pulse_start=1000)
+    for lfp, other in zip(serial, batch):
+        assert lfp.plot_lfp == other.plot_lfp
+        for name in ["fp_y", "_fp_x", "fv_y", "_fv_x", "max_x", "max_y"]:
+            assert np.array_equal(
+                getattr(lfp, name), getattr(other, name), equal_nan=True
+            )
+        assert np.array_equal(lfp._slope_x, other._slope_x, equal_nan=True)
+        assert np.isclose(lfp.slope(), other.slope(), equal_nan=True)
@@ -1,9 +1,30 @@
+import numpy as np
+from scipy import optimize, signal
+
 from clampsuite.acq import (
     Acquisition,
     MiniAnalysisAcq,
 )
 
-from clampsuite.functions.utilities import create_event_array, create_acq_data
+from clampsuite.acq.postsynaptic_event import MiniEvent, MiniEventTable
+from clampsuite.functions.batch_functions import measure_mini_events
+from clampsuite.functions.curve_fit import (
+    batch_exp_decay_fit,
+    s_exp_decay,
+)
+from clampsuite.functions.filtering_functions import fir_zero_2
+from clampsuite.functions.stream_functions import find_peaks_chunks
+from clampsuite.functions.template_psc import (
+    clear_spectrum_cache,
+    create_template,
+    wiener_spectrum,
+)
+from clampsuite.functions.utilities import (
+    create_acq_data,
+    create_event_array,
+    trimmed_rms,
+    trimmed_rms_chunks,
+)
 
 
 def test_mini_acq():
@@ -137,3 +158,362 @@ def test_analyze_positive_events_no_rc():
     )
     for i in mini.postsynaptic_events:
         assert i.amplitude > 4
+
+
+def test_deconvolution_spectrum_cached():
+    clear_spectrum_cache()
+    arrays = []
+    for i in range(2):
+        mini = Acquisition("mini")
+        data = create_acq_data(acq_num=i)
+        data["array"] = create_event_array(
+            sample_rate=10000, event_length=30, direction="negative"
+        )
+        mini.load_data(data)
+        mini.set_filter(
+            baseline_start=0,
+            baseline_end=300,
+            filter_type="fir_zero_2",
+            order=301,
+            high_pass=None,
+            high_width=None,
+            low_pass=600,
+            low_width=300,
+            window="hann",
+            polyorder=None,
+        )
+        mini.set_template()
+        mini.analyze(rc_check=False)
+        arrays.append(mini.deconvolve_array())
+    info = wiener_spectrum.cache_info()
+    assert info.misses == 1
+    assert info.hits == 3
+
+    # The result is the same as the full length complex deconvolution, also
+    # for lengths that are not a fast FFT length.
+    template = create_template(sample_rate=10000)
+    for size in [len(mini.final_array), 99991]:
+        mini.final_array = mini.final_array[:size]
+        H = np.fft.fft(template, size)
+        X = np.fft.fft(mini.final_array)
+        mini.decon_type = "wiener"
+        expected = np.real(np.fft.ifft(X * np.conj(H) / (H * np.conj(H) + 16)))
+        assert np.allclose(mini.deconvolve_array(), expected)
+        mini.decon_type = "fft"
+        assert np.allclose(mini.deconvolve_array(), np.real(np.fft.ifft(X / H)))
+
+
+def test_deconvolved_array_cached(monkeypatch):
+    mini = Acquisition("mini")
+    data = create_acq_data()
+    data["array"] = create_event_array(
+        sample_rate=10000, event_length=30, direction="negative"
+    )
+    mini.load_data(data)
+    mini.set_filter(
+        baseline_start=0,
+        baseline_end=300,
+        filter_type="fir_zero_2",
+        order=301,
+        high_pass=None,
+        high_width=None,
+        low_pass=600,
+        low_width=300,
+        window="hann",
+        polyorder=None,
+    )
+    mini.set_template()
+    mini.analyze(rc_check=False)
+
+    calls = []
+    create_deconvolved_array = mini.create_deconvolved_array
+
+    def counted():
+        calls.append(1)
+        return create_deconvolved_array()
+
+    monkeypatch.setattr(mini, "create_deconvolved_array", counted)
+    decon, baseline = mini.plot_deconvolved_acq()
+    assert len(calls) == 0
+    assert decon.size == mini.final_array.size
+
+    mini.set_template(tmp_tau_2=4)
+    mini.plot_deconvolved_acq()
+    assert len(calls) == 1
+    mini.plot_deconvolved_acq()
+    assert len(calls) == 1
+
+
+def test_trimmed_rms():
+    rng = np.random.default_rng(0)
+    for size in [11, 1000, 97000]:
+        array = rng.standard_normal(size)
+        bottom, top = np.percentile(array, [2.5, 97.5])
+        middle = array[(array > bottom) & (array < top)]
+        mu, rms = trimmed_rms(array)
+        assert np.isclose(mu, np.mean(middle), rtol=0, atol=1e-12)
+        assert np.isclose(rms, np.sqrt(np.mean(np.square(middle - np.mean(middle)))))
+    _, estimate = trimmed_rms(array, decimate=4)
+    assert np.isclose(estimate, rms, rtol=0.05)
+
+
+def test_batch_measurement_matches_mini_event():
+    rng = np.random.default_rng(0)
+    size = 50000
+    array = rng.standard_normal(size) * 2
+    template = create_template(amplitude=-15, tau_2=4, spacer=0)
+    for position in rng.integers(0, size - template.size, size=80):
+        array[position : position + template.size] += template * rng.uniform(0.3, 3)
+    array = fir_zero_2(array, 301, 10000, None, None, 600, 300)
+    positions = np.sort(rng.integers(0, size, size=200))
+
+    columns, measured = measure_mini_events(array, positions, 30, 10000)
+    assert measured.sum() > 50
+    for index in np.flatnonzero(measured):
+        event = MiniEvent()
+        event.analyze(1, positions[index], array, 30, 10000)
+        for key, values in columns.items():
+            if key == "rise_rate":
+                assert np.isclose(values[index], event.rise_rate, equal_nan=True)
+            else:
+                assert np.array_equal(
+                    values[index], getattr(event, key), equal_nan=True
+                )
+
+
+def test_event_table_views():
+    mini = Acquisition("mini")
+    data = create_acq_data()
+    data["array"] = create_event_array(
+        sample_rate=10000, event_length=30, direction="negative"
+    )
+    data["time_stamp"] = 0
+    mini.load_data(data)
+    mini.set_filter(
+        baseline_start=0,
+        baseline_end=300,
+        filter_type="fir_zero_2",
+        order=301,
+        high_pass=None,
+        high_width=None,
+        low_pass=600,
+        low_width=300,
+        window="hann",
+        polyorder=None,
+    )
+    mini.set_template()
+    mini.analyze(rc_check=False)
+    events = mini.postsynaptic_events
+    num_events = len(events)
+    assert num_events > 1
+
+    event = events[0]
+    assert np.array_equal(
+        event.event_array,
+        mini.final_array[event._array_start : event._array_end],
+    )
+    event.change_baseline(event.event_start_x(), event.event_start_y - 5)
+    assert events.column("amplitude")[0] == event.amplitude
+    assert mini.acq_data()["Amplitude (pA)"][0] == event.amplitude
+
+    del events[-1]
+    mini.final_events.pop()
+    assert mini.create_new_event(mini.final_events[0] / mini.s_r_c)
+    assert mini.total_events() == num_events
+    assert len(mini.get_event_arrays()) == num_events
+
+    saved = mini.postsynaptic_events.to_dicts()
+    loaded = [MiniEvent() for _ in saved]
+    for i, j in zip(loaded, saved):
+        i.load_event(j, mini.final_array)
+    assert [i.amplitude for i in loaded] == list(events.column("amplitude"))
+
+
+def test_batch_exp_decay_fit():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(50, 200, size=40)
+    amplitudes = rng.uniform(-30, -5, size=40)
+    taus = rng.uniform(10, 60, size=40)
+    decays = np.zeros((40, 200))
+    for row in range(40):
+        x = np.arange(lengths[row])
+        decays[row, : lengths[row]] = s_exp_decay(
+            x, amplitudes[row], taus[row]
+        ) + rng.normal(0, 0.2, size=lengths[row])
+
+    params, converged = batch_exp_decay_fit(
+        decays, lengths, amplitudes * 0.5, taus * 2, "s_exp"
+    )
+    assert converged.all()
+    for row in range(40):
+        x = np.arange(lengths[row], dtype=np.float64)
+        popt, _ = optimize.curve_fit(
+            s_exp_decay,
+            x,
+            decays[row, : lengths[row]],
+            p0=[amplitudes[row], taus[row]],
+            bounds=[[-np.inf, 0], [0, np.inf]],
+        )
+        assert np.allclose(params[row], popt, rtol=1e-4)
+
+    for row in range(40):
+        x = np.arange(lengths[row])
+        decays[row, : lengths[row]] += s_exp_decay(x, amplitudes[row], taus[row] / 8)
+    params, converged = batch_exp_decay_fit(decays, lengths, amplitudes, taus, "db_exp")
+    assert converged.all()
+    assert np.all(params[:, 0::2] <= 0) and np.all(params[:, 1::2] > 0)
+
+
+def test_batch_exp_decay_fit_diverged():
+    # A noisy flat decay meets ftol while the tau runs off to infinity.
+    rng = np.random.default_rng(1)
+    decays = np.full((2, 100), -5.0)
+    decays[0] = s_exp_decay(np.arange(100), -20, 20)
+    decays[1] += rng.normal(0, 0.01, size=100)
+    params, converged = batch_exp_decay_fit(
+        decays, np.array([100, 100]), np.array([-20, -5]), np.array([20, 20])
+    )
+    assert params[1, 1] > 100 * 100
+    assert list(converged) == [True, False]
+
+
+def test_fit_decays_not_converged():
+    # The second decay is flat so the fit cannot converge.
+    x = np.arange(100)
+    y_array = np.concatenate(
+        (s_exp_decay(x, -20, 20), np.full(10, 5.0), np.zeros(100), np.full(10, 5.0))
+    )
+    settings = {"s_r_c": 10.0, "sample_rate": 10000}
+    table = MiniEventTable(y_array, settings, 2)
+    table.columns["_event_peak_x"][:] = [0, 110]
+    table.columns["_array_end"][:] = [105, 215]
+    table.columns["_event_tau_x"][:] = [20, 130]
+    table.columns["event_peak_y"][:] = -20
+    table.columns["event_start_y"][:] = 1
+    table.fit_decays()
+    assert list(table.column("fit_converged")) == [True, False]
+    assert np.isclose(table.column("fit_tau")[0], 20)
+    assert np.isnan(table.column("fit_tau")[1])
+    assert table.column("fit_decay_y")[0].size == 100
+    assert np.isnan(table.column("fit_decay_x")[1])
+    assert np.isnan(table.column("fit_decay_y")[1])
+
+
+def test_chunked_noise_and_peaks():
+    rng = np.random.default_rng(0)
+    array = rng.standard_normal(200000) + np.linspace(0, 20, 200000)
+
+    def chunks():
+        return (array[i : i + 15000] for i in range(0, array.size, 15000))
+
+    mu, rms = trimmed_rms_chunks(chunks, array.size, max_values=5000)
+    assert np.allclose((mu, rms), trimmed_rms(array), rtol=1e-12)
+
+    # Tied values narrow the brackets to a few ulps.
+    array = np.round(rng.standard_normal(200000), 1)
+    mu, rms = trimmed_rms_chunks(chunks, array.size, max_values=50)
+    assert np.allclose((mu, rms), trimmed_rms(array), rtol=1e-12)
+
+    array = np.cumsum(rng.standard_normal(200000))
+    peaks, _ = signal.find_peaks(array, height=0, distance=50, prominence=5)
+    chunk_peaks = find_peaks_chunks(
+        lambda start, stop: array[start:stop],
+        array.size,
+        3000,
+        height=0,
+        distance=50,
+        prominence=5,
+        context=100,
+    )
+    assert np.array_equal(peaks, chunk_peaks)
+
+
+def test_streaming_analysis_matches_whole_array():
+    data = create_acq_data()
+    data["array"] = create_event_array(
+        sample_rate=10000, event_length=30, direction="negative"
+    )
+    acqs = []
+    for chunk_length in [None, 1000]:
+        mini = Acquisition("mini")
+        mini.load_data(data)
+        mini.set_filter(
+            baseline_start=0,
+            baseline_end=300,
+            filter_type="fir_zero_2",
+            order=301,
+            high_pass=None,
+            high_width=None,
+            low_pass=600,
+            low_width=300,
+            window="hann",
+            polyorder=None,
+        )
+        mini.set_template()
+        mini.analyze(rc_check=False, chunk_length=chunk_length)
+        acqs.append(mini)
+    whole, streamed = acqs
+    assert "deconvolved" not in streamed.__dict__.get("_stage_cache", {})
+    assert np.allclose(whole.final_array, streamed.final_array, rtol=0, atol=1e-10)
+    assert whole.final_events == streamed.final_events
+
+
+def test_rescreen_matches_full_analysis(monkeypatch):
+    data = create_acq_data()
+    data["array"] = create_event_array(
+        sample_rate=10000, event_length=30, direction="negative"
+    )
+    acqs = []
+    for _ in range(2):
+        mini = Acquisition("mini")
+        mini.load_data(data)
+        mini.set_filter(
+            baseline_start=0,
+            baseline_end=300,
+            filter_type="fir_zero_2",
+            order=301,
+            high_pass=None,
+            high_width=None,
+            low_pass=600,
+            low_width=300,
+            window="hann",
+            polyorder=None,
+        )
+        mini.set_template()
+        acqs.append(mini)
+    rescreened, fresh = acqs
+    rescreened.analyze(rc_check=False, sensitivity=3)
+
+    calls = []
+    for name in ["create_mespc_array", "find_events", "measure_events"]:
+        method = getattr(rescreened, name)
+
+        def counted(*args, name=name, method=method):
+            calls.append(name)
+            return method(*args)
+
+        monkeypatch.setattr(rescreened, name, counted)
+    for amp_threshold, decay_rise in [(2, True), (6, False), (4, True)]:
+        rescreened.analyze(
+            rc_check=False,
+            sensitivity=3,
+            amp_threshold=amp_threshold,
+            decay_rise=decay_rise,
+        )
+        fresh.clear_stage_cache()
+        fresh.analyze(
+            rc_check=False,
+            sensitivity=3,
+            amp_threshold=amp_threshold,
+            decay_rise=decay_rise,
+        )
+        assert len(calls) == 0
+        assert rescreened.final_events == fresh.final_events
+        assert [i.amplitude for i in rescreened.postsynaptic_events] == [
+            i.amplitude for i in fresh.postsynaptic_events
+        ]
+
+    # Changing a detection setting finds and measures the events again but
+    # does not filter the array again.
+    rescreened.analyze(rc_check=False, sensitivity=4)
+    assert calls == ["find_events", "measure_events"]
@@ -1,9 +1,42 @@
+from copy import deepcopy
+
+import numpy as np
+
 from clampsuite.acq import (
     Acquisition,
     oEPSCAcq,
 )
+from clampsuite.functions.utilities import create_acq_data, white_noise_array
 
 
 def test_oepsc_acq():
     oepsc = Acquisition("oepsc")
     assert isinstance(oepsc, oEPSCAcq)
+
+
+def test_analyze_batch_matches_analyze():
+    rng = np.random.default_rng(0)
+    x = np.arange(20000) / 10 - 1003
+    serial = []
+    for acq_num in range(1, 21):
+        oepsc = Acquisition("oepsc")
+        data = create_acq_data(array_len=20000, acq_num=acq_num)
+        t = np.maximum(x, 0)
+        decay = np.exp(-t / rng.uniform(3, 40))
+        data["array"] = rng.choice([-200, -50, 60]) * (1 - np.exp(-t / 0.8)) * decay
+        data["array"] += white_noise_array(20000)
+        oepsc.load_data(data)
+        oepsc.set_filter(filter_type="None", baseline_start=0, baseline_end=1000)
+        serial.append(oepsc)
+    batch = deepcopy(serial)
+    analysis_args = {"pulse_start": 1000, "find_ct": True, "find_est_decay": True}
+    for oepsc in serial:
+        oepsc.analyze(**analysis_args)
+    oEPSCAcq.analyze_batch(batch, **analysis_args)
+    for oepsc, other in zip(serial, batch):
+        assert oepsc.peak_direction == other.peak_direction
+        assert oepsc._peak_x == other._peak_x
+        assert oepsc.peak_y == other.peak_y
+        assert oepsc._index == other._index
+        assert oepsc.est_tau_x == other.est_tau_x
+        assert np.isclose(oepsc.charge_transfer, other.charge_transfer)